@@ -0,0 +1,370 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+address.json loader with a shared binary snapshot and an incremental search index.
+
+The text of the file is kept with the position and hash of every entry of
+"places" and "people". When address.json changes (mtime, size), the new text
+is compared with the previous one: only the entries between the common prefix
+and the common suffix are parsed again, and only the ones whose hash is new
+get their search-index key rebuilt. Edits outside the two lists (or across
+them) fall back to a full parse.
+
+The parsed result is shared through a pickle snapshot written next to the
+file (address.json.snapshot by default): the first worker that brings its
+version up to date publishes it, under the snapshot lock. A worker without a
+loaded version (first load), or whose diff falls back to a full parse, reads
+the snapshot instead of parsing the JSON, then applies the same diff if it
+is outdated. A worker that can diff its own version does so, which is
+cheaper than reading the snapshot.
+'''
+
+import os
+import json
+import json.decoder
+import json.scanner
+import pickle
+import hashlib
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: every worker builds its own snapshot
+    fcntl = None
+
+CATEGORIES = ("places", "people")
+SNAPSHOT_VERSION = 2
+
+_scan = json.scanner.make_scanner(json.JSONDecoder())
+_ws = json.decoder.WHITESPACE.match
+
+class _Mismatch(Exception):
+    """The text cannot be read entry by entry: parse it as a whole."""
+
+def entry_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+def _source_id(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+def _skip(text: str, pos: int) -> int:
+    return _ws(text, pos).end()
+
+def _value(text: str, pos: int) -> Tuple[Any, int]:
+    try:
+        return _scan(text, pos)
+    except StopIteration:
+        raise _Mismatch() from None
+
+def _common_prefix(a: str, b: str) -> int:
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _common_suffix(a: str, b: str, limit: int) -> int:
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:len(a) - lo] == b[len(b) - mid:len(b) - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _scan_entries(text: str, lo: int, hi: Optional[int], after_entry: bool, before_entry: bool,
+                  keep: bool = True) -> Tuple[List[Any], List[int], List[int], int]:
+    """
+    Entries of a JSON list between lo and hi: (items, starts, ends, position
+    of the end). after_entry / before_entry: an entry of the list comes just
+    before lo / after hi, so a comma separates it. hi=None reads up to ']'.
+    Without keep, only the positions are returned.
+    """
+    items, starts, ends = [], array("q"), array("q")
+    pos, need_comma = _skip(text, lo), after_entry
+    while pos != hi and (hi is not None or text[pos:pos + 1] != "]"):
+        if need_comma:
+            if text[pos:pos + 1] != ",":
+                raise _Mismatch()
+            pos = _skip(text, pos + 1)
+            if pos == hi and before_entry:
+                return items, starts, ends, pos
+        item, end = _value(text, pos)
+        if hi is not None and end > hi:
+            raise _Mismatch()
+        if keep:
+            items.append(item)
+        starts.append(pos)
+        ends.append(end)
+        pos, need_comma = _skip(text, end), True
+    if hi is not None and need_comma and before_entry:
+        raise _Mismatch()
+    return items, starts, ends, pos
+
+def _shift(positions: array, delta: int) -> array:
+    return array("q", [x + delta for x in positions]) if delta else positions
+
+def _locate(text: str):
+    """(category -> position of '[' and ']', category -> entry starts, category -> entry ends) of a valid document."""
+    lists, starts, ends = {}, {}, {}
+    pos = _skip(text, _skip(text, 0) + 1)
+    while text[pos] != "}":
+        if text[pos] == ",":
+            pos = _skip(text, pos + 1)
+        key, pos = _value(text, pos)
+        pos = _skip(text, _skip(text, pos) + 1)
+        if key in CATEGORIES and text[pos] == "[":
+            _, starts[key], ends[key], end = _scan_entries(text, pos + 1, None, False, False, keep=False)
+            lists[key], pos = (pos, end), end + 1
+        else:
+            # the last occurrence of a key wins, as in json.loads
+            _, pos = _value(text, pos)
+            lists.pop(key, None)
+        pos = _skip(text, pos)
+    return lists, starts, ends
+
+class _Version:
+    """One version of address.json: parsed data and the position/hash/key of every entry."""
+
+    def __init__(self, text: str, data: Dict[str, Any], lists: Dict[str, Tuple[int, int]],
+                 starts: Dict[str, array], ends: Dict[str, array],
+                 hashes: Dict[str, List[bytes]], keys: Dict[str, List[str]]):
+        self.text = text
+        self.data = data
+        # category -> position of its '[' and ']'
+        self.lists = lists
+        self.starts, self.ends = starts, ends
+        self.hashes, self.keys = hashes, keys
+
+class AddressBook:
+    """
+    data:              the parsed address.json
+    index(category):   normalized name -> entry, for "places" / "people"
+    names(category):   the keys of index(category), in file order
+    """
+
+    def __init__(self, json_path: str, snapshot_path: Optional[str], normalize: Callable[[str], str]):
+        self.json_path = json_path
+        self.snapshot_path = snapshot_path
+        self.normalize = normalize
+        self.data: Dict[str, Any] = {}
+        self.source: Optional[Tuple[int, int]] = None
+        self._version: Optional[_Version] = None
+        self._index: Dict[str, Dict[str, Dict[str, Any]]] = {c: {} for c in CATEGORIES}
+        self._names: Dict[str, List[str]] = {c: [] for c in CATEGORIES}
+        self._lock = threading.Lock()
+        # parsed: full parses, diffed: reloads that parsed the changed entries only
+        # added / removed: entries that differ from the previous version (by content hash)
+        self.stats = {"parsed": 0, "diffed": 0, "snapshot_loads": 0, "reindexed": 0, "added": 0, "removed": 0}
+
+    @property
+    def version(self) -> Optional[str]:
+        """Changes whenever address.json does (mtime, size)."""
+        return f"{self.source[0]:x}-{self.source[1]:x}" if self.source else None
+
+    def index(self, category: str) -> Dict[str, Dict[str, Any]]:
+        return self._index[category]
+
+    def names(self, category: str) -> List[str]:
+        return self._names[category]
+
+    def load(self) -> bool:
+        """Brings the book up to date with address.json; True if it changed."""
+        source = _source_id(self.json_path)
+        if source == self.source:
+            return False
+        with self._lock:
+            if source == self.source:
+                return False
+            if self._version is not None and self._update(source, diff_only=True):
+                # the first worker to reach this version publishes it for the others
+                with self._snapshot_lock():
+                    # skipped if address.json moved on since: do not replace a newer snapshot
+                    if self._snapshot_source() != source and _source_id(self.json_path) == source:
+                        self._write_snapshot()
+            elif not self._load_snapshot(source):
+                with self._snapshot_lock():
+                    # another worker may have written it while we waited
+                    if not self._load_snapshot(source):
+                        self._update(source)
+                        self._write_snapshot()
+            return True
+
+    # --- JSON ---
+
+    def _update(self, source: Tuple[int, int], diff_only: bool = False) -> bool:
+        """Diffs the loaded version with address.json, else parses it; with diff_only, False instead."""
+        with open(self.json_path, "r", encoding="utf-8") as f:
+            text = f.read()
+        old, version = self._version, None
+        if old is not None:
+            try:
+                version = self._diff(old, text)
+                self.stats["diffed"] += 1
+            except _Mismatch:
+                pass
+        if version is None and diff_only:
+            return False
+        if version is None:
+            # keys of the previous version, reused for the entries whose hash did not change
+            known = {h: k for c in CATEGORIES for h, k in zip(old.hashes[c], old.keys[c])} if old else {}
+            version = self._parse(text, known)
+            self._count(known.keys(), [h for c in CATEGORIES for h in version.hashes[c]])
+            self.stats["parsed"] += 1
+        self._set(version, source)
+        return True
+
+    def _parse(self, text: str, known: Dict[bytes, str]) -> _Version:
+        data = json.loads(text)
+        if not isinstance(data, dict) or not all(isinstance(data.get(c), list) for c in CATEGORIES):
+            raise ValueError("Le JSON doit contenir 'places' et 'people'.")
+        lists, starts, ends = _locate(text)
+        hashes = {c: [entry_hash(text[a:b]) for a, b in zip(starts[c], ends[c])] for c in CATEGORIES}
+        keys = {c: self._keys(data[c], hashes[c], known) for c in CATEGORIES}
+        return _Version(text, data, lists, starts, ends, hashes, keys)
+
+    def _diff(self, old: _Version, text: str) -> _Version:
+        """The new version from the old one: only the entries in the changed span are parsed."""
+        p = _common_prefix(old.text, text)
+        s = _common_suffix(old.text, text, min(len(old.text), len(text)) - p)
+        old_end, delta = len(old.text) - s, len(text) - len(old.text)
+        # the change must stay inside one list, its brackets untouched
+        cat = next((c for c, (a, b) in old.lists.items() if a < p and old_end <= b), None)
+        if cat is None:
+            raise _Mismatch()
+        o_starts, o_ends = old.starts[cat], old.ends[cat]
+        # old entries touching the change, and the unchanged text around them
+        i0 = bisect_left(o_ends, p)
+        i1 = bisect_right(o_starts, old_end)
+        lo = o_ends[i0 - 1] if i0 > 0 else old.lists[cat][0] + 1
+        hi = (o_starts[i1] if i1 < len(o_starts) else old.lists[cat][1]) + delta
+        items, n_starts, n_ends, _ = _scan_entries(text, lo, hi, i0 > 0, i1 < len(o_starts))
+        hashes = [entry_hash(text[a:b]) for a, b in zip(n_starts, n_ends)]
+        # keys of the replaced entries, reused by the ones that did not change
+        known = dict(zip(old.hashes[cat][i0:i1], old.keys[cat][i0:i1]))
+        self._count(known.keys(), hashes)
+
+        data = dict(old.data)
+        data[cat] = old.data[cat][:i0] + items + old.data[cat][i1:]
+        lists, starts, ends = dict(old.lists), dict(old.starts), dict(old.ends)
+        hashes_all, keys_all = dict(old.hashes), dict(old.keys)
+        starts[cat] = o_starts[:i0] + n_starts + _shift(o_starts[i1:], delta)
+        ends[cat] = o_ends[:i0] + n_ends + _shift(o_ends[i1:], delta)
+        hashes_all[cat] = old.hashes[cat][:i0] + hashes + old.hashes[cat][i1:]
+        keys_all[cat] = old.keys[cat][:i0] + self._keys(items, hashes, known) + old.keys[cat][i1:]
+        lists[cat] = (old.lists[cat][0], old.lists[cat][1] + delta)
+        for c, (a, b) in old.lists.items():
+            if c != cat and a > p:
+                # the other list comes after the change: same entries, shifted
+                lists[c] = (a + delta, b + delta)
+                starts[c] = _shift(old.starts[c], delta)
+                ends[c] = _shift(old.ends[c], delta)
+        return _Version(text, data, lists, starts, ends, hashes_all, keys_all)
+
+    def _keys(self, items: List[Any], hashes: List[bytes], known: Dict[bytes, str]) -> List[str]:
+        """Normalized names of items, known: entry hash -> key in a previous version."""
+        keys = []
+        for item, h in zip(items, hashes):
+            key = known.get(h)
+            if key is None:
+                key = self.normalize(item.get("name", "") if isinstance(item, dict) else "")
+                self.stats["reindexed"] += 1
+            keys.append(key)
+        return keys
+
+    def _count(self, before, after: List[bytes]):
+        after = set(after)
+        self.stats["added"] = len(after - before)
+        self.stats["removed"] = len(before - after)
+
+    def _set(self, version: _Version, source: Tuple[int, int]):
+        # a repeated name keeps its first place in names and the entry of its last occurrence
+        index = {c: dict(zip(version.keys[c], version.data[c])) for c in CATEGORIES}
+        names = {c: list(index[c]) for c in CATEGORIES}
+        self._version, self.data = version, version.data
+        self._index, self._names = index, names
+        self.source = source
+
+    # --- Snapshot ---
+
+    def _load_snapshot(self, source: Tuple[int, int]) -> bool:
+        """The file holds two pickles: a small header (version, source) then the body."""
+        if not self.snapshot_path:
+            return False
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                header = pickle.load(f)
+                if header.get("version") != SNAPSHOT_VERSION:
+                    return False
+                current = tuple(header.get("source", ())) == source
+                if not current and self._version is not None:
+                    return False
+                version = _Version(**pickle.load(f))
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError, TypeError):
+            return False
+        # outdated, it is still the version that _update diffs against
+        self._version = version
+        if not current:
+            return False
+        self._set(self._version, source)
+        self.stats["snapshot_loads"] += 1
+        return True
+
+    def _snapshot_source(self) -> Optional[Tuple[int, int]]:
+        """Source (mtime, size) of the snapshot on disk, read from its header only."""
+        if not self.snapshot_path:
+            return None
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                header = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError, TypeError):
+            return None
+        if header.get("version") != SNAPSHOT_VERSION:
+            return None
+        return tuple(header.get("source", ()))
+
+    def _write_snapshot(self):
+        if not self.snapshot_path:
+            return
+        header = {"version": SNAPSHOT_VERSION, "source": self.source}
+        body = vars(self._version)
+        tmp = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(body, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.snapshot_path)
+        except OSError:
+            pass
+
+    def _snapshot_lock(self):
+        return _FileLock(f"{self.snapshot_path}.lock" if self.snapshot_path and fcntl else None)
+
+class _FileLock:
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.fd = None
+
+    def __enter__(self):
+        if self.path:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
@@ -12,7 +12,7 @@ Python REST API using FLASK for Multimodal Car Pooling Project
 # Import
 #------------------
 
-from flask import Flask, Blueprint, request, jsonify, render_template
+from flask import Flask, Blueprint, request, jsonify, render_template, g, Response
 
 import requests
 import argparse
@@ -21,15 +21,34 @@ import json
 import re
 import unicodedata
 import time
+import threading
+import functools
+import hashlib
+import atexit
+from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 
+from rides_db import RideStore
+from corridor import decode_polyline
+from routing import RoutingService
+import metrics
+from singleflight import SingleFlight, SINGLEFLIGHT_DIR
+from geocode_index import GeocodeIndex
+from address_book import AddressBook
+from lru import LRUCache
+from dial_a_ride import schedule_rides, MAX_DETOUR_MIN
+from online_matching import OnlineMatcher
+from time_profiles import SpeedProfiles, PROFILES_FILE
+from transit import TransitRouter, load_timetable, GTFS_DIR, MAX_ROUNDS
+
 #------------------
 # Argument parsing
 #------------------
 
 is_gunicorn = "gunicorn" in os.environ.get("SERVER_SOFTWARE", "")
 
-if not is_gunicorn:
+# Importé par un autre point d'entrée (api_async.py, gunicorn): pas de parsing de sys.argv
+if not is_gunicorn and __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('-v','--verbose',action='store_true',help='Enable verbose mode')
     args = parser.parse_args()
@@ -59,6 +78,39 @@ def is_alive():
 
 app.register_blueprint(public_bp)
 
+#------------------
+# Metrics
+#------------------
+
+REQUEST_SECONDS = metrics.registry.histogram("api_request_duration_seconds", "Latence des requêtes par route")
+REQUESTS_TOTAL = metrics.registry.counter("api_requests_total", "Requêtes par route et code HTTP")
+ERRORS_TOTAL = metrics.registry.counter("api_request_errors_total", "Réponses 4xx/5xx par route")
+UPSTREAM_SECONDS = metrics.registry.histogram("api_upstream_duration_seconds",
+                                              "Temps passé dans _geocode/_reverse (sleep compris)")
+UPSTREAM_SLEEP_SECONDS = metrics.registry.counter("api_upstream_sleep_seconds_total",
+                                                  "Temps passé à attendre (rate limit Nominatim)")
+CACHE_TOTAL = metrics.registry.counter("api_cache_requests_total", "Accès aux caches (result=hit|miss)")
+JSON_RELOADS = metrics.registry.counter("api_json_reloads_total", "Rechargements de address.json")
+GEO_BATCH_ITEMS = metrics.registry.counter("api_geo_batch_items_total", "Items traités par /api/geo/<kind>/batch")
+SINGLEFLIGHT_TOTAL = metrics.registry.counter("api_singleflight_total",
+                                              "Appels amont dédoublonnés (role=leader|follower|follower_shared)")
+
+@app.before_request
+def _metrics_start():
+    g.metrics_t0 = time.perf_counter()
+
+@app.after_request
+def _metrics_record(response):
+    t0 = getattr(g, "metrics_t0", None)
+    if t0 is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - t0, route=route, method=request.method)
+        REQUESTS_TOTAL.inc(route=route, method=request.method, status=response.status_code)
+        if response.status_code >= 400:
+            ERRORS_TOTAL.inc(route=route, method=request.method, status=response.status_code)
+        metrics.registry.flush()
+    return response
+
 private_bp = Blueprint("private", __name__)
 
 # ------------------
@@ -66,15 +118,41 @@ private_bp = Blueprint("private", __name__)
 #------------------
 
 JSON_PATH = os.environ.get("JSON_PATH", "address.json")
+# snapshot binaire partagé entre workers ("" = pas de snapshot)
+ADDRESS_SNAPSHOT_PATH = os.environ.get("ADDRESS_SNAPSHOT_PATH", f"{JSON_PATH}.snapshot")
+# réponses lookup/address sérialisées (LRU par worker) + Cache-Control envoyé aux clients
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_MAX_AGE_S = int(os.environ.get("RESPONSE_MAX_AGE_S", "60"))
+# coordonnées pré-calculées des adresses du JSON ("" = en mémoire seulement)
+GEOCODE_INDEX_PATH = os.environ.get("GEOCODE_INDEX_PATH", f"{JSON_PATH}.geocodes.json")
 NOMINATIM_USER_AGENT = os.environ.get(
     "NOMINATIM_USER_AGENT",
     "kyllian-address-api/1.0 (kyllian.cuevas@gmail.com)"
 )
 NOMINATIM_BASE = "https://nominatim.openstreetmap.org"
 
-# cache simple en mémoire
-_DATA_CACHE: Dict[str, Any] = {}
-_DATA_MTIME: Optional[float] = None
+DB_FILE = os.environ.get("DB_FILE", "carpool.db")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+RIDE_SEARCH_WINDOW_MIN = 30
+# rayon max (km) de /api/rides/search et /api/rides/corridor: le nombre de cellules parcourues croît avec son carré
+MAX_CORRIDOR_RADIUS_KM = float(os.environ.get("MAX_CORRIDOR_RADIUS_KM", "10"))
+# /api/rides/schedule: temps de calcul max et taille max de la matrice routière (Dijkstra par point)
+SCHEDULE_TIME_BUDGET_S = float(os.environ.get("SCHEDULE_TIME_BUDGET_S", "2"))
+SCHEDULE_ROAD_MAX_POINTS = int(os.environ.get("SCHEDULE_ROAD_MAX_POINTS", "300"))
+
+# Graphe routier: chargé une fois par process (ou dans le master avec gunicorn --preload)
+ROUTING_PARQUET = os.environ.get("ROUTING_PARQUET", "highways.parquet")
+ROUTING_BBOX = os.environ.get("ROUTING_BBOX")  # "min_lat,max_lat,min_lon,max_lon"
+ROUTING_WORKERS = int(os.environ.get("ROUTING_WORKERS", "1"))  # >1: scoring des destinations en parallèle
+ROUTING_GRAPH_DIR = os.environ.get("ROUTING_GRAPH_DIR")  # graphe CSR partagé (mmap) entre processus
+ROUTING_PATH_CACHE_SIZE = int(os.environ.get("ROUTING_PATH_CACHE_SIZE", "100000"))  # chemins gardés en mémoire
+ROUTING_PATH_CACHE = os.environ.get("ROUTING_PATH_CACHE")  # fichier: cache de chemins rechargé au démarrage
+ROUTING_SPEED_PROFILES = os.environ.get("ROUTING_SPEED_PROFILES", PROFILES_FILE)  # vitesses horaires par type de route
+ROUTING_ISOCHRONE_CACHE_SIZE = int(os.environ.get("ROUTING_ISOCHRONE_CACHE_SIZE", "256"))  # isochrones gardées en mémoire
+
+# Transports en commun: flux GTFS local, compilé en tableaux (réutilisés au démarrage suivant si TRANSIT_TIMETABLE_DIR)
+TRANSIT_GTFS_DIR = os.environ.get("TRANSIT_GTFS_DIR", GTFS_DIR)
+TRANSIT_TIMETABLE_DIR = os.environ.get("TRANSIT_TIMETABLE_DIR")
 
 def _normalize(text: str) -> str:
     t = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
@@ -90,19 +168,73 @@ def _addr_to_text(addr: Dict[str, Any]) -> str:
     ]
     return ", ".join([p for p in parts if p])
 
+# address.json + index de recherche, rechargés uniquement si le fichier change
+_ADDRESS_BOOK = AddressBook(JSON_PATH, ADDRESS_SNAPSHOT_PATH or None, _normalize)
+
 def _load_json() -> Dict[str, Any]:
-    global _DATA_CACHE, _DATA_MTIME
     if not os.path.exists(JSON_PATH):
         raise FileNotFoundError(f"JSON introuvable: {JSON_PATH}")
-    mtime = os.path.getmtime(JSON_PATH)
-    if _DATA_MTIME is None or mtime != _DATA_MTIME:
-        with open(JSON_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        if "places" not in data or "people" not in data:
-            raise ValueError("Le JSON doit contenir 'places' et 'people'.")
-        _DATA_CACHE = data
-        _DATA_MTIME = mtime
-    return _DATA_CACHE
+    reloaded = _ADDRESS_BOOK.load()
+    CACHE_TOTAL.inc(cache="address_json", result="miss" if reloaded else "hit")
+    if reloaded:
+        JSON_RELOADS.inc()
+        data = _ADDRESS_BOOK.data
+        _GEOCODE_INDEX.refresh(_addr_to_text(it.get("address", {})) for it in data["places"] + data["people"])
+    return _ADDRESS_BOOK.data
+
+_RIDE_STORE: Optional[RideStore] = None
+
+def _get_ride_store() -> RideStore:
+    """Une instance par worker, créée au premier appel (après le fork gunicorn)."""
+    global _RIDE_STORE
+    if _RIDE_STORE is None:
+        _RIDE_STORE = RideStore(DB_FILE, DB_POOL_SIZE)
+    return _RIDE_STORE
+
+_ONLINE_MATCHER: Optional[OnlineMatcher] = None
+_MATCHER_LOCK = threading.Lock()
+
+def _get_online_matcher() -> OnlineMatcher:
+    """Trajets actifs en mémoire, un par worker; resynchronisés avec la base à chaque demande."""
+    global _ONLINE_MATCHER
+    if _ONLINE_MATCHER is None:
+        with _MATCHER_LOCK:
+            if _ONLINE_MATCHER is None:
+                _ONLINE_MATCHER = OnlineMatcher(_get_ride_store())
+    return _ONLINE_MATCHER
+
+_ROUTING_SERVICE: Optional[RoutingService] = None
+_ROUTING_LOCK = threading.Lock()
+
+def _get_routing_service() -> RoutingService:
+    global _ROUTING_SERVICE
+    if _ROUTING_SERVICE is None:
+        with _ROUTING_LOCK:
+            if _ROUTING_SERVICE is None:
+                bbox = tuple(float(x) for x in ROUTING_BBOX.split(",")) if ROUTING_BBOX else None
+                # sans fichier de profils: /api/route/eta répond 503, le reste du routage fonctionne
+                profiles = SpeedProfiles.from_csv(ROUTING_SPEED_PROFILES) if os.path.exists(ROUTING_SPEED_PROFILES) else None
+                _ROUTING_SERVICE = RoutingService(ROUTING_PARQUET, bbox=bbox, workers=ROUTING_WORKERS,
+                                                  graph_dir=ROUTING_GRAPH_DIR,
+                                                  path_cache_size=ROUTING_PATH_CACHE_SIZE,
+                                                  path_cache_file=ROUTING_PATH_CACHE, profiles=profiles,
+                                                  isochrone_cache_size=ROUTING_ISOCHRONE_CACHE_SIZE)
+                if ROUTING_PATH_CACHE:
+                    atexit.register(_ROUTING_SERVICE.path_cache.save)
+    return _ROUTING_SERVICE
+
+_TRANSIT_ROUTER: Optional[TransitRouter] = None
+_TRANSIT_LOCK = threading.Lock()
+
+def _get_transit_router() -> TransitRouter:
+    """Horaires + chemins à pied entre arrêts, calculés une fois par process sur le graphe routier."""
+    global _TRANSIT_ROUTER
+    if _TRANSIT_ROUTER is None:
+        routing = _get_routing_service()
+        with _TRANSIT_LOCK:
+            if _TRANSIT_ROUTER is None:
+                _TRANSIT_ROUTER = TransitRouter(load_timetable(TRANSIT_GTFS_DIR, TRANSIT_TIMETABLE_DIR), routing)
+    return _TRANSIT_ROUTER
 
 def _best_match(query: str, pool: List[str]) -> Optional[str]:
     nq = _normalize(query)
@@ -123,12 +255,7 @@ def _best_match(query: str, pool: List[str]) -> Optional[str]:
     return best if best_score >= 0.5 else None
 
 def _search_impl(query: str, category: Optional[str]) -> Optional[Dict[str, Any]]:
-    data = _load_json()
-    def _index(items):
-        return {_normalize(it.get("name", "")): it for it in items}
-
-    places_idx = _index(data["places"])
-    people_idx = _index(data["people"])
+    _load_json()
 
     cats = ["places", "people"]
     if category == "place":
@@ -137,10 +264,9 @@ def _search_impl(query: str, category: Optional[str]) -> Optional[Dict[str, Any]
         cats = ["people"]
 
     for cat in cats:
-        pool = list((places_idx if cat == "places" else people_idx).keys())
-        best = _best_match(query, pool)
+        best = _best_match(query, _ADDRESS_BOOK.names(cat))
         if best:
-            item = (places_idx if cat == "places" else people_idx)[best]
+            item = _ADDRESS_BOOK.index(cat)[best]
             addr = item.get("address", {})
             return {
                 "category": "place" if cat == "places" else "person",
@@ -156,25 +282,40 @@ def _http_get(url: str, params: Dict[str, Any]) -> Dict[str, Any]:
     r.raise_for_status()
     return r.json()
 
-def _geocode(address_text: str) -> Optional[Dict[str, float]]:
-    time.sleep(1.0)
-    params = {
+NOMINATIM_DELAY_S = 1.0  # politique d'usage Nominatim: 1 requête/s
+
+def _rate_limit_sleep(func_name: str):
+    time.sleep(NOMINATIM_DELAY_S)
+    UPSTREAM_SLEEP_SECONDS.inc(NOMINATIM_DELAY_S, func=func_name)
+
+def _upstream(func_name: str):
+    """Mesure la durée totale de l'appel (sleep + HTTP) dans api_upstream_duration_seconds."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            with UPSTREAM_SECONDS.time(func=func_name):
+                return fn(*a, **kw)
+        return wrapper
+    return deco
+
+def _geocode_params(address_text: str) -> Dict[str, Any]:
+    return {
         "q": address_text,
         "format": "json",
         "addressdetails": 0,
         "limit": 1,
         "countrycodes": "fr",
     }
-    data = _http_get(f"{NOMINATIM_BASE}/search", params)
+
+def _parse_geocode(data: Any) -> Optional[Dict[str, float]]:
     if not data:
         return None
     return {"lat": float(data[0]["lat"]), "lon": float(data[0]["lon"])}
 
-def _reverse(lat: float, lon: float) -> Optional[Dict[str, Any]]:
-    """(lat, lon) -> adresse structurée complète"""
-    time.sleep(1.0)
-    params = {"lat": lat, "lon": lon, "format": "json", "zoom": 18, "addressdetails": 1}
-    data = _http_get(f"{NOMINATIM_BASE}/reverse", params)
+def _reverse_params(lat: float, lon: float) -> Dict[str, Any]:
+    return {"lat": lat, "lon": lon, "format": "json", "zoom": 18, "addressdetails": 1}
+
+def _parse_reverse(data: Any) -> Optional[Dict[str, Any]]:
     if not data or "address" not in data:
         return None
     addr = data["address"]
@@ -192,6 +333,48 @@ def _reverse(lat: float, lon: float) -> Optional[Dict[str, Any]]:
     }
     return {k: v for k, v in structured.items() if v is not None}
 
+@_upstream("geocode")
+def _geocode_upstream(address_text: str) -> Optional[Dict[str, float]]:
+    _rate_limit_sleep("geocode")
+    return _parse_geocode(_http_get(f"{NOMINATIM_BASE}/search", _geocode_params(address_text)))
+
+@_upstream("reverse")
+def _reverse_upstream(lat: float, lon: float) -> Optional[Dict[str, Any]]:
+    _rate_limit_sleep("reverse")
+    return _parse_reverse(_http_get(f"{NOMINATIM_BASE}/reverse", _reverse_params(lat, lon)))
+
+# Requêtes identiques simultanées: un seul appel Nominatim (par worker, et entre
+# workers si SINGLEFLIGHT_DIR est défini)
+_GEOCODE_FLIGHT = SingleFlight(SINGLEFLIGHT_DIR, lambda role: SINGLEFLIGHT_TOTAL.inc(func="geocode", role=role))
+_REVERSE_FLIGHT = SingleFlight(SINGLEFLIGHT_DIR, lambda role: SINGLEFLIGHT_TOTAL.inc(func="reverse", role=role))
+
+def _geocode_key(address_text: str) -> str:
+    return f"geocode:{_normalize(address_text)}"
+
+def _reverse_key(lat: float, lon: float) -> str:
+    return f"reverse:{lat:.6f},{lon:.6f}"
+
+def _geocode(address_text: str) -> Optional[Dict[str, float]]:
+    return _GEOCODE_FLIGHT.do(_geocode_key(address_text), lambda: _geocode_upstream(address_text))
+
+def _reverse(lat: float, lon: float) -> Optional[Dict[str, Any]]:
+    """(lat, lon) -> adresse structurée complète"""
+    return _REVERSE_FLIGHT.do(_reverse_key(lat, lon), lambda: _reverse_upstream(lat, lon))
+
+# Rempli en tâche de fond à chaque changement de address.json (voir _load_json)
+_GEOCODE_INDEX = GeocodeIndex(GEOCODE_INDEX_PATH or None, _geocode)
+
+def _geocode_known(address_text: str) -> Optional[Dict[str, float]]:
+    """Coordonnées d'une adresse du JSON: index pré-calculé, sinon Nominatim."""
+    coords = _GEOCODE_INDEX.get(address_text)
+    CACHE_TOTAL.inc(cache="geocode_index", result="hit" if coords else "miss")
+    if coords:
+        return coords
+    coords = _geocode(address_text)
+    if coords:
+        _GEOCODE_INDEX.put(address_text, coords)
+    return coords
+
 #------------------
 # Routes
 #------------------
@@ -205,131 +388,535 @@ def get_root():
     }), 200
 
 def _standard_response(func_name: str, data: Any, error: bool=False, code: int=200):
-    return jsonify({
+    # un dict: Flask comme Quart (api_async.py) le sérialisent en JSON
+    return {
         "return_code": "ERROR" if error else "OK",
         "response": func_name,
         "data": data
-    }), code
+    }, code
+
+_RESPONSE_CACHE = LRUCache(RESPONSE_CACHE_SIZE)
+
+def _cached_search(func_name: str, kind: str, params: Dict[str, Any], req, dumps):
+    """
+    Réponse lookup/address, commune à api.py et api_async.py (req: leur requête,
+    dumps: le JSON de leur app). Les réponses 200 sont mises en cache par (route,
+    requête normalisée, category, version de address.json), avec ETag:
+    If-None-Match -> 304.
+    """
+    query = params.get("query")
+    query = query.strip() if isinstance(query, str) else ""
+    if not query:
+        return _geo_response(func_name, kind, params)
+    _load_json()
+    key = (func_name, _normalize(query), params.get("category") or "", _ADDRESS_BOOK.version)
+    entry = _RESPONSE_CACHE.get(key)
+    CACHE_TOTAL.inc(cache="response", result="hit" if entry else "miss")
+    if entry is None:
+        data, code = _geo_response(func_name, kind, params)
+        if code != 200:
+            return data, code
+        body = (dumps(data) + "\n").encode("utf-8")
+        entry = (body, hashlib.sha1(body).hexdigest()[:20])
+        _RESPONSE_CACHE.put(key, entry)
+    body, etag = entry
+    headers = {
+        "Content-Type": "application/json",
+        "ETag": f'"{etag}"',
+        "Cache-Control": f"public, max-age={RESPONSE_MAX_AGE_S}",
+    }
+    if req.if_none_match.contains_weak(etag):
+        return b"", 304, headers
+    return body, 200, headers
 
-# --- Lookup ---
-@private_bp.route('/api/geo/lookup', methods=['GET'])
-def geo_lookup():
-    query = request.args.get("query", "").strip()
-    category = request.args.get("category")
+# --- Geo pipeline: validation + résultat communs aux 8 routes et aux lots ---
+
+class _GeoError(Exception):
+    def __init__(self, message: str, code: int):
+        super().__init__(message)
+        self.code = code
+
+_CATEGORIES = ("place", "person")
+GEO_BATCH_MAX = 100
+
+def _valid_query(params: Dict[str, Any]) -> str:
+    query = params.get("query")
+    query = query.strip() if isinstance(query, str) else ""
     if not query:
-        return _standard_response("geo_lookup", {"error": "query manquant"}, True, 400)
-    if category and category not in ("place", "person"):
-        return _standard_response("geo_lookup", {"error": "category invalide"}, True, 400)
+        raise _GeoError("query manquant", 400)
+    return query
+
+def _valid_category(params: Dict[str, Any]) -> Optional[str]:
+    category = params.get("category")
+    if category and category not in _CATEGORIES:
+        raise _GeoError("category invalide", 400)
+    return category or None
+
+def _valid_latlon(params: Dict[str, Any]):
+    try:
+        return float(params.get("lat", "")), float(params.get("lon", ""))
+    except (TypeError, ValueError):
+        raise _GeoError("lat/lon invalides", 400)
+
+def _geo_search(params: Dict[str, Any]) -> Dict[str, Any]:
+    query, category = _valid_query(params), _valid_category(params)
     res = _search_impl(query, category)
     if not res:
-        return _standard_response("geo_lookup", {"error": "Aucune correspondance"}, True, 404)
-    return _standard_response("geo_lookup", res)
+        raise _GeoError("Aucune correspondance", 404)
+    return res
+
+def _geo_coords(params: Dict[str, Any]) -> Dict[str, Any]:
+    res = _geo_search(params)
+    coords = _geocode_known(res["address_text"])
+    if not coords:
+        raise _GeoError("Géocodage: aucun résultat", 502)
+    return _coords_result(res, coords)
+
+def _coords_result(res: Dict[str, Any], coords: Dict[str, float]) -> Dict[str, Any]:
+    return {
+        "name": res["name"],
+        "category": res["category"],
+        "address": res["address"],
+        "address_text": res["address_text"],
+        "coords": coords,
+        "provider": "nominatim"
+    }
+
+def _geo_reverse(params: Dict[str, Any]) -> Dict[str, Any]:
+    lat, lon = _valid_latlon(params)
+    addr = _reverse(lat, lon)
+    if not addr:
+        raise _GeoError("Reverse: aucun résultat", 502)
+    return {"address": addr, "provider": "nominatim"}
+
+# lookup et address renvoient le même résultat (l'adresse fait partie de la fiche)
+_GEO_KINDS = {
+    "lookup": _geo_search,
+    "address": _geo_search,
+    "coords": _geo_coords,
+    "reverse": _geo_reverse,
+}
+
+def _geo_response(func_name: str, kind: str, params: Dict[str, Any]):
+    try:
+        return _standard_response(func_name, _GEO_KINDS[kind](params))
+    except _GeoError as e:
+        return _standard_response(func_name, {"error": str(e)}, True, e.code)
+
+def _query_params(query: Optional[str] = None, args=None) -> Dict[str, Any]:
+    """
+    Forme query-string (query=None) ou chemin (/<q>); category toujours en query-string.
+    args: paramètres de la requête (par défaut ceux de la requête Flask).
+    """
+    args = request.args if args is None else args
+    return {
+        "query": args.get("query", "") if query is None else query,
+        "category": args.get("category"),
+    }
+
+# --- Lookup ---
+@private_bp.route('/api/geo/lookup', methods=['GET'])
+def geo_lookup():
+    return _cached_search("geo_lookup", "lookup", _query_params(), request, app.json.dumps)
 
 @private_bp.route('/api/geo/lookup/<path:q>', methods=['GET'])
 def geo_lookup_path(q):
-    category = request.args.get("category")
-    if category and category not in ("place", "person"):
-        return _standard_response("geo_lookup_path", {"error": "category invalide"}, True, 400)
-    res = _search_impl(q, category)
-    if not res:
-        return _standard_response("geo_lookup_path", {"error": "Aucune correspondance"}, True, 404)
-    return _standard_response("geo_lookup_path", res)
+    return _cached_search("geo_lookup_path", "lookup", _query_params(q), request, app.json.dumps)
 
 # --- Address ---
 @private_bp.route('/api/geo/address', methods=['GET'])
 def geo_address():
-    query = request.args.get("query", "").strip()
-    category = request.args.get("category")
-    if not query:
-        return _standard_response("geo_address", {"error": "query manquant"}, True, 400)
-    if category and category not in ("place", "person"):
-        return _standard_response("geo_address", {"error": "category invalide"}, True, 400)
-    res = _search_impl(query, category)
-    if not res:
-        return _standard_response("geo_address", {"error": "Aucune correspondance"}, True, 404)
-    return _standard_response("geo_address", res)
+    return _cached_search("geo_address", "address", _query_params(), request, app.json.dumps)
 
 @private_bp.route('/api/geo/address/<path:q>', methods=['GET'])
 def geo_address_path(q):
-    category = request.args.get("category")
-    if category and category not in ("place", "person"):
-        return _standard_response("geo_address_path", {"error": "category invalide"}, True, 400)
-    res = _search_impl(q, category)
-    if not res:
-        return _standard_response("geo_address_path", {"error": "Aucune correspondance"}, True, 404)
-    return _standard_response("geo_address_path", res)
+    return _cached_search("geo_address_path", "address", _query_params(q), request, app.json.dumps)
 
 # --- Coords ---
 @private_bp.route('/api/geo/coords', methods=['GET'])
 def geo_coords():
-    query = request.args.get("query", "").strip()
-    category = request.args.get("category")
-    if not query:
-        return _standard_response("geo_coords", {"error": "query manquant"}, True, 400)
-    if category and category not in ("place", "person"):
-        return _standard_response("geo_coords", {"error": "category invalide"}, True, 400)
-    res = _search_impl(query, category)
-    if not res:
-        return _standard_response("geo_coords", {"error": "Aucune correspondance"}, True, 404)
-    coords = _geocode(res["address_text"])
-    if not coords:
-        return _standard_response("geo_coords", {"error": "Géocodage: aucun résultat"}, True, 502)
-    data = {
-        "name": res["name"],
-        "category": res["category"],
-        "address": res["address"],
-        "address_text": res["address_text"],
-        "coords": coords,
-        "provider": "nominatim"
-    }
-    return _standard_response("geo_coords", data)
+    return _geo_response("geo_coords", "coords", _query_params())
 
 @private_bp.route('/api/geo/coords/<path:q>', methods=['GET'])
 def geo_coords_path(q):
-    category = request.args.get("category")
-    if category and category not in ("place", "person"):
-        return _standard_response("geo_coords_path", {"error": "category invalide"}, True, 400)
-    res = _search_impl(q, category)
-    if not res:
-        return _standard_response("geo_coords_path", {"error": "Aucune correspondance"}, True, 404)
-    coords = _geocode(res["address_text"])
-    if not coords:
-        return _standard_response("geo_coords_path", {"error": "Géocodage: aucun résultat"}, True, 502)
-    data = {
-        "name": res["name"],
-        "category": res["category"],
-        "address": res["address"],
-        "address_text": res["address_text"],
-        "coords": coords,
-        "provider": "nominatim"
-    }
-    return _standard_response("geo_coords_path", data)
+    return _geo_response("geo_coords_path", "coords", _query_params(q))
 
 # --- Reverse ---
 @private_bp.route('/api/geo/reverse', methods=['GET'])
 def geo_reverse():
+    return _geo_response("geo_reverse", "reverse", {"lat": request.args.get("lat", ""),
+                                                    "lon": request.args.get("lon", "")})
+
+@private_bp.route('/api/geo/reverse/<lat>/<lon>', methods=['GET'])
+def geo_reverse_path(lat, lon):
+    return _geo_response("geo_reverse_path", "reverse", {"lat": lat, "lon": lon})
+
+# --- Batch ---
+@private_bp.route('/api/geo/<kind>/batch', methods=['POST'])
+def geo_batch(kind):
+    """
+    {"items": [{"query": "...", "category": "place"}, ...]} (lookup/address/coords)
+    {"items": [{"lat": 47.5, "lon": 6.8}, ...]} (reverse)
+    -> un résultat par item: {"ok": true, "data": ...} ou {"ok": false, "code": 404, "error": ...}
+    """
+    if kind not in _GEO_KINDS:
+        return _standard_response("geo_batch", {"error": "type invalide (lookup, address, coords, reverse)"}, True, 404)
+    items = (request.get_json(silent=True) or {}).get("items")
+    if not isinstance(items, list) or not all(isinstance(it, dict) for it in items):
+        return _standard_response("geo_batch", {"error": "items invalide: liste d'objets attendue"}, True, 400)
+    if len(items) > GEO_BATCH_MAX:
+        return _standard_response("geo_batch", {"error": f"lot trop grand (max {GEO_BATCH_MAX})"}, True, 400)
+    handler = _GEO_KINDS[kind]
+    results, seen = [], {}
+    for it in items:
+        # items identiques dans un même lot: calculés une fois
+        key = json.dumps(it, sort_keys=True, default=str)
+        if key not in seen:
+            try:
+                seen[key] = {"ok": True, "data": handler(it)}
+            except _GeoError as e:
+                seen[key] = {"ok": False, "code": e.code, "error": str(e)}
+        results.append(seen[key])
+    GEO_BATCH_ITEMS.inc(len(items), kind=kind)
+    return _standard_response("geo_batch", {"kind": kind, "results": results})
+
+# --- Rides ---
+@private_bp.route('/api/rides', methods=['POST'])
+def rides_create():
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = [payload]
+    if not isinstance(payload, list) or not payload:
+        return _standard_response("rides_create", {"error": "JSON invalide"}, True, 400)
+    try:
+        ids = _get_ride_store().bulk_insert(payload)
+    except (ValueError, TypeError, AttributeError) as e:
+        return _standard_response("rides_create", {"error": str(e)}, True, 400)
+    return _standard_response("rides_create", {"ids": ids, "count": len(ids)}, code=201)
+
+@private_bp.route('/api/rides', methods=['GET'])
+def rides_list():
+    try:
+        rides = _get_ride_store().find_rides(
+            time_from=request.args.get("from"),
+            time_to=request.args.get("to"),
+            start_location=request.args.get("start"),
+            end_location=request.args.get("end"),
+            min_seats=int(request.args.get("seats", 0)),
+            limit=int(request.args.get("limit", 100)),
+        )
+    except ValueError as e:
+        return _standard_response("rides_list", {"error": str(e)}, True, 400)
+    return _standard_response("rides_list", {"rides": rides, "count": len(rides)})
+
+@private_bp.route('/api/rides/search', methods=['GET'])
+def rides_search():
+    """Trajets qui partent (near=start) ou arrivent (near=end) à moins de radius km de lat/lon."""
     try:
         lat = float(request.args.get("lat", ""))
         lon = float(request.args.get("lon", ""))
+        radius = float(request.args.get("radius", 1.0))
     except ValueError:
-        return _standard_response("geo_reverse", {"error": "lat/lon invalides"}, True, 400)
-    addr = _reverse(lat, lon)
-    if not addr:
-        return _standard_response("geo_reverse", {"error": "Reverse: aucun résultat"}, True, 502)
-    return _standard_response("geo_reverse", {"address": addr, "provider": "nominatim"})
-
-@private_bp.route('/api/geo/reverse/<lat>/<lon>', methods=['GET'])
-def geo_reverse_path(lat, lon):
+        return _standard_response("rides_search", {"error": "lat/lon/radius invalides"}, True, 400)
+    if not 0 < radius <= MAX_CORRIDOR_RADIUS_KM:
+        return _standard_response("rides_search", {"error": f"radius doit être compris entre 0 et {MAX_CORRIDOR_RADIUS_KM:g} km"}, True, 400)
+    time_from = request.args.get("from") or datetime.now().isoformat(timespec="seconds")
+    time_to = request.args.get("to")
+    try:
+        if not time_to:
+            time_to = datetime.fromisoformat(time_from) + timedelta(minutes=RIDE_SEARCH_WINDOW_MIN)
+        rides = _get_ride_store().search_near(
+            lat, lon, radius, time_from, time_to,
+            end=request.args.get("near", "start"),
+            min_seats=int(request.args.get("seats", 0)),
+            limit=int(request.args.get("limit", 100)),
+        )
+    except ValueError as e:
+        return _standard_response("rides_search", {"error": str(e)}, True, 400)
+    return _standard_response("rides_search", {"rides": rides, "count": len(rides)})
+
+@private_bp.route('/api/rides/corridor', methods=['GET'])
+def rides_corridor():
+    """Trajets dont la route passe près du point de prise en charge puis du point de dépose."""
     try:
-        latf = float(lat)
-        lonf = float(lon)
+        pickup = (float(request.args.get("pickup_lat", "")), float(request.args.get("pickup_lon", "")))
+        dropoff = (float(request.args.get("dropoff_lat", "")), float(request.args.get("dropoff_lon", "")))
+        radius = float(request.args.get("radius", 0.5))
     except ValueError:
-        return _standard_response("geo_reverse_path", {"error": "lat/lon invalides"}, True, 400)
-    addr = _reverse(latf, lonf)
-    if not addr:
-        return _standard_response("geo_reverse_path", {"error": "Reverse: aucun résultat"}, True, 502)
-    return _standard_response("geo_reverse_path", {"address": addr, "provider": "nominatim"})
-    
+        return _standard_response("rides_corridor", {"error": "pickup/dropoff/radius invalides"}, True, 400)
+    if not 0 < radius <= MAX_CORRIDOR_RADIUS_KM:
+        return _standard_response("rides_corridor", {"error": f"radius doit être compris entre 0 et {MAX_CORRIDOR_RADIUS_KM:g} km"}, True, 400)
+    try:
+        rides = _get_ride_store().match_corridor(
+            pickup, dropoff, radius,
+            time_from=request.args.get("from"),
+            time_to=request.args.get("to"),
+            min_seats=int(request.args.get("seats", 1)),
+            limit=int(request.args.get("limit", 100)),
+        )
+    except ValueError as e:
+        return _standard_response("rides_corridor", {"error": str(e)}, True, 400)
+    return _standard_response("rides_corridor", {"rides": rides, "count": len(rides)})
+
+@private_bp.route('/api/rides/schedule', methods=['POST'])
+def rides_schedule():
+    """
+    Affecte des demandes avec fenêtres horaires aux trajets partant dans [from, to]:
+    {"from", "to", "requests": [{"id", "pickup": [lat, lon], "dropoff": [lat, lon],
+     "pickup_from", "pickup_to", "arrive_by", "seats"}, ...],
+     "matrix": "haversine"|"road", "max_detour": minutes, "limit": trajets}
+    """
+    payload = request.get_json(silent=True) or {}
+    requests_ = payload.get("requests")
+    if not isinstance(requests_, list) or not requests_:
+        return _standard_response("rides_schedule", {"error": "requests invalide: liste attendue"}, True, 400)
+    matrix = payload.get("matrix", "haversine")
+    if matrix not in ("haversine", "road"):
+        return _standard_response("rides_schedule", {"error": "matrix invalide"}, True, 400)
+
+    def road_km(points):
+        if len(points) > SCHEDULE_ROAD_MAX_POINTS:
+            raise ValueError(f"matrix=road limitée à {SCHEDULE_ROAD_MAX_POINTS} points ({len(points)} demandés)")
+        return _get_routing_service().road_distances(points)
+
+    try:
+        rides = _get_ride_store().find_rides(time_from=payload.get("from"), time_to=payload.get("to"),
+                                             min_seats=1, limit=int(payload.get("limit", 500)))
+        res = schedule_rides(rides, requests_, distances_km=road_km if matrix == "road" else None,
+                             max_detour=float(payload.get("max_detour", MAX_DETOUR_MIN)),
+                             time_budget=SCHEDULE_TIME_BUDGET_S)
+    except (ValueError, TypeError) as e:
+        return _standard_response("rides_schedule", {"error": str(e)}, True, 400)
+    except FileNotFoundError as e:
+        return _standard_response("rides_schedule", {"error": str(e)}, True, 503)
+    return _standard_response("rides_schedule", res)
+
+@private_bp.route('/api/rides/match', methods=['POST'])
+def rides_match():
+    """
+    Réserve une place sur le trajet actif où l'insertion coûte le moins (dry_run: devis seulement):
+    {"pickup": [lat, lon], "dropoff": [lat, lon], "pickup_from", "pickup_to", "arrive_by", "seats", "rider"}
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return _standard_response("rides_match", {"error": "JSON invalide"}, True, 400)
+    dry_run = bool(payload.get("dry_run", False))
+    try:
+        res = _get_online_matcher().match(payload, book=not dry_run)
+    except (ValueError, TypeError) as e:
+        return _standard_response("rides_match", {"error": str(e)}, True, 400)
+    except RuntimeError as e:
+        return _standard_response("rides_match", {"error": str(e)}, True, 409)
+    if res is None:
+        return _standard_response("rides_match", {"error": "Aucun trajet compatible"}, True, 404)
+    return _standard_response("rides_match", res, code=200 if dry_run else 201)
+
+@private_bp.route('/api/rides/<int:ride_id>/plan', methods=['GET'])
+def rides_get_plan(ride_id):
+    plan = _get_ride_store().get_plan(ride_id)
+    if not plan:
+        return _standard_response("rides_get_plan", {"error": "Aucune réservation"}, True, 404)
+    return _standard_response("rides_get_plan", plan)
+
+@private_bp.route('/api/rides/<int:ride_id>/route', methods=['PUT'])
+def rides_set_route(ride_id):
+    payload = request.get_json(silent=True) or {}
+    try:
+        if payload.get("polyline"):
+            path = decode_polyline(payload["polyline"])
+        else:
+            path = [(float(p[0]), float(p[1])) for p in payload.get("path") or []]
+        stored = _get_ride_store().set_route(ride_id, path, payload.get("length_km"))
+    except (ValueError, TypeError, IndexError) as e:
+        return _standard_response("rides_set_route", {"error": f"path invalide: {e}"}, True, 400)
+    if not stored:
+        return _standard_response("rides_set_route", {"error": "Trajet introuvable"}, True, 404)
+    return _standard_response("rides_set_route", _get_ride_store().get_route(ride_id))
+
+@private_bp.route('/api/rides/<int:ride_id>/route', methods=['GET'])
+def rides_get_route(ride_id):
+    route = _get_ride_store().get_route(ride_id)
+    if not route:
+        return _standard_response("rides_get_route", {"error": "Route introuvable"}, True, 404)
+    return _standard_response("rides_get_route", route)
+
+@private_bp.route('/api/rides/<int:ride_id>', methods=['GET'])
+def rides_get(ride_id):
+    ride = _get_ride_store().get_ride(ride_id)
+    if not ride:
+        return _standard_response("rides_get", {"error": "Trajet introuvable"}, True, 404)
+    return _standard_response("rides_get", ride)
+
+# --- Routing ---
+def _points(payload: Dict[str, Any], key: str) -> List[Any]:
+    points = payload.get(key)
+    if not isinstance(points, list) or not all(isinstance(p, (list, tuple)) and len(p) == 2 for p in points):
+        raise ValueError(f"{key} invalide: liste de [lat, lon] attendue")
+    return points
+
+@private_bp.route('/api/route', methods=['POST'])
+def route():
+    """{"starts": [[lat, lon], ...], "end": [lat, lon], "ride_id": optionnel}"""
+    payload = request.get_json(silent=True) or {}
+    try:
+        starts = _points(payload, "starts")
+        end = _points({"end": [payload.get("end")]}, "end")[0]
+        ride_id = payload.get("ride_id")
+        if ride_id is not None:
+            ride_id = int(ride_id)
+            if len(starts) != 1:
+                return _standard_response("route", {"error": "ride_id demande un seul point de départ"}, True, 400)
+        res = _get_routing_service().route(starts, end)
+    except (ValueError, TypeError) as e:
+        return _standard_response("route", {"error": str(e)}, True, 400)
+    except FileNotFoundError as e:
+        return _standard_response("route", {"error": str(e)}, True, 503)
+    if ride_id is not None:
+        first = res["routes"][0]
+        if not first["path"]:
+            # départ et arrivée non reliés : rien à enregistrer pour ce trajet
+            return _standard_response("route", {"error": "Itinéraire introuvable"}, True, 422)
+        if not _get_ride_store().set_route(ride_id, first["path"], first["distance_km"]):
+            return _standard_response("route", {"error": "Trajet introuvable"}, True, 404)
+        res["ride_id"] = ride_id
+    return _standard_response("route", res)
+
+@private_bp.route('/api/route/eta', methods=['POST'])
+def route_eta():
+    """
+    {"starts": [[lat, lon], ...], "end": [lat, lon], "departure_time": "2026-10-20T08:00"}
+    ou {"ride_id": id} (départ, arrivée et heure du trajet) -> durées selon l'heure de départ
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        if payload.get("ride_id") is not None:
+            ride = _get_ride_store().get_ride(int(payload["ride_id"]))
+            if ride is None:
+                return _standard_response("route_eta", {"error": "Trajet introuvable"}, True, 404)
+            starts = [[ride["start_lat"], ride["start_lon"]]]
+            end = [ride["end_lat"], ride["end_lon"]]
+            departure = ride["departure_time"]
+        else:
+            starts = _points(payload, "starts")
+            end = _points({"end": [payload.get("end")]}, "end")[0]
+            departure = payload.get("departure_time")
+            if not departure:
+                raise ValueError("departure_time manquant")
+        res = _get_routing_service().eta(starts, end, datetime.fromisoformat(str(departure).strip()))
+    except (ValueError, TypeError) as e:
+        return _standard_response("route_eta", {"error": str(e)}, True, 400)
+    except FileNotFoundError as e:
+        return _standard_response("route_eta", {"error": str(e)}, True, 503)
+    if payload.get("ride_id") is not None:
+        res["ride_id"] = int(payload["ride_id"])
+    return _standard_response("route_eta", res)
+
+@private_bp.route('/api/route/isochrone', methods=['POST'])
+def route_isochrone():
+    """
+    {"venue": [lat, lon] ou "place": nom d'un lieu du JSON, "budget": N, "unit": "min"|"km",
+     "arrive_by": "2026-10-20T08:00" (obligatoire en minutes)} -> zone d'où le lieu est atteignable (GeoJSON)
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        if payload.get("place"):
+            found = _search_impl(str(payload["place"]), "place")
+            if not found:
+                return _standard_response("route_isochrone", {"error": "Aucune correspondance"}, True, 404)
+            coords = _geocode_known(found["address_text"])
+            if not coords:
+                return _standard_response("route_isochrone", {"error": "Géocodage: aucun résultat"}, True, 502)
+            venue = [coords["lat"], coords["lon"]]
+        else:
+            venue = _points({"venue": [payload.get("venue")]}, "venue")[0]
+        arrive_by = payload.get("arrive_by")
+        res = _get_routing_service().isochrone(venue, payload.get("budget"), payload.get("unit", "min"),
+                                               datetime.fromisoformat(str(arrive_by).strip()) if arrive_by else None)
+    except (ValueError, TypeError) as e:
+        return _standard_response("route_isochrone", {"error": str(e)}, True, 400)
+    except FileNotFoundError as e:
+        return _standard_response("route_isochrone", {"error": str(e)}, True, 503)
+    if payload.get("place"):
+        res["place"] = found["name"]
+    return _standard_response("route_isochrone", res)
+
+@private_bp.route('/api/route/best-destination', methods=['POST'])
+def route_best_destination():
+    """{"starts": [[lat, lon], ...], "candidates": [[lat, lon], ...], "bounded": optionnel (élagage)}"""
+    payload = request.get_json(silent=True) or {}
+    try:
+        res = _get_routing_service().best_destination(_points(payload, "starts"), _points(payload, "candidates"),
+                                                      bounded=bool(payload.get("bounded", False)))
+    except (ValueError, TypeError) as e:
+        return _standard_response("route_best_destination", {"error": str(e)}, True, 400)
+    except FileNotFoundError as e:
+        return _standard_response("route_best_destination", {"error": str(e)}, True, 503)
+    return _standard_response("route_best_destination", res)
+
+@private_bp.route('/api/route/best-venue', methods=['POST'])
+def route_best_venue():
+    """{"starts": [[lat, lon], ...], "objective": "sum"|"max", "pois": optionnel [[lat, lon], ...]}"""
+    payload = request.get_json(silent=True) or {}
+    try:
+        pois = _points(payload, "pois") if payload.get("pois") is not None else None
+        res = _get_routing_service().best_venue(_points(payload, "starts"), payload.get("objective", "sum"), pois)
+    except (ValueError, TypeError) as e:
+        return _standard_response("route_best_venue", {"error": str(e)}, True, 400)
+    except FileNotFoundError as e:
+        return _standard_response("route_best_venue", {"error": str(e)}, True, 503)
+    return _standard_response("route_best_venue", res)
+
+@private_bp.route('/api/route/pickups', methods=['POST'])
+def route_pickups():
+    """{"driver": [lat, lon], "pickups": [[lat, lon], ...], "end": [lat, lon]} -> ordre de ramassage"""
+    payload = request.get_json(silent=True) or {}
+    try:
+        driver = _points({"driver": [payload.get("driver")]}, "driver")[0]
+        end = _points({"end": [payload.get("end")]}, "end")[0]
+        res = _get_routing_service().plan_pickups(driver, _points(payload, "pickups"), end)
+    except (ValueError, TypeError) as e:
+        return _standard_response("route_pickups", {"error": str(e)}, True, 400)
+    except FileNotFoundError as e:
+        return _standard_response("route_pickups", {"error": str(e)}, True, 503)
+    return _standard_response("route_pickups", res)
+
+@private_bp.route('/api/transit/plan', methods=['POST'])
+def transit_plan():
+    """
+    {"origin": [lat, lon], "destination": [lat, lon], "departure_time": "2026-10-20T07:45",
+     "access": "walk"|"car" (voiture jusqu'au premier arrêt), "max_transfers": optionnel}
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        origin = _points({"origin": [payload.get("origin")]}, "origin")[0]
+        destination = _points({"destination": [payload.get("destination")]}, "destination")[0]
+        departure = payload.get("departure_time")
+        if not departure:
+            raise ValueError("departure_time manquant")
+        res = _get_transit_router().plan(origin, destination, datetime.fromisoformat(str(departure).strip()),
+                                         payload.get("access", "walk"), payload.get("max_transfers", MAX_ROUNDS - 1))
+    except (ValueError, TypeError) as e:
+        return _standard_response("transit_plan", {"error": str(e)}, True, 400)
+    except FileNotFoundError as e:
+        return _standard_response("transit_plan", {"error": str(e)}, True, 503)
+    if not res["journeys"]:
+        return _standard_response("transit_plan", dict(res, error="Aucun itinéraire"), True, 404)
+    return _standard_response("transit_plan", res)
+
+@private_bp.route('/api/route/cache', methods=['GET'])
+def route_cache_stats():
+    """Taille et taux de succès des caches de chemins et d'isochrones de ce worker."""
+    if _ROUTING_SERVICE is None:
+        return _standard_response("route_cache_stats", {"loaded": False})
+    return _standard_response("route_cache_stats", dict(_ROUTING_SERVICE.path_cache.stats(), loaded=True,
+                                                        isochrones=_ROUTING_SERVICE.isochrones.stats()))
+
+# --- Metrics ---
+@private_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Format texte Prometheus, agrégé sur tous les workers si METRICS_DIR est défini."""
+    return Response(metrics.registry.render(), mimetype=None, content_type=metrics.CONTENT_TYPE)
+
 @private_bp.route('/api/map', methods=['GET'])
 def serve_franche_comte_route():
     return render_template("./franche_comte_route.html")
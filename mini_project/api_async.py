@@ -0,0 +1,234 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+ASGI variant of the geo API (Quart + httpx) for the Multimodal Car Pooling Project.
+
+The Nominatim calls (rate-limit sleep + HTTP) are awaited instead of blocking
+a worker thread, so one process can keep thousands of lookups in flight.
+Same routes, same response format and same lookup/address response cache
+(ETag, 304) as api.py, whose helpers it imports; rides and routing stay in
+the Flask app.
+
+    hypercorn api_async:app --bind 0.0.0.0:12346
+    uvicorn api_async:app --port 12346
+'''
+
+#------------------
+# Import
+#------------------
+
+import os
+import time
+import asyncio
+from typing import Dict, Any, Optional
+
+import httpx
+from quart import Quart, Blueprint, request, jsonify, g, Response
+
+import api
+import metrics
+from singleflight import AsyncSingleFlight, SINGLEFLIGHT_DIR
+from api import (_standard_response, _cached_search, _query_params, _geo_search, _coords_result,
+                 _valid_latlon, _GeoError, _geocode_params, _parse_geocode, _reverse_params, _parse_reverse,
+                 _geocode_key, _reverse_key, _GEOCODE_INDEX,
+                 NOMINATIM_BASE, NOMINATIM_USER_AGENT, NOMINATIM_DELAY_S,
+                 REQUEST_SECONDS, REQUESTS_TOTAL, ERRORS_TOTAL, UPSTREAM_SECONDS, UPSTREAM_SLEEP_SECONDS,
+                 CACHE_TOTAL, SINGLEFLIGHT_TOTAL)
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "100"))
+
+#------------------
+# Quart API part
+#------------------
+
+app = Quart(__name__)
+
+public_bp = Blueprint("public", __name__)
+
+@public_bp.route("/isalive", methods=["GET"])
+async def is_alive():
+    return "OK", 200
+
+app.register_blueprint(public_bp)
+
+private_bp = Blueprint("private", __name__)
+
+_CLIENT: Optional[httpx.AsyncClient] = None
+
+@app.before_serving
+async def _open_client():
+    global _CLIENT
+    _CLIENT = httpx.AsyncClient(
+        headers={"User-Agent": NOMINATIM_USER_AGENT, "Accept": "application/json"},
+        timeout=10,
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS),
+    )
+
+@app.after_serving
+async def _close_client():
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+
+@app.before_request
+async def _metrics_start():
+    g.metrics_t0 = time.perf_counter()
+
+@app.after_request
+async def _metrics_record(response):
+    t0 = getattr(g, "metrics_t0", None)
+    if t0 is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - t0, route=route, method=request.method)
+        REQUESTS_TOTAL.inc(route=route, method=request.method, status=response.status_code)
+        if response.status_code >= 400:
+            ERRORS_TOTAL.inc(route=route, method=request.method, status=response.status_code)
+        metrics.registry.flush()
+    return response
+
+#------------------
+# Upstream (async)
+#------------------
+
+async def _http_get(url: str, params: Dict[str, Any]) -> Any:
+    r = await _CLIENT.get(url, params=params)
+    r.raise_for_status()
+    return r.json()
+
+# un seul créneau d'appel Nominatim pour tout le process: les appels partent à NOMINATIM_DELAY_S
+# d'intervalle, les suivants attendent (sans thread) sur le verrou
+_UPSTREAM_LOCK = asyncio.Lock()
+_UPSTREAM_NEXT = 0.0
+
+async def _rate_limit_sleep(func_name: str):
+    global _UPSTREAM_NEXT
+    t0 = time.monotonic()
+    async with _UPSTREAM_LOCK:
+        delay = _UPSTREAM_NEXT - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        _UPSTREAM_NEXT = time.monotonic() + NOMINATIM_DELAY_S
+    UPSTREAM_SLEEP_SECONDS.inc(time.monotonic() - t0, func=func_name)
+
+async def _geocode_upstream(address_text: str) -> Optional[Dict[str, float]]:
+    with UPSTREAM_SECONDS.time(func="geocode"):
+        await _rate_limit_sleep("geocode")
+        return _parse_geocode(await _http_get(f"{NOMINATIM_BASE}/search", _geocode_params(address_text)))
+
+async def _reverse_upstream(lat: float, lon: float) -> Optional[Dict[str, Any]]:
+    with UPSTREAM_SECONDS.time(func="reverse"):
+        await _rate_limit_sleep("reverse")
+        return _parse_reverse(await _http_get(f"{NOMINATIM_BASE}/reverse", _reverse_params(lat, lon)))
+
+_GEOCODE_FLIGHT = AsyncSingleFlight(SINGLEFLIGHT_DIR, lambda role: SINGLEFLIGHT_TOTAL.inc(func="geocode", role=role))
+_REVERSE_FLIGHT = AsyncSingleFlight(SINGLEFLIGHT_DIR, lambda role: SINGLEFLIGHT_TOTAL.inc(func="reverse", role=role))
+
+async def _geocode(address_text: str) -> Optional[Dict[str, float]]:
+    return await _GEOCODE_FLIGHT.do(_geocode_key(address_text), lambda: _geocode_upstream(address_text))
+
+async def _reverse(lat: float, lon: float) -> Optional[Dict[str, Any]]:
+    return await _REVERSE_FLIGHT.do(_reverse_key(lat, lon), lambda: _reverse_upstream(lat, lon))
+
+async def _geocode_known(address_text: str) -> Optional[Dict[str, float]]:
+    """Index pré-calculé de api.py (rempli en tâche de fond), sinon Nominatim."""
+    coords = _GEOCODE_INDEX.get(address_text)
+    CACHE_TOTAL.inc(cache="geocode_index", result="hit" if coords else "miss")
+    if coords:
+        return coords
+    coords = await _geocode(address_text)
+    if coords:
+        _GEOCODE_INDEX.put(address_text, coords)
+    return coords
+
+#------------------
+# Routes
+#------------------
+
+async def _coords(func_name: str, params: Dict[str, Any]):
+    try:
+        # rechargement de address.json + recherche floue: hors de la boucle d'événements
+        res = await asyncio.to_thread(_geo_search, params)
+    except _GeoError as e:
+        return _standard_response(func_name, {"error": str(e)}, True, e.code)
+    coords = await _geocode_known(res["address_text"])
+    if not coords:
+        return _standard_response(func_name, {"error": "Géocodage: aucun résultat"}, True, 502)
+    return _standard_response(func_name, _coords_result(res, coords))
+
+async def _reverse_response(func_name: str, lat: str, lon: str):
+    try:
+        latf, lonf = _valid_latlon({"lat": lat, "lon": lon})
+    except _GeoError as e:
+        return _standard_response(func_name, {"error": str(e)}, True, e.code)
+    addr = await _reverse(latf, lonf)
+    if not addr:
+        return _standard_response(func_name, {"error": "Reverse: aucun résultat"}, True, 502)
+    return _standard_response(func_name, {"address": addr, "provider": "nominatim"})
+
+@private_bp.route('/api', methods=['GET'])
+async def get_root():
+    return jsonify({
+        "return_code": "OK",
+        "response": "Template API answer",
+        "data": {"parameter": "value"}
+    }), 200
+
+# --- Lookup / Address (même cache de réponses et ETag que api.py, calculées dans un thread) ---
+@private_bp.route('/api/geo/lookup', methods=['GET'])
+async def geo_lookup():
+    return await asyncio.to_thread(_cached_search, "geo_lookup", "lookup", _query_params(None, request.args),
+                                   request._get_current_object(), app.json.dumps)
+
+@private_bp.route('/api/geo/lookup/<path:q>', methods=['GET'])
+async def geo_lookup_path(q):
+    return await asyncio.to_thread(_cached_search, "geo_lookup_path", "lookup", _query_params(q, request.args),
+                                   request._get_current_object(), app.json.dumps)
+
+@private_bp.route('/api/geo/address', methods=['GET'])
+async def geo_address():
+    return await asyncio.to_thread(_cached_search, "geo_address", "address", _query_params(None, request.args),
+                                   request._get_current_object(), app.json.dumps)
+
+@private_bp.route('/api/geo/address/<path:q>', methods=['GET'])
+async def geo_address_path(q):
+    return await asyncio.to_thread(_cached_search, "geo_address_path", "address", _query_params(q, request.args),
+                                   request._get_current_object(), app.json.dumps)
+
+# --- Coords ---
+@private_bp.route('/api/geo/coords', methods=['GET'])
+async def geo_coords():
+    return await _coords("geo_coords", _query_params(None, request.args))
+
+@private_bp.route('/api/geo/coords/<path:q>', methods=['GET'])
+async def geo_coords_path(q):
+    return await _coords("geo_coords_path", _query_params(q, request.args))
+
+# --- Reverse ---
+@private_bp.route('/api/geo/reverse', methods=['GET'])
+async def geo_reverse():
+    return await _reverse_response("geo_reverse", request.args.get("lat", ""), request.args.get("lon", ""))
+
+@private_bp.route('/api/geo/reverse/<lat>/<lon>', methods=['GET'])
+async def geo_reverse_path(lat, lon):
+    return await _reverse_response("geo_reverse_path", lat, lon)
+
+# --- Metrics ---
+@private_bp.route('/metrics', methods=['GET'])
+async def prometheus_metrics():
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+#------------------
+# Register blueprint
+#------------------
+
+app.register_blueprint(private_bp)
+
+#------------------
+# Main
+#------------------
+
+if __name__ == '__main__':
+    app.run(debug=api.args.verbose, port=12346, host="0.0.0.0")
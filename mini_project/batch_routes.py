@@ -0,0 +1,178 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+Batch version of compute_routes.py: many carpool groups, one graph load.
+
+    python3 batch_routes.py groups.jsonl -o out/ --workers 4 --maps
+
+One group per line of the input (JSONL):
+    {"id": "g1", "starts": [[lat, lon], ...], "candidates": [[lat, lon], ...]}
+
+The graph is built once (bbox around every point of the file unless --bbox
+is given), then the groups are routed by a pool of forked workers that share
+it copy-on-write. Each group gives out/<id>.json (same content as
+/api/route/best-destination) and, with --maps, out/<id>.html; one summary
+line per group is streamed to out/summary.jsonl and stdout as soon as the
+group is done.
+'''
+
+import os
+import re
+import sys
+import json
+import argparse
+import multiprocessing
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import folium
+
+from routing import RoutingService, calculate_bbox, PARQUET_FILE
+from instrumentation import stage
+
+BASE_COLORS = ["blue", "purple", "darkgreen", "cadetblue"]
+
+# Set in the parent before the fork, inherited by the pool workers
+_SERVICE: Optional[RoutingService] = None
+_OPTIONS: Dict[str, Any] = {}
+
+# --- Input ---
+
+def read_groups(path: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """(line number, group) for every non-empty line; bad lines come back as {"error": ...}."""
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                group = json.loads(line)
+                if not isinstance(group, dict):
+                    raise ValueError("objet JSON attendu")
+            except ValueError as e:
+                group = {"error": f"ligne {lineno}: {e}"}
+            group.setdefault("id", f"line{lineno}")
+            yield lineno, group
+
+def groups_bbox(path: str, buffer: float = 0.1):
+    coords = []
+    for _, group in read_groups(path):
+        for key in ("starts", "candidates"):
+            for p in group.get(key) or []:
+                try:
+                    coords.append((float(p[0]), float(p[1])))
+                except (TypeError, ValueError, IndexError):
+                    pass
+    if not coords:
+        raise ValueError(f"aucun point valide dans {path}")
+    return calculate_bbox(coords, buffer=buffer)
+
+def _safe_name(group_id: Any) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", str(group_id))[:100] or "group"
+
+# --- One group ---
+
+def render_map(result: Dict[str, Any], candidates, output_file: str):
+    """Same drawing as compute_routes.py, without the image popups."""
+    best = result["end"]
+    m = folium.Map(location=best, zoom_start=10)
+    for i, r in enumerate(result["routes"]):
+        folium.Marker(r["start"], icon=folium.Icon(color=BASE_COLORS[i % len(BASE_COLORS)], icon="play")).add_to(m)
+    for pt in candidates:
+        is_best = list(pt) == best
+        icon = folium.Icon(color="red" if is_best else "gray", icon=("star" if is_best else "question-sign"))
+        folium.Marker(pt, popup="Destination" if is_best else "Destination potentielle", icon=icon).add_to(m)
+    for i, r in enumerate(result["routes"]):
+        if len(r["path"]) > 1:
+            folium.PolyLine(r["path"], color=BASE_COLORS[i % len(BASE_COLORS)], weight=4, opacity=0.8,
+                            tooltip=f"Route from Start {i+1}").add_to(m)
+    m.save(output_file)
+
+def process_group(item: Tuple[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """Routes one group and writes its files; returns the summary line."""
+    lineno, group = item
+    name = _safe_name(group["id"])
+    summary = {"id": group["id"], "line": lineno}
+    try:
+        if "error" in group:
+            raise ValueError(group["error"])
+        starts, candidates = group.get("starts"), group.get("candidates")
+        if not isinstance(starts, list) or not isinstance(candidates, list):
+            raise ValueError("starts et candidates doivent être des listes de [lat, lon]")
+        result = _SERVICE.best_destination(starts, candidates, bounded=_OPTIONS.get("bounded", False))
+    except (ValueError, TypeError, IndexError) as e:
+        summary["error"] = str(e)
+        return summary
+    result["id"] = group["id"]
+    out_dir = _OPTIONS["output_dir"]
+    with open(os.path.join(out_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+        json.dump(result, f)
+    summary.update({
+        "best_index": result["best_index"],
+        "total_km": result["scores"][result["best_index"]]["total_km"],
+        "file": f"{name}.json",
+    })
+    if _OPTIONS.get("maps"):
+        render_map(result, candidates, os.path.join(out_dir, f"{name}.html"))
+        summary["map"] = f"{name}.html"
+    return summary
+
+# --- Batch ---
+
+def run_batch(input_file: str, output_dir: str, service: RoutingService, workers: int = 1,
+              maps: bool = False, bounded: bool = False) -> Dict[str, int]:
+    global _SERVICE, _OPTIONS
+    _SERVICE = service
+    _OPTIONS = {"output_dir": output_dir, "maps": maps, "bounded": bounded}
+    os.makedirs(output_dir, exist_ok=True)
+    counts = {"groups": 0, "ok": 0, "errors": 0}
+    groups = read_groups(input_file)
+    with open(os.path.join(output_dir, "summary.jsonl"), "w", encoding="utf-8") as summary_file, \
+            stage("batch") as rec:
+        if workers > 1:
+            # fork: the workers inherit the graph built above instead of rebuilding it
+            methods = multiprocessing.get_all_start_methods()
+            ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+            pool = ctx.Pool(workers)
+            results = pool.imap_unordered(process_group, groups, chunksize=4)
+        else:
+            pool = None
+            results = map(process_group, groups)
+        try:
+            for summary in results:
+                counts["groups"] += 1
+                counts["errors" if "error" in summary else "ok"] += 1
+                line = json.dumps(summary)
+                summary_file.write(line + "\n")
+                summary_file.flush()
+                print(line, flush=True)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        rec.items = counts["groups"]
+    return counts
+
+# --- Main ---
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Route many carpool groups (JSONL) with one graph load")
+    parser.add_argument("input", help="JSONL file, one group per line")
+    parser.add_argument("-o", "--output-dir", default="batch_results")
+    parser.add_argument("--parquet", default=PARQUET_FILE)
+    parser.add_argument("--bbox", help="min_lat,max_lat,min_lon,max_lon (default: around every point of the input)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--maps", action="store_true", help="also write one folium map per group")
+    parser.add_argument("--bounded", action="store_true", help="branch-and-bound scoring (only the best total)")
+    args = parser.parse_args()
+
+    bbox = tuple(float(x) for x in args.bbox.split(",")) if args.bbox else groups_bbox(args.input)
+    service = RoutingService(args.parquet, bbox=bbox)
+    counts = run_batch(args.input, args.output_dir, service, args.workers, args.maps, args.bounded)
+    service.close()
+    print(f"{counts['groups']} groups, {counts['ok']} ok, {counts['errors']} errors -> {args.output_dir}",
+          file=sys.stderr)
+    sys.exit(1 if counts["errors"] and not counts["ok"] else 0)
@@ -0,0 +1,178 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+Benchmarks of the routing pipeline (routing.py) on synthetic road networks.
+
+    python3 benchmarks/bench_routing.py --sizes fixture 10k 100k --repeat 3
+    python3 benchmarks/bench_routing.py --sizes 10k --compare benchmarks/results/previous.json
+
+Results are written as JSON (one entry per size, min/median seconds per stage).
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from routing import (RoutingService, load_highways, filter_bbox, build_graph, calculate_bbox,
+                     compute_paths, find_meeting_points)
+from compute_routes import render_map
+from synthetic import FIXTURE_FILE, ORIGIN, SPAN_DEG, parse_size, write_parquet, sample_points
+
+RESULTS_DIR = os.path.join(HERE, "results")
+STAGES = ["load", "bbox_filter", "graph_build", "snapping", "scoring", "scoring_cached", "path_extraction",
+          "meeting_points", "map_rendering"]
+
+# --- Helpers ---
+
+def timed(fn, repeat):
+    """Runs fn repeat times, returns (last result, list of durations in s)."""
+    durations, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        durations.append(time.perf_counter() - t0)
+    return result, durations
+
+def summary(durations):
+    return {"min_s": min(durations), "median_s": statistics.median(durations), "repeat": len(durations)}
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# --- Benchmark of one graph size ---
+
+def bench_size(size, repeat, n_starts, n_ends, seed, workdir):
+    if size == "fixture":
+        parquet_file = FIXTURE_FILE
+    else:
+        parquet_file = write_parquet(os.path.join(workdir, f"highways_{size}.parquet"), parse_size(size), seed)
+
+    starts = sample_points(n_starts, seed)
+    ends = sample_points(n_ends, seed + 100)
+    # Same bbox logic as compute_routes.py, over a sub-area so the filter has work to do
+    bbox = calculate_bbox(starts + ends, buffer=0.02)
+    stages = {}
+
+    raw, d = timed(lambda: load_highways(parquet_file), repeat)
+    stages["load"] = summary(d)
+
+    df, d = timed(lambda: filter_bbox(raw, bbox), repeat)
+    stages["bbox_filter"] = summary(d)
+
+    G, d = timed(lambda: build_graph(df), repeat)
+    stages["graph_build"] = summary(d)
+
+    service = RoutingService(G=G)
+    (start_nodes, end_nodes), d = timed(lambda: ([service.snap(p) for p in starts],
+                                                  [service.snap(p) for p in ends]), repeat)
+    stages["snapping"] = summary(d)
+
+    def score_cold():
+        # score() goes through the path cache: every repeat starts empty, warm calls are timed apart
+        service.path_cache.clear()
+        return service.score(start_nodes, end_nodes)
+
+    scores, d = timed(score_cold, repeat)
+    stages["scoring"] = summary(d)
+    _, d = timed(lambda: service.score(start_nodes, end_nodes), repeat)
+    stages["scoring_cached"] = summary(d)
+    best = min(range(len(ends)), key=scores.__getitem__)
+
+    paths, d = timed(lambda: compute_paths(G, start_nodes, end_nodes[best], service.labels), repeat)
+    stages["path_extraction"] = summary(d)
+
+    _, d = timed(lambda: find_meeting_points(paths), repeat)
+    stages["meeting_points"] = summary(d)
+
+    html = os.path.join(workdir, f"map_{size}.html")
+    # compute_routes.py drawing, the image popups left out (no image files here)
+    _, d = timed(lambda: render_map(starts, ends, ends[best], paths, html), repeat)
+    stages["map_rendering"] = summary(d)
+
+    return {
+        "size": size,
+        "parquet_rows": len(df),
+        "n_nodes": G.number_of_nodes(),
+        "n_edges": G.number_of_edges(),
+        "n_starts": n_starts,
+        "n_ends": n_ends,
+        "stages": stages,
+    }
+
+def compare(current, previous_file, threshold):
+    """Prints the stages whose median got slower than threshold x the previous run."""
+    with open(previous_file, "r", encoding="utf-8") as f:
+        previous = {r["size"]: r for r in json.load(f)["runs"]}
+    regressions = 0
+    for run in current["runs"]:
+        old = previous.get(run["size"])
+        if not old:
+            continue
+        for stage, res in run["stages"].items():
+            before = old["stages"].get(stage, {}).get("median_s")
+            if not before:
+                continue
+            ratio = res["median_s"] / before
+            flag = "REGRESSION" if ratio > threshold else ""
+            regressions += bool(flag)
+            print(f"{run['size']:>8} {stage:<18} {before:9.4f}s -> {res['median_s']:9.4f}s  x{ratio:5.2f} {flag}")
+    return regressions
+
+# --- Main ---
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Routing pipeline benchmarks")
+    parser.add_argument("--sizes", nargs="+", default=["fixture", "10k"],
+                        help="fixture, 10k, 100k, 1m, 5m or a node count")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--starts", type=int, default=10)
+    parser.add_argument("--ends", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="JSON file (default: benchmarks/results/bench_<date>.json)")
+    parser.add_argument("--compare", help="previous JSON result to compare with")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "area": {"origin": ORIGIN, "span_deg": SPAN_DEG},
+        "runs": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="bench_routing_") as workdir:
+        for size in args.sizes:
+            print(f"--- {size} ---")
+            run = bench_size(size, args.repeat, args.starts, args.ends, args.seed, workdir)
+            report["runs"].append(run)
+            for stage in STAGES:
+                print(f"{stage:<18} {run['stages'][stage]['median_s']:9.4f}s")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        sys.exit(1 if compare(report, args.compare, args.threshold) else 0)
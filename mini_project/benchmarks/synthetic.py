@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+Reproducible synthetic road networks in the highways.parquet layout
+(columns id, highway, nodes = list of (lat, lon)) for the benchmarks.
+'''
+
+import os
+import math
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Approximate number of graph nodes per preset
+SIZES = {
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+    "5m": 5_000_000,
+}
+
+# Area covered by the synthetic network (around Belfort / Montbéliard)
+ORIGIN = (47.40, 6.60)
+SPAN_DEG = 0.5
+
+HIGHWAY_CLASSES = ["residential", "tertiary", "secondary", "primary"]
+
+FIXTURE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "small_highways.parquet")
+
+def parse_size(size):
+    if isinstance(size, int):
+        return size
+    key = str(size).lower()
+    if key in SIZES:
+        return SIZES[key]
+    return int(key)
+
+def generate_ways(n_nodes, seed=0, drop_ratio=0.05, jitter=0.2):
+    """
+    Jittered square grid of about n_nodes nodes cut into ways of a few
+    segments; drop_ratio of the ways are removed so that the graph has
+    detours and a few islands, like an OSM extract.
+    """
+    rng = np.random.default_rng(seed)
+    side = max(2, int(math.isqrt(n_nodes)))
+    step = SPAN_DEG / side
+    lat = ORIGIN[0] + np.arange(side)[:, None] * step + rng.uniform(-jitter, jitter, (side, side)) * step
+    lon = ORIGIN[1] + np.arange(side)[None, :] * step + rng.uniform(-jitter, jitter, (side, side)) * step
+    lat, lon = np.round(lat, 7), np.round(lon, 7)
+
+    ways = []
+    way_len = 8
+    for axis in (0, 1):
+        for line in range(side):
+            if axis == 0:
+                pts = list(zip(lat[line, :].tolist(), lon[line, :].tolist()))
+            else:
+                pts = list(zip(lat[:, line].tolist(), lon[:, line].tolist()))
+            # every 4th line is a bigger road, every 16th a primary
+            level = 3 if line % 16 == 0 else 2 if line % 8 == 0 else 1 if line % 4 == 0 else 0
+            cls = HIGHWAY_CLASSES[level]
+            for start in range(0, side - 1, way_len):
+                if rng.random() < drop_ratio:
+                    continue
+                ways.append((cls, pts[start:start + way_len + 1]))
+    return pd.DataFrame({
+        "id": np.arange(len(ways), dtype=np.int64),
+        "highway": [w[0] for w in ways],
+        "nodes": [w[1] for w in ways],
+    })
+
+def sample_points(n, seed=0):
+    """n random (lat, lon) inside the synthetic area."""
+    rng = np.random.default_rng(seed + 1)
+    lats = ORIGIN[0] + rng.uniform(0.05, 0.95, n) * SPAN_DEG
+    lons = ORIGIN[1] + rng.uniform(0.05, 0.95, n) * SPAN_DEG
+    return [(float(a), float(b)) for a, b in zip(lats, lons)]
+
+def write_parquet(path, n_nodes, seed=0):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    generate_ways(n_nodes, seed).to_parquet(path, engine="pyarrow", index=False)
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic highways parquet")
+    parser.add_argument("output", nargs="?", default=FIXTURE_FILE)
+    parser.add_argument("-n", "--nodes", default="2500", help="node count or preset (10k, 100k, 1m, 5m)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(f"Saved {write_parquet(args.output, parse_size(args.nodes), args.seed)}")
@@ -1,11 +1,11 @@
-import pandas as pd
 import os
-import networkx as nx
-from tqdm import tqdm
-import math
 import folium
-from collections import defaultdict
 import base64, mimetypes
+from datetime import datetime
+
+from routing import RoutingService, calculate_bbox
+from time_profiles import SpeedProfiles, PROFILES_FILE
+from instrumentation import stage
 
 # --- Configuration ---
 start_points_coords = [
@@ -33,6 +33,13 @@ IMG_ARRIVEE_FILE = "/var/www/html/img/rdc_cuisine_arrivee.png"
 
 parquet_file = "highways.parquet"
 
+# > 1 : scoring des destinations sur plusieurs process (graphe partagé en mmap)
+workers = int(os.environ.get("ROUTING_WORKERS", "1"))
+# 1 : scoring par séparation-évaluation (seul le total du meilleur point est calculé)
+bounded = os.environ.get("ROUTING_BOUNDED", "0") == "1"
+# "2026-10-20T08:00" : durées vers le meilleur point avec les profils de vitesse horaires
+departure = os.environ.get("ROUTING_DEPARTURE")
+
 # --- Helpers ---
 
 def img_to_data_uri(filepath: str) -> str:
@@ -55,131 +62,77 @@ def make_image_popup(title, img_data_uri, width=560, height=480):
     </div>"""
     return folium.Popup(folium.IFrame(html=html, width=width, height=height), max_width=width + 20)
 
-def haversine_distance(coord1, coord2):
-    R = 6371
-    lat1, lon1 = math.radians(coord1[0]), math.radians(coord1[1])
-    lat2, lon2 = math.radians(coord2[0]), math.radians(coord2[1])
-    dlon = lon2 - lon1
-    dlat = lon2 - lat1
-    a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-def calculate_bbox(coords, buffer=0.1):
-    if not coords:
-        return 0, 0, 0, 0
-    min_lat = min(c[0] for c in coords) - buffer
-    max_lat = max(c[0] for c in coords) + buffer
-    min_lon = min(c[1] for c in coords) - buffer
-    max_lon = max(c[1] for c in coords) + buffer
-    return min_lat, max_lat, min_lon, max_lon
-
-def check_row_in_bbox(nodes, min_lat, max_lat, min_lon, max_lon):
-    for lat, lon in nodes:
-        if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
-            return True
-    return False
-
-def nearest_node_by_road(G, point, k=5):
-    if not G.nodes:
-        return point
-    candidates = sorted(G.nodes, key=lambda n: haversine_distance(n, point))[:k]
-    best_node, best_dist = None, float("inf")
-    for node in candidates:
-        snap_dist = haversine_distance(point, node)
-        if snap_dist < best_dist:
-            best_node, best_dist = node, snap_dist
-    return best_node
-
-def dijkstra_path(G, source, target):
-    return nx.dijkstra_path(G, source, target, weight='weight')
-
-# --- Data loading ---
-if not os.path.exists(parquet_file):
-    raise FileNotFoundError(f"Parquet file '{parquet_file}' not found. Run the parser first.")
-
-df = pd.read_parquet(parquet_file)
-
-# Bounding box + filter
-all_coords = start_points_coords + potential_end_points_coords
-min_lat, max_lat, min_lon, max_lon = calculate_bbox(all_coords, buffer=0.1)
-
-tqdm.write("Filtering DataFrame by Bounding Box...")
-df_filtered = df[df['nodes'].apply(lambda x: check_row_in_bbox(x, min_lat, max_lat, min_lon, max_lon))]
-tqdm.write(f"Filtered from {len(df)} rows to {len(df_filtered)} rows.")
-del df
-
-# Build graph
-G = nx.Graph()
-for _, row in tqdm(df_filtered.iterrows(), total=len(df_filtered), desc="Building Graph"):
-    nodes = row['nodes']
-    for i in range(len(nodes) - 1):
-        a = tuple(nodes[i]); b = tuple(nodes[i+1])
-        G.add_edge(a, b, weight=haversine_distance(a, b))
-
-# Routing
-start_nodes = [nearest_node_by_road(G, pt) for pt in start_points_coords]
-
-end_point_scores = {}
-for end_point in potential_end_points_coords:
-    end_node = nearest_node_by_road(G, end_point)
-    total_distance = 0
-    for start_node in start_nodes:
-        try:
-            total_distance += nx.dijkstra_path_length(G, start_node, end_node, weight='weight')
-        except nx.NetworkXNoPath:
-            total_distance += float('inf')
-    end_point_scores[end_point] = total_distance
-
-best_end_point = min(end_point_scores, key=end_point_scores.get)
-best_end_node  = nearest_node_by_road(G, best_end_point)
-
-paths = []
-for s in start_nodes:
-    try:
-        paths.append(dijkstra_path(G, s, best_end_node))
-    except nx.NetworkXNoPath:
-        paths.append([])
-
-# --- Colors / meeting points (inchangé et simple) ---
-base_colors = ["blue", "purple", "darkgreen", "cadetblue"]
-m = folium.Map(location=best_end_point, zoom_start=10)
-
-# Encode les images en data:URI (une fois pour toutes)
-IMG_DEPART_DATA  = img_to_data_uri(IMG_DEPART_FILE)
-IMG_ARRIVEE_DATA = img_to_data_uri(IMG_ARRIVEE_FILE)
-
-# Start markers (image dans popup)
-for i, pt in enumerate(start_points_coords):
-    icon = folium.Icon(color=base_colors[i % len(base_colors)], icon="play")
-    popup = make_image_popup(f"Départ {i+1} – Plan RDC (Salon)", IMG_DEPART_DATA)
-    folium.Marker(pt, popup=popup, icon=icon).add_to(m)
-
-# End markers (image seulement sur le meilleur)
-for pt in potential_end_points_coords:
-    is_best = (pt == best_end_point)
-    color = "red" if is_best else "gray"
-    icon   = folium.Icon(color=color, icon=("star" if is_best else "question-sign"))
-    if is_best:
-        popup = make_image_popup("Arrivée – Plan RDC (Cuisine)", IMG_ARRIVEE_DATA)
+def render_map(start_points, end_points, best_end_point, paths, output_file,
+               img_depart_data=None, img_arrivee_data=None):
+    """
+    Carte Folium: départs, destinations (la meilleure en rouge) et routes
+    (une PolyLine par segment), enregistrée dans output_file. Sans image
+    (data:URI), les popups sont du texte seul.
+    """
+    base_colors = ["blue", "purple", "darkgreen", "cadetblue"]
+    m = folium.Map(location=best_end_point, zoom_start=10)
+
+    # Start markers (image dans popup)
+    for i, pt in enumerate(start_points):
+        icon = folium.Icon(color=base_colors[i % len(base_colors)], icon="play")
+        title = f"Départ {i+1} – Plan RDC (Salon)"
+        popup = make_image_popup(title, img_depart_data) if img_depart_data else title
         folium.Marker(pt, popup=popup, icon=icon).add_to(m)
-    else:
-        folium.Marker(pt, popup="Destination potentielle", icon=icon).add_to(m)
-
-# Draw paths
-for i, path in enumerate(paths):
-    if not path: 
-        continue
-    for j in range(len(path) - 1):
-        folium.PolyLine([path[j], path[j+1]],
-                        color=base_colors[i % len(base_colors)],
-                        weight=4, opacity=0.8,
-                        tooltip=f"Route from Start {i+1}").add_to(m)
-
-print("---")
-print(f"Best End Point: {best_end_point}")
-print(f"Total Distances: {end_point_scores}")
-print("---")
-
-output_file = "templates/franche_comte_route.html"
-m.save(output_file)
+
+    # End markers (image seulement sur le meilleur)
+    for pt in end_points:
+        is_best = (pt == best_end_point)
+        color = "red" if is_best else "gray"
+        icon   = folium.Icon(color=color, icon=("star" if is_best else "question-sign"))
+        if is_best:
+            title = "Arrivée – Plan RDC (Cuisine)"
+            popup = make_image_popup(title, img_arrivee_data) if img_arrivee_data else title
+            folium.Marker(pt, popup=popup, icon=icon).add_to(m)
+        else:
+            folium.Marker(pt, popup="Destination potentielle", icon=icon).add_to(m)
+
+    # Draw paths
+    with stage("map_render", items=sum(len(p) for p in paths)):
+        for i, path in enumerate(paths):
+            if not path:
+                continue
+            for j in range(len(path) - 1):
+                folium.PolyLine([path[j], path[j+1]],
+                                color=base_colors[i % len(base_colors)],
+                                weight=4, opacity=0.8,
+                                tooltip=f"Route from Start {i+1}").add_to(m)
+
+    with stage("map_save"):
+        m.save(output_file)
+    return m
+
+# --- Main ---
+
+def main():
+    # --- Graph (bbox autour des points) + routing ---
+    all_coords = start_points_coords + potential_end_points_coords
+    profiles = SpeedProfiles.from_csv(os.environ.get("ROUTING_SPEED_PROFILES", PROFILES_FILE)) if departure else None
+    service = RoutingService(parquet_file, bbox=calculate_bbox(all_coords, buffer=0.1), workers=workers,
+                             path_cache_file=os.environ.get("ROUTING_PATH_CACHE"), profiles=profiles)
+
+    result = service.best_destination(start_points_coords, potential_end_points_coords, bounded=bounded)
+    best_end_point = potential_end_points_coords[result["best_index"]]
+    end_point_scores = {c: s["total_km"] for c, s in zip(potential_end_points_coords, result["scores"])}
+    paths = [[tuple(p) for p in r["path"]] for r in result["routes"]]
+    etas = service.eta(start_points_coords, best_end_point, datetime.fromisoformat(departure))["routes"] if departure else []
+    service.close()
+
+    print("---")
+    print(f"Best End Point: {best_end_point}")
+    print(f"Total Distances: {end_point_scores}")
+    for i, r in enumerate(etas):
+        print(f"Start {i+1}: {r['duration_min']} min, arrival {r['arrival_time']}")
+    print("---")
+
+    # Encode les images en data:URI (une fois pour toutes)
+    render_map(start_points_coords, potential_end_points_coords, best_end_point, paths,
+               "templates/franche_comte_route.html",
+               img_to_data_uri(IMG_DEPART_FILE), img_to_data_uri(IMG_ARRIVEE_FILE))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+Route geometry helpers for corridor matching:
+compressed polylines, grid cells covered by a route, point/segment distance
+'''
+
+#------------------
+# Import
+#------------------
+
+import math
+from typing import Dict, List, Sequence, Tuple, Iterable
+
+Coord = Tuple[float, float]
+
+# Grid used to index route segments (~550 m in latitude, ~380 m in longitude here)
+CELL_DEG = 0.005
+KM_PER_DEG_LAT = 111.32
+
+#------------------
+# Encoded polyline (Google algorithm, 1e-5 precision)
+#------------------
+
+def _encode_value(value: int, out: List[str]):
+    value = ~(value << 1) if value < 0 else (value << 1)
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+def encode_polyline(path: Sequence[Coord], precision: int = 5) -> str:
+    factor = 10 ** precision
+    out: List[str] = []
+    prev_lat = prev_lon = 0
+    for lat, lon in path:
+        ilat, ilon = int(round(lat * factor)), int(round(lon * factor))
+        _encode_value(ilat - prev_lat, out)
+        _encode_value(ilon - prev_lon, out)
+        prev_lat, prev_lon = ilat, ilon
+    return "".join(out)
+
+def decode_polyline(encoded: str, precision: int = 5) -> List[Coord]:
+    factor = 10 ** precision
+    coords: List[Coord] = []
+    index = lat = lon = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1f) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        coords.append((lat / factor, lon / factor))
+    return coords
+
+#------------------
+# Grid cells
+#------------------
+
+def cell_of(lat: float, lon: float) -> Tuple[int, int]:
+    return int(math.floor((lat + 90.0) / CELL_DEG)), int(math.floor((lon + 180.0) / CELL_DEG))
+
+def cell_key(row: int, col: int) -> int:
+    return row * 1_000_000 + col
+
+def cells_in_bbox(min_lat: float, max_lat: float, min_lon: float, max_lon: float) -> List[int]:
+    r0, c0 = cell_of(min_lat, min_lon)
+    r1, c1 = cell_of(max_lat, max_lon)
+    return [cell_key(r, c) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)]
+
+def cells_near(lat: float, lon: float, radius_km: float) -> List[int]:
+    dlat = radius_km / KM_PER_DEG_LAT
+    dlon = radius_km / (KM_PER_DEG_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    return cells_in_bbox(lat - dlat, lat + dlat, lon - dlon, lon + dlon)
+
+def route_cells(path: Sequence[Coord]) -> Dict[int, Tuple[int, int]]:
+    """
+    cell -> (first, last) index of the path segments whose bbox touches the cell.
+    OSM segments are short, so the bbox of a segment covers only a few cells.
+    """
+    cells: Dict[int, Tuple[int, int]] = {}
+    if len(path) == 1:
+        path = [path[0], path[0]]
+    for i in range(len(path) - 1):
+        (lat1, lon1), (lat2, lon2) = path[i], path[i + 1]
+        for key in cells_in_bbox(min(lat1, lat2), max(lat1, lat2), min(lon1, lon2), max(lon1, lon2)):
+            if key in cells:
+                first, _ = cells[key]
+                cells[key] = (first, i)
+            else:
+                cells[key] = (i, i)
+    return cells
+
+#------------------
+# Distances
+#------------------
+
+def point_segment_km(p: Coord, a: Coord, b: Coord) -> float:
+    """Point to segment distance, local equirectangular projection (fine below ~50 km)."""
+    kx = KM_PER_DEG_LAT * math.cos(math.radians(p[0]))
+    ax, ay = (a[1] - p[1]) * kx, (a[0] - p[0]) * KM_PER_DEG_LAT
+    bx, by = (b[1] - p[1]) * kx, (b[0] - p[0]) * KM_PER_DEG_LAT
+    dx, dy = bx - ax, by - ay
+    seg2 = dx * dx + dy * dy
+    t = 0.0 if seg2 == 0 else max(0.0, min(1.0, -(ax * dx + ay * dy) / seg2))
+    x, y = ax + t * dx, ay + t * dy
+    return math.hypot(x, y)
+
+def segments_within(path: Sequence[Coord], p: Coord, radius_km: float,
+                    lo: int = 0, hi: int = None) -> Iterable[Tuple[int, float]]:
+    """(segment index, distance) for the segments of path[lo:hi+1] closer than radius_km to p."""
+    if len(path) == 1:
+        path = [path[0], path[0]]
+    hi = len(path) - 2 if hi is None else min(hi, len(path) - 2)
+    for i in range(max(lo, 0), hi + 1):
+        d = point_segment_km(p, path[i], path[i + 1])
+        if d <= radius_km:
+            yield i, d
@@ -0,0 +1,499 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+Dial-a-ride scheduling: riders with time windows assigned to drivers' rides.
+
+Every ride of the rides table is a vehicle that leaves its start at
+departure_time with seats_available seats and must reach its own end at most
+max_detour minutes later than driving there directly. Every rider request has
+a pickup window [pickup_from, pickup_to], an optional arrive_by at the dropoff
+and a number of seats.
+
+All times are minutes after t0. Travel times T[a, b] between the locations
+(ride ends, pickups, dropoffs) come from a precomputed road matrix
+(MatrixTimes) or, for instances too large for one, from the straight-line
+distance computed on demand (HaversineTimes). Requests are
+inserted one by one at their cheapest feasible position (feasibility checked in
+O(1) per position with the forward time slack of each stop), then a local
+search relocates requests between rides and retries the unassigned ones until
+nothing improves or the time budget is spent.
+'''
+
+import math
+import time
+import random
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from road_graph import EARTH_RADIUS_KM
+from rides_db import normalize_departure_time
+
+SPEED_KMH = 50.0
+# haversine -> road length, used when no road matrix is given
+ROAD_FACTOR = 1.3
+MAX_DETOUR_MIN = 20.0
+PICKUP_WINDOW_MIN = 15.0
+# boarding / alighting time at each rider stop
+SERVICE_MIN = 1.0
+# rides tried for each request, closest detour lower bound first
+CANDIDATES = 10
+TIME_BUDGET_S = 2.0
+EPS = 1e-6
+
+class Vehicle(NamedTuple):
+    id: Any
+    start: int        # location indexes in T
+    end: int
+    depart: float
+    latest: float     # latest arrival at end
+    capacity: int
+
+class Request(NamedTuple):
+    id: Any
+    pickup: int
+    dropoff: int
+    earliest: float   # pickup window
+    latest: float
+    arrive_by: float  # latest arrival at dropoff (inf: none)
+    seats: int = 1
+
+# --- Travel times ---
+
+class MatrixTimes:
+    """Precomputed matrix (minutes), e.g. from road distances."""
+
+    def __init__(self, T: np.ndarray):
+        self.M = np.ascontiguousarray(T, dtype=np.float64)
+        # memoryview[a, b] returns a Python float, ~2x faster than indexing the array
+        self._mv = memoryview(self.M)
+
+    def pair(self, a: int, b: int) -> float:
+        return self._mv[a, b]
+
+    def both(self, locs: np.ndarray, x: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(T[locs, x], T[x, locs])"""
+        return self.M[locs, x], self.M[x, locs]
+
+class HaversineTimes:
+    """
+    Straight-line distance * ROAD_FACTOR at speed_kmh, computed on demand: with
+    thousands of requests the full location matrix would not fit in memory.
+    """
+
+    def __init__(self, points: np.ndarray, speed_kmh: float = SPEED_KMH):
+        rad = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+        self._lat, self._lon = rad[:, 0].copy(), rad[:, 1].copy()
+        self._cos = np.cos(self._lat)
+        self._rad = rad.tolist()
+        # haversine gives 2R asin(sqrt(h)) km
+        self.factor = 2 * EARTH_RADIUS_KM * ROAD_FACTOR / speed_kmh * 60.0
+
+    def __len__(self):
+        return len(self._rad)
+
+    def add(self, lat: float, lon: float) -> int:
+        """Appends a location (online matching grows the table); returns its index."""
+        k = len(self._rad)
+        if k == len(self._lat):
+            # amortized growth: the arrays double when full
+            size = max(16, 2 * k)
+            for name in ("_lat", "_lon", "_cos"):
+                grown = np.zeros(size)
+                grown[:k] = getattr(self, name)
+                setattr(self, name, grown)
+        lat, lon = math.radians(lat), math.radians(lon)
+        self._lat[k], self._lon[k], self._cos[k] = lat, lon, math.cos(lat)
+        self._rad.append([lat, lon])
+        return k
+
+    def pair(self, a: int, b: int) -> float:
+        (lat1, lon1), (lat2, lon2) = self._rad[a], self._rad[b]
+        h = math.sin((lat2 - lat1) / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2)**2
+        return math.asin(min(1.0, math.sqrt(h))) * self.factor
+
+    def both(self, locs: np.ndarray, x: int) -> Tuple[np.ndarray, np.ndarray]:
+        # same formula as road_graph.haversine_matrix, with the cosines computed once
+        h = np.sin((self._lat[locs] - self._lat[x]) / 2)**2 \
+            + self._cos[locs] * self._cos[x] * np.sin((self._lon[locs] - self._lon[x]) / 2)**2
+        t = np.arcsin(np.sqrt(np.minimum(h, 1.0))) * self.factor
+        return t, t
+
+# --- One ride ---
+
+class Route:
+    """
+    Stops of one vehicle (start, rider pickups/dropoffs, end) with, per stop:
+        A: arrival, B: start of service = max(A, earliest), load: seats taken when leaving,
+        slack: how much B may be delayed without breaking this or any later window,
+        leg: travel time to the next stop.
+    """
+
+    def __init__(self, vehicle: Vehicle, times):
+        self.vehicle = vehicle
+        self.times = times
+        self.loc = [vehicle.start, vehicle.end]
+        self.early = [vehicle.depart, vehicle.depart]
+        self.late = [vehicle.depart, vehicle.latest]
+        self.delta = [0, 0]
+        self.service = [0.0, 0.0]
+        self.owner: List[Optional[Request]] = [None, None]
+        self.update()
+
+    def __len__(self):
+        return len(self.loc)
+
+    @property
+    def requests(self) -> List[Request]:
+        return [r for k, r in enumerate(self.owner) if r is not None and self.delta[k] > 0]
+
+    def update(self):
+        pair, loc, n = self.times.pair, self.loc, len(self.loc)
+        A, B, load = [0.0] * n, [0.0] * n, [0] * n
+        leg = [pair(loc[k], loc[k + 1]) for k in range(n - 1)] + [0.0]
+        A[0] = B[0] = self.early[0]
+        for k in range(1, n):
+            A[k] = B[k - 1] + self.service[k - 1] + leg[k - 1]
+            B[k] = max(A[k], self.early[k])
+            load[k] = load[k - 1] + self.delta[k]
+        slack = [0.0] * n
+        slack[-1] = self.late[-1] - B[-1]
+        for k in range(n - 2, -1, -1):
+            # a delay at k reaches k+1 minus the waiting time there
+            slack[k] = min(self.late[k] - B[k], B[k + 1] - A[k + 1] + slack[k + 1])
+        self.A, self.B, self.load, self.slack, self.leg = A, B, load, slack, leg
+        self.cost = sum(leg)
+
+    # --- Insertion ---
+
+    def best_insertion(self, req: Request, to_p, from_p, to_d, from_d,
+                       now: float = -math.inf) -> Optional[Tuple[float, int, int]]:
+        """
+        (added travel time, i, j): pickup right after stop i, dropoff right after stop j (j >= i).
+        to_p[k] = T[stop k, pickup], from_p[k] = T[pickup, stop k], same for the dropoff.
+        Stops the vehicle has already left at time now are not reopened.
+        """
+        early, B, A, load, slack, leg, service = self.early, self.B, self.A, self.load, self.slack, self.leg, \
+            self.service
+        room = self.vehicle.capacity - req.seats
+        n = len(self.loc)
+        best = None
+        Tpd = self.times.pair(req.pickup, req.dropoff)
+        for i in range(n - 1):
+            if B[i] > req.latest:
+                break  # B never decreases along the route
+            if load[i] > room or B[i] + service[i] < now:
+                continue
+            Tip = to_p[i]
+            Bp = max(B[i] + service[i] + Tip, req.earliest)
+            if Bp > req.latest:
+                continue
+            # dropoff right after the pickup
+            Ad = Bp + SERVICE_MIN + Tpd
+            if Ad <= req.arrive_by:
+                Tdn = from_d[i + 1]
+                shift = max(Ad + SERVICE_MIN + Tdn, early[i + 1]) - B[i + 1]
+                if shift <= slack[i + 1]:
+                    cost = Tip + Tpd + Tdn - leg[i]
+                    if best is None or cost < best[0]:
+                        best = (cost, i, i)
+            # dropoff later: the pickup delays stop i+1 by shift, which fades with the waiting times
+            shift = max(Bp + SERVICE_MIN + from_p[i + 1], early[i + 1]) - B[i + 1]
+            if shift > slack[i + 1]:
+                continue
+            added = Tip + from_p[i + 1] - leg[i]
+            if best is not None and added >= best[0]:
+                continue
+            s = max(shift, 0.0)
+            for j in range(i + 1, n - 1):
+                if load[j] > room:
+                    break
+                Bj = B[j] + s
+                if Bj > req.arrive_by:
+                    break
+                Ad = Bj + service[j] + to_d[j]
+                if Ad <= req.arrive_by:
+                    Tdk = from_d[j + 1]
+                    shift2 = max(Ad + SERVICE_MIN + Tdk, early[j + 1]) - B[j + 1]
+                    if shift2 <= slack[j + 1]:
+                        cost = added + to_d[j] + Tdk - leg[j]
+                        if best is None or cost < best[0]:
+                            best = (cost, i, j)
+                s = max(0.0, s - (B[j + 1] - A[j + 1]))
+        return best
+
+    def insert(self, req: Request, i: int, j: int):
+        """Pickup after stop i and dropoff after stop j, as returned by best_insertion."""
+        self._add(j + 1, req.dropoff, 0.0, req.arrive_by, -req.seats, req)
+        self._add(i + 1, req.pickup, req.earliest, req.latest, req.seats, req)
+        self.update()
+
+    def _add(self, k, location, early, late, delta, req):
+        self.loc.insert(k, location)
+        self.early.insert(k, early)
+        self.late.insert(k, late)
+        self.delta.insert(k, delta)
+        self.service.insert(k, SERVICE_MIN)
+        self.owner.insert(k, req)
+
+    def set_stops(self, stops: Sequence[Tuple[str, Request]]):
+        """Replaces the rider stops by stops = [("pickup" | "dropoff", request), ...] in visiting order."""
+        for attr in (self.loc, self.early, self.late, self.delta, self.service, self.owner):
+            del attr[1:-1]
+        for kind, req in stops:
+            if kind == "pickup":
+                self._add(len(self.loc) - 1, req.pickup, req.earliest, req.latest, req.seats, req)
+            else:
+                self._add(len(self.loc) - 1, req.dropoff, 0.0, req.arrive_by, -req.seats, req)
+        self.update()
+
+    def remove(self, req: Request) -> Tuple[int, int]:
+        """Takes req out; returns (i, j) such that insert(req, i, j) puts it back."""
+        ks = [k for k, r in enumerate(self.owner) if r is req]
+        for k in reversed(ks):
+            for attr in (self.loc, self.early, self.late, self.delta, self.service, self.owner):
+                del attr[k]
+        self.update()
+        return ks[0] - 1, ks[1] - 2
+
+    def stops(self) -> List[Dict[str, Any]]:
+        out = []
+        for k in range(len(self.loc)):
+            req = self.owner[k]
+            kind = "start" if k == 0 else "end" if k == len(self.loc) - 1 else \
+                "pickup" if self.delta[k] > 0 else "dropoff"
+            out.append({"kind": kind, "request": req.id if req else None, "location": self.loc[k],
+                        "arrival": self.A[k], "service_start": self.B[k], "load": self.load[k]})
+        return out
+
+# --- Fleet ---
+
+class Scheduler:
+    """Insertion heuristic + relocate local search over all vehicles."""
+
+    def __init__(self, times, vehicles: Sequence[Vehicle], candidates: int = CANDIDATES):
+        self.times = times
+        self.routes = [Route(v, times) for v in vehicles]
+        self.candidates = candidates
+        self.assigned: Dict[Any, Route] = {}
+        self.unassigned: List[Request] = []
+        self.stats = {"inserted": 0, "relocated": 0, "passes": 0}
+        self._arrays()
+
+    def _arrays(self):
+        """Per-vehicle arrays of the prefilter, rebuilt when the set of routes changes."""
+        vehicles = [r.vehicle for r in self.routes]
+        self._start = np.array([v.start for v in vehicles], dtype=np.int64)
+        self._end = np.array([v.end for v in vehicles], dtype=np.int64)
+        self._depart = np.array([v.depart for v in vehicles], dtype=np.float64)
+        self._cap = np.array([v.capacity for v in vehicles], dtype=np.int64)
+        self._direct = np.array([self.times.pair(v.start, v.end) for v in vehicles], dtype=np.float64)
+        self._budget = np.array([v.latest for v in vehicles], dtype=np.float64) - self._depart - self._direct
+        self._dirty = False
+
+    def add_routes(self, routes: Sequence[Route]):
+        self.routes.extend(routes)
+        self._dirty = True
+
+    def remove_routes(self, routes: Sequence[Route]):
+        gone = {id(r) for r in routes}
+        self.routes = [r for r in self.routes if id(r) not in gone]
+        self._dirty = True
+
+    def candidates_for(self, req: Request) -> List[Route]:
+        """Rides that can reach the pickup in time and absorb the detour (triangle-inequality bound)."""
+        if self._dirty:
+            self._arrays()
+        if not self.routes:
+            return []
+        p, d = req.pickup, req.dropoff
+        to_p, _ = self.times.both(self._start, p)
+        _, d_to_end = self.times.both(self._end, d)
+        Tpd = self.times.pair(p, d)
+        detour = to_p + 2 * SERVICE_MIN + Tpd + d_to_end - self._direct
+        reach = self._depart + to_p
+        ok = (reach <= req.latest) & (self._cap >= req.seats) & (detour <= self._budget + EPS) \
+            & (np.maximum(reach, req.earliest) + SERVICE_MIN + Tpd <= req.arrive_by)
+        idx = np.flatnonzero(ok)
+        if len(idx) > self.candidates:
+            idx = idx[np.argpartition(detour[idx], self.candidates)[:self.candidates]]
+        return [self.routes[k] for k in idx[np.argsort(detour[idx], kind="stable")]]
+
+    def best(self, req: Request, routes: Sequence[Route], now: float = -math.inf):
+        if not routes:
+            return None
+        # travel times between the request and every stop of every candidate, in two vector calls
+        locs = np.fromiter((x for route in routes for x in route.loc), dtype=np.int64)
+        to_p, from_p = (a.tolist() for a in self.times.both(locs, req.pickup))
+        to_d, from_d = (a.tolist() for a in self.times.both(locs, req.dropoff))
+        best, k = None, 0
+        for route in routes:
+            n = len(route.loc)
+            ins = route.best_insertion(req, to_p[k:k + n], from_p[k:k + n], to_d[k:k + n], from_d[k:k + n], now)
+            k += n
+            if ins is not None and (best is None or ins[0] < best[0]):
+                best = (ins[0], route, ins[1], ins[2])
+        return best
+
+    def insert(self, req: Request, now: float = -math.inf) -> Optional[Route]:
+        best = self.best(req, self.candidates_for(req), now)
+        if best is None:
+            return None
+        _, route, i, j = best
+        route.insert(req, i, j)
+        self.assigned[req.id] = route
+        self.stats["inserted"] += 1
+        return route
+
+    def solve(self, requests: Sequence[Request], time_budget: float = TIME_BUDGET_S,
+              seed: int = 0) -> "Scheduler":
+        deadline = time.perf_counter() + time_budget
+        # tightest pickup deadlines first
+        for req in sorted(requests, key=lambda r: (r.latest, r.earliest)):
+            if self.insert(req) is None:
+                self.unassigned.append(req)
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            self.stats["passes"] += 1
+            improved = self._relocate_pass(rng, deadline)
+            improved = self._retry_unassigned() or improved
+            if not improved:
+                break
+        return self
+
+    def _relocate_pass(self, rng: random.Random, deadline: float) -> bool:
+        improved = False
+        reqs = [r for route in self.routes for r in route.requests]
+        rng.shuffle(reqs)
+        for req in reqs:
+            if time.perf_counter() > deadline:
+                break
+            route = self.assigned[req.id]
+            before = route.cost
+            i, j = route.remove(req)
+            gain = before - route.cost
+            others = [r for r in self.candidates_for(req) if r is not route] + [route]
+            best = self.best(req, others)
+            if best is not None and best[0] < gain - EPS:
+                _, target, bi, bj = best
+                target.insert(req, bi, bj)
+                self.assigned[req.id] = target
+                self.stats["relocated"] += 1
+                improved = True
+            else:
+                route.insert(req, i, j)
+        return improved
+
+    def _retry_unassigned(self) -> bool:
+        left = [req for req in self.unassigned if self.insert(req) is None]
+        improved = len(left) < len(self.unassigned)
+        self.unassigned = left
+        return improved
+
+    def total_cost(self) -> float:
+        return sum(r.cost for r in self.routes)
+
+# --- rides table ---
+
+def to_minutes(value: Any, t0: datetime) -> float:
+    return (datetime.fromisoformat(normalize_departure_time(value)) - t0).total_seconds() / 60.0
+
+def to_iso(minutes: float, t0: datetime) -> str:
+    return (t0 + timedelta(minutes=minutes)).isoformat(timespec="seconds")
+
+def parse_request(q: Dict[str, Any], t0: datetime, location: Callable[[float, float], int],
+                  default_id: Any = None) -> Request:
+    """Request from its JSON form; location(lat, lon) gives the index of a point in the travel times."""
+    try:
+        pickup = location(float(q["pickup"][0]), float(q["pickup"][1]))
+        dropoff = location(float(q["dropoff"][0]), float(q["dropoff"][1]))
+        earliest = to_minutes(q["pickup_from"], t0)
+        latest = to_minutes(q["pickup_to"], t0) if q.get("pickup_to") else earliest + PICKUP_WINDOW_MIN
+        arrive_by = to_minutes(q["arrive_by"], t0) if q.get("arrive_by") else float("inf")
+        seats = int(q.get("seats", 1))
+    except KeyError as e:
+        raise ValueError(f"champ manquant: {e.args[0]}")
+    except (TypeError, ValueError, IndexError) as e:
+        raise ValueError(str(e))
+    if latest < earliest or seats < 1:
+        raise ValueError("fenêtre vide ou seats < 1")
+    return Request(q.get("id", default_id), pickup, dropoff, earliest, latest, arrive_by, seats)
+
+def schedule_rides(rides: Sequence[Dict[str, Any]], requests: Sequence[Dict[str, Any]],
+                   distances_km: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+                   speed_kmh: float = SPEED_KMH, max_detour: float = MAX_DETOUR_MIN,
+                   time_budget: float = TIME_BUDGET_S) -> Dict[str, Any]:
+    """
+    rides: rows of RideStore.find_rides (with coordinates); requests:
+        {"id", "pickup": [lat, lon], "dropoff": [lat, lon], "pickup_from", "pickup_to", "arrive_by", "seats"}
+    distances_km(points) -> road distance matrix; haversine * ROAD_FACTOR if None.
+    """
+    rides = [r for r in rides if r.get("start_lat") is not None and r.get("end_lat") is not None]
+    if not rides:
+        raise ValueError("aucun trajet avec coordonnées")
+    if not requests:
+        raise ValueError("requests ne doit pas être vide")
+    t0 = min(datetime.fromisoformat(r["departure_time"]) for r in rides)
+    points, index = [], {}
+
+    def location(lat, lon) -> int:
+        key = (round(float(lat), 6), round(float(lon), 6))
+        if key not in index:
+            index[key] = len(points)
+            points.append(key)
+        return index[key]
+
+    ride_locs = [(location(r["start_lat"], r["start_lon"]), location(r["end_lat"], r["end_lon"])) for r in rides]
+    parsed = []
+    for k, q in enumerate(requests):
+        try:
+            parsed.append(parse_request(q, t0, location, default_id=k))
+        except ValueError as e:
+            raise ValueError(f"requests[{k}] invalide: {e}")
+    if len({r.id for r in parsed}) != len(parsed):
+        raise ValueError("identifiants de requests en double")
+
+    P = np.array(points, dtype=np.float64)
+    if distances_km is not None:
+        times = MatrixTimes(distances_km(P) / speed_kmh * 60.0)
+    else:
+        times = HaversineTimes(P, speed_kmh)
+    vehicles = []
+    for r, (s, e) in zip(rides, ride_locs):
+        depart = to_minutes(r["departure_time"], t0)
+        vehicles.append(Vehicle(r["id"], s, e, depart, depart + times.pair(s, e) + max_detour, int(r["seats_available"])))
+
+    t_start = time.perf_counter()
+    sched = Scheduler(times, vehicles).solve(parsed, time_budget=time_budget)
+    elapsed = time.perf_counter() - t_start
+
+    out_rides = []
+    for route in sched.routes:
+        if len(route) == 2:
+            continue
+        stops = route.stops()
+        for st in stops:
+            st["point"] = list(points[st.pop("location")])
+            st["arrival"] = to_iso(st["arrival"], t0)
+            st["service_start"] = to_iso(st["service_start"], t0)
+        out_rides.append({
+            "ride_id": route.vehicle.id,
+            "stops": stops,
+            "riders": len(route.requests),
+            "drive_min": round(route.cost, 2),
+            "detour_min": round(route.cost - times.pair(route.vehicle.start, route.vehicle.end), 2),
+        })
+    return {
+        "rides": out_rides,
+        "assigned": {str(k): route.vehicle.id for k, route in sched.assigned.items()},
+        "unassigned": [r.id for r in sched.unassigned],
+        "drive_min": round(sched.total_cost(), 2),
+        "matrix": "road" if distances_km is not None else "haversine",
+        "stats": dict(sched.stats, vehicles=len(vehicles), requests=len(parsed), locations=len(points),
+                      seconds=round(elapsed, 3)),
+    }
@@ -0,0 +1,186 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+Side index of resolved coordinates for the addresses of address.json.
+
+Entries are keyed by a hash of the address text, so an entry whose address is
+edited gets a new key and is geocoded again, while unchanged entries are never
+sent upstream twice. The index is persisted next to address.json
+(address.json.geocodes.json by default) and filled by a background thread each
+time address.json changes. With several workers the fills take turns on the
+sidecar lock (a worker that sees the change while another one fills waits
+for it, then geocodes only what is still missing), and every write merges
+with the file on disk under a short save lock, so workers never drop each
+other's entries; they re-read the sidecar when it changes.
+'''
+
+import os
+import json
+import hashlib
+import threading
+from typing import Callable, Dict, Iterable, Optional, Any
+
+try:
+    import fcntl
+except ImportError:  # Windows: every worker fills its own copy
+    fcntl = None
+
+# Sidecar written every SAVE_EVERY geocodes during a fill (and at the end)
+SAVE_EVERY = 20
+
+def address_key(address_text: str) -> str:
+    return hashlib.sha1(" ".join(address_text.lower().split()).encode("utf-8")).hexdigest()
+
+class GeocodeIndex:
+    def __init__(self, path: Optional[str], geocode: Callable[[str], Optional[Dict[str, float]]]):
+        """path=None: index kept in memory only."""
+        self.path = path
+        self.geocode = geocode
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+        self._wanted: Dict[str, str] = {}
+        self._wanted_src: Optional[Iterable[str]] = None
+        self._dirty = threading.Event()
+        # fill thread started and not finished yet (set and cleared under _lock)
+        self._running = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    # --- Persistence ---
+
+    def _reload(self):
+        """Re-reads the sidecar if another worker rewrote it."""
+        if not self.path:
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            self._entries.update(entries)
+            self._mtime = mtime
+
+    def _save(self, added: Dict[str, Dict[str, Any]], keep: Optional[Dict[str, str]] = None):
+        """Writes the sidecar on disk + added, without the keys missing from keep (if given)."""
+        if not self.path:
+            return
+        with _FileLock(f"{self.path}.save.lock"):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    entries = json.load(f).get("entries", {})
+            except (OSError, ValueError):
+                entries = {}
+            entries.update(added)
+            if keep is not None:
+                entries = {k: v for k, v in entries.items() if k in keep}
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"version": 1, "entries": entries}, f, ensure_ascii=False)
+                os.replace(tmp, self.path)
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                return
+        with self._lock:
+            self._entries.update(entries)
+            self._mtime = mtime
+
+    # --- Lookups ---
+
+    def get(self, address_text: str) -> Optional[Dict[str, float]]:
+        self._reload()
+        entry = self._entries.get(address_key(address_text))
+        return entry["coords"] if entry else None
+
+    def put(self, address_text: str, coords: Dict[str, float], save: bool = True):
+        key = address_key(address_text)
+        entry = {"address_text": address_text, "coords": coords}
+        with self._lock:
+            self._entries[key] = entry
+        if save:
+            self._save({key: entry})
+
+    # --- Background fill ---
+
+    def refresh(self, address_texts: Iterable[str]):
+        """Declares the current address set; missing ones are geocoded in the background."""
+        # keys are computed by the fill thread, not in the request that triggered the reload
+        with self._lock:
+            self._wanted_src = address_texts
+            self._dirty.set()
+            if self._running:
+                return  # the running fill sees _dirty before it stops
+            self._running = True
+        threading.Thread(target=self._fill_loop, name="geocode-index", daemon=True).start()
+
+    def _fill_loop(self):
+        while True:
+            # another worker may be filling: wait for it, then geocode only what it left
+            with _FileLock(f"{self.path}.lock" if self.path else None):
+                while self._dirty.is_set():
+                    self._dirty.clear()
+                    self._reload()
+                    self._fill()
+            with self._lock:
+                if not self._dirty.is_set():
+                    self._running = False
+                    return
+
+    def _fill(self):
+        with self._lock:
+            src, self._wanted_src = self._wanted_src, None
+        if src is not None:
+            self._wanted = {address_key(t): t for t in src if t}
+        wanted = self._wanted
+        with self._lock:
+            # entries whose address disappeared or changed
+            for key in [k for k in self._entries if k not in wanted]:
+                del self._entries[key]
+        todo = [(k, t) for k, t in wanted.items() if k not in self._entries]
+        added: Dict[str, Dict[str, Any]] = {}
+        for i, (key, text) in enumerate(todo, 1):
+            if self._dirty.is_set():
+                break  # address.json changed again: restart with the new set
+            try:
+                coords = self.geocode(text)
+            except Exception:
+                coords = None
+            if coords:
+                self.put(text, coords, save=False)
+                added[key] = self._entries[key]
+            if i % SAVE_EVERY == 0 and added:
+                self._save(added)
+                added = {}
+        self._save(added, keep=wanted)
+
+class _FileLock:
+    """Blocking exclusive flock on path; nothing without a path or fcntl."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path if fcntl is not None else None
+        self.fd = None
+
+    def __enter__(self):
+        if self.path:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
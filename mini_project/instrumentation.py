@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+Per-stage timing / memory instrumentation for the routing scripts.
+
+    ROUTING_PROFILE=1 python3 compute_routes.py              -> JSON report on stderr
+    ROUTING_PROFILE=report.json python3 compute_routes.py    -> JSON report in report.json
+
+Disabled (the default), stage() only yields a no-op record.
+'''
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from tqdm import tqdm
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILE_ENV = "ROUTING_PROFILE"
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+class StageRecord:
+    def __init__(self, name: str, items: Optional[int] = None):
+        self.name = name
+        self.items = items
+        self.messages: List[str] = []
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.py_peak_mb: Optional[float] = None
+        self.rss_peak_mb: Optional[float] = None
+        self._peak_bytes = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {
+            "stage": self.name,
+            "wall_s": round(self.wall_s, 6),
+            "cpu_s": round(self.cpu_s, 6),
+            "py_peak_mb": self.py_peak_mb,
+            "rss_peak_mb": self.rss_peak_mb,
+        }
+        if self.items is not None:
+            d["items"] = self.items
+            if self.wall_s > 0:
+                d["items_per_s"] = round(self.items / self.wall_s, 1)
+        if self.messages:
+            d["messages"] = self.messages
+        return d
+
+class _NullRecord:
+    """Stand-in yielded when profiling is off; setting .items is a no-op."""
+    items = None
+
+    def __setattr__(self, name, value):
+        pass
+
+_NULL = _NullRecord()
+
+class Profiler:
+    def __init__(self, target: Optional[str] = None):
+        self.target = target
+        self.enabled = bool(target) and target not in ("0", "false", "no")
+        self.records: List[StageRecord] = []
+        self._local = threading.local()
+        self._started = time.perf_counter()
+        if self.enabled:
+            tracemalloc.start()
+            atexit.register(self.emit)
+
+    def _stack(self) -> List[StageRecord]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def stage(self, name: str, items: Optional[int] = None):
+        """Times the block; nested stages are named parent/child. Set rec.items to count work."""
+        if not self.enabled:
+            yield _NULL
+            return
+        stack = self._stack()
+        full_name = "/".join([r.name for r in stack[-1:]] + [name])
+        rec = StageRecord(full_name, items)
+        # tracemalloc has one global peak: remember the parent's peak so far before resetting it
+        if stack:
+            stack[-1]._peak_bytes = max(stack[-1]._peak_bytes, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        stack.append(rec)
+        w0, c0 = time.perf_counter(), time.process_time()
+        try:
+            yield rec
+        finally:
+            rec.wall_s = time.perf_counter() - w0
+            rec.cpu_s = time.process_time() - c0
+            peak = max(rec._peak_bytes, tracemalloc.get_traced_memory()[1])
+            rec.py_peak_mb = round(peak / (1024 * 1024), 2)
+            rec.rss_peak_mb = _peak_rss_mb()
+            stack.pop()
+            self.records.append(rec)
+            if stack:
+                stack[-1]._peak_bytes = max(stack[-1]._peak_bytes, peak)
+                tracemalloc.reset_peak()
+
+    def log(self, message: str):
+        """tqdm.write() that is also attached to the current stage in the report."""
+        tqdm.write(message)
+        if self.enabled and self._stack():
+            self._stack()[-1].messages.append(message)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "script": os.path.basename(sys.argv[0]) if sys.argv else None,
+            "pid": os.getpid(),
+            "total_wall_s": round(time.perf_counter() - self._started, 6),
+            "rss_peak_mb": _peak_rss_mb(),
+            "stages": [r.to_dict() for r in self.records],
+        }
+
+    def emit(self):
+        if not self.enabled or not self.records:
+            return
+        text = json.dumps(self.report(), indent=2)
+        if self.target in ("1", "true", "yes", "stderr"):
+            print(text, file=sys.stderr)
+        else:
+            with open(self.target, "w", encoding="utf-8") as f:
+                f.write(text)
+
+# Process-wide profiler, configured from the environment
+profiler = Profiler(os.environ.get(PROFILE_ENV))
+stage = profiler.stage
+log = profiler.log
@@ -0,0 +1,131 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+Outline of a set of reached road nodes as a GeoJSON (Multi)Polygon.
+
+The reached nodes, and points sampled along the edges joining two of them,
+are rasterised on a grid of cell_km cells (local equirectangular projection)
+and the filled cells are grown by one cell so that nearby roads merge. The
+boundary between filled and empty cells is then traced into rings: the
+result follows the road network into valleys and around unreachable areas
+(holes), which a convex hull would cover, and needs no geometry library.
+Exterior rings are counter-clockwise and holes clockwise (RFC 7946).
+'''
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON = 111.320
+CELL_KM = 0.5
+
+# direction of a boundary edge: 0 east, 1 north, 2 west, 3 south
+_STEPS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+
+def edge_samples(lats: np.ndarray, lons: np.ndarray, src: np.ndarray, dst: np.ndarray,
+                 lengths: np.ndarray, step_km: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Points every step_km along the straight edges src[i] -> dst[i] (ends excluded)."""
+    counts = np.maximum(np.ceil(lengths / step_km).astype(np.int64) - 1, 0)
+    if not counts.sum():
+        return np.empty(0), np.empty(0)
+    edge = np.repeat(np.arange(len(src)), counts)
+    # k-th sample of its edge: position k / (count + 1)
+    first = np.cumsum(counts) - counts
+    k = np.arange(len(edge)) - first[edge] + 1
+    f = k / (counts[edge] + 1)
+    a, b = src[edge], dst[edge]
+    return lats[a] + (lats[b] - lats[a]) * f, lons[a] + (lons[b] - lons[a]) * f
+
+def outline(lats: np.ndarray, lons: np.ndarray, cell_km: float = CELL_KM) -> Optional[Dict[str, Any]]:
+    """GeoJSON geometry covering the points (lat/lon arrays), None without points."""
+    if len(lats) == 0:
+        return None
+    lat0 = float(np.mean(lats))
+    kx = KM_PER_DEG_LON * math.cos(math.radians(lat0)) / cell_km
+    ky = KM_PER_DEG_LAT / cell_km
+    x0, y0 = float(lons.min()), float(lats.min())
+    # two empty cells of margin around the one-cell growth
+    cols = np.floor((lons - x0) * kx).astype(np.int64) + 2
+    rows = np.floor((lats - y0) * ky).astype(np.int64) + 2
+    grid = np.zeros((int(rows.max()) + 3, int(cols.max()) + 3), dtype=bool)
+    grid[rows, cols] = True
+    grown = grid.copy()
+    for dr in (-1, 0, 1):
+        for dc in (-1, 0, 1):
+            if dr or dc:
+                grown[1:-1, 1:-1] |= grid[1 + dr:grid.shape[0] - 1 + dr, 1 + dc:grid.shape[1] - 1 + dc]
+    rings = [_to_lonlat(r, x0, y0, kx, ky) for r in _trace(grown)]
+    return _geometry(rings)
+
+def _trace(grid: np.ndarray) -> List[List[Tuple[int, int]]]:
+    """Rings of grid corners (col, row) around the filled cells, filled side on the left."""
+    out: Dict[Tuple[int, int], List[int]] = {}
+    empty = ~grid
+    r, c = np.nonzero(grid[1:-1, 1:-1] & empty[:-2, 1:-1])  # south side empty
+    starts = [(c + 1, r + 1, 0)]
+    r, c = np.nonzero(grid[1:-1, 1:-1] & empty[1:-1, 2:])   # east side empty
+    starts.append((c + 2, r + 1, 1))
+    r, c = np.nonzero(grid[1:-1, 1:-1] & empty[2:, 1:-1])   # north side empty
+    starts.append((c + 2, r + 2, 2))
+    r, c = np.nonzero(grid[1:-1, 1:-1] & empty[1:-1, :-2])  # west side empty
+    starts.append((c + 1, r + 2, 3))
+    for xs, ys, d in starts:
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            out.setdefault((x, y), []).append(d)
+    rings = []
+    while out:
+        start = next(iter(out))
+        ring, (x, y), d = [], start, None
+        while True:
+            dirs = out[(x, y)]
+            if d is None or len(dirs) == 1:
+                nd = dirs[0]
+            else:
+                # two rings touch at a corner: keep turning left so they stay apart
+                nd = next(t for t in ((d + 1) % 4, d, (d + 3) % 4) if t in dirs)
+            dirs.remove(nd)
+            if not dirs:
+                del out[(x, y)]
+            if nd != d:
+                ring.append((x, y))
+            d = nd
+            x, y = x + _STEPS[d][0], y + _STEPS[d][1]
+            if (x, y) == start:
+                break
+        ring.append(start)
+        rings.append(ring)
+    return rings
+
+def _to_lonlat(ring, x0, y0, kx, ky) -> List[List[float]]:
+    return [[round(x0 + (x - 2) / kx, 6), round(y0 + (y - 2) / ky, 6)] for x, y in ring]
+
+def _area(ring: List[List[float]]) -> float:
+    return 0.5 * sum(a[0] * b[1] - b[0] * a[1] for a, b in zip(ring, ring[1:]))
+
+def _inside(point: List[float], ring: List[List[float]]) -> bool:
+    x, y = point
+    inside = False
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+
+def _geometry(rings: List[List[List[float]]]) -> Dict[str, Any]:
+    outer = [r for r in rings if _area(r) > 0]
+    polygons = [[r] for r in sorted(outer, key=_area)]
+    for hole in (r for r in rings if _area(r) < 0):
+        # smallest exterior around the hole (holes only sit on grid corners, never on an exterior edge)
+        probe = [(hole[0][0] + hole[1][0]) / 2, (hole[0][1] + hole[1][1]) / 2]
+        owner = next((p for p in polygons if _inside(probe, p[0])), None)
+        if owner is not None:
+            owner.append(hole)
+    polygons.reverse()
+    if len(polygons) == 1:
+        return {"type": "Polygon", "coordinates": polygons[0]}
+    return {"type": "MultiPolygon", "coordinates": polygons}
@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+Small thread-safe LRU cache with hit/miss counters, shared by the API caches.
+'''
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+class LRUCache:
+    """
+    maxsize bounds the number of entries; with weigher (value -> int) and
+    maxweight, the total weight is bounded too (e.g. number of path nodes).
+    """
+
+    def __init__(self, maxsize: int = 1024, maxweight: Optional[int] = None,
+                 weigher: Optional[Callable[[Any], int]] = None):
+        self.maxsize = maxsize
+        self.maxweight = maxweight
+        self.weigher = weigher or (lambda value: 1)
+        self.weight = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        weight = self.weigher(value)
+        if self.maxweight is not None and weight > self.maxweight:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.weight -= self.weigher(old)
+            self._data[key] = value
+            self.weight += weight
+            while len(self._data) > self.maxsize or (self.maxweight is not None and self.weight > self.maxweight):
+                _, evicted = self._data.popitem(last=False)
+                self.weight -= self.weigher(evicted)
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"size": len(self._data), "maxsize": self.maxsize, "weight": self.weight,
+                "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None}
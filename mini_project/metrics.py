@@ -0,0 +1,253 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+Minimal Prometheus-style metrics (counters, histograms) for the Flask API.
+
+Each process keeps its own values. When METRICS_DIR is set (one directory
+shared by all the gunicorn workers) every process dumps its values in
+METRICS_DIR/metrics_<pid>.json (at most FLUSH_INTERVAL_S after a change, and
+at exit) and /metrics sums the files of all workers. The file of a dead
+worker is renamed retired_<pid>_<mtime>.json and still summed (counters stay
+monotonic), so a new process that gets the same pid never overwrites it;
+empty the directory when the whole service is restarted.
+'''
+
+import os
+import json
+import time
+import atexit
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Optional, Iterable
+
+METRICS_DIR = os.environ.get("METRICS_DIR")
+FLUSH_INTERVAL_S = 1.0
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt_labels(key: Iterable[Tuple[str, str]]) -> str:
+    key = list(key)
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in key) + "}"
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+# --- Metric types ---
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dump(self):
+        with self._lock:
+            return [[list(map(list, k)), v] for k, v in self._values.items()]
+
+    @staticmethod
+    def merge(acc: Dict[LabelKey, float], dumped):
+        for key, value in dumped:
+            key = tuple(tuple(kv) for kv in key)
+            acc[key] = acc.get(key, 0.0) + value
+
+    def render(self, merged: Dict[LabelKey, float]) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key in sorted(merged):
+            lines.append(f"{self.name}{_fmt_labels(key)} {_fmt_value(merged[key])}")
+        return lines
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (non cumulative, last = +Inf), sum, count]
+        self._values: Dict[LabelKey, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][idx] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def dump(self):
+        with self._lock:
+            return [[list(map(list, k)), [list(e[0]), e[1], e[2]]] for k, e in self._values.items()]
+
+    @staticmethod
+    def merge(acc: Dict[LabelKey, list], dumped):
+        for key, (counts, total, n) in dumped:
+            key = tuple(tuple(kv) for kv in key)
+            entry = acc.get(key)
+            if entry is None or len(entry[0]) != len(counts):
+                acc[key] = [list(counts), total, n]
+            else:
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += total
+                entry[2] += n
+
+    def render(self, merged: Dict[LabelKey, list]) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key in sorted(merged):
+            counts, total, n = merged[key]
+            cumulative = 0
+            for bound, c in zip(list(self.buckets) + [float("inf")], counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_fmt_labels(key + (('le', _fmt_value(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(total)}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {n}")
+        return lines
+
+# --- Registry ---
+
+class Registry:
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self._metrics: Dict[str, object] = {}
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        # process that owns metrics_<pid>.json (the registry may be created before a fork)
+        self._pid: Optional[int] = None
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help_text, buckets))
+
+    def _dump(self):
+        return {name: m.dump() for name, m in self._metrics.items()}
+
+    def flush(self, force: bool = False):
+        """Writes this process' values to METRICS_DIR (at most every FLUSH_INTERVAL_S).
+
+        A throttled call schedules a flush at the end of the interval, so the last
+        values of an idle worker are written too."""
+        if not self.directory:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < FLUSH_INTERVAL_S:
+            self._schedule(FLUSH_INTERVAL_S - (now - self._last_flush))
+            return
+        if not self._flush_lock.acquire(blocking=force):
+            return
+        try:
+            self._last_flush = now
+            os.makedirs(self.directory, exist_ok=True)
+            pid = os.getpid()
+            path = os.path.join(self.directory, f"metrics_{pid}.json")
+            if self._pid != pid:
+                # a file under our pid comes from a dead process: keep its values apart
+                self._pid = pid
+                self._retire(path)
+            tmp = f"{path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._dump(), f)
+            os.replace(tmp, path)
+        finally:
+            self._flush_lock.release()
+
+    def _schedule(self, delay: float):
+        with self._flush_lock:
+            if self._timer is not None and self._timer.is_alive():
+                return
+            self._timer = threading.Timer(delay, self.flush, kwargs={"force": True})
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _retire(self, path: str):
+        pid = os.path.basename(path)[len("metrics_"):-len(".json")]
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            os.rename(path, os.path.join(self.directory, f"retired_{pid}_{mtime}.json"))
+        except OSError:  # missing, or already retired by another process
+            pass
+
+    @staticmethod
+    def _alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except (PermissionError, OSError):
+            return True
+        return True
+
+    def _collect(self) -> List[dict]:
+        if not self.directory:
+            return [self._dump()]
+        self.flush(force=True)
+        for fname in os.listdir(self.directory):
+            pid = fname[len("metrics_"):-len(".json")]
+            if fname.startswith("metrics_") and fname.endswith(".json") and pid.isdigit() \
+                    and not self._alive(int(pid)):
+                self._retire(os.path.join(self.directory, fname))
+        dumps = []
+        for fname in os.listdir(self.directory):
+            if not (fname.startswith(("metrics_", "retired_")) and fname.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(self.directory, fname), "r", encoding="utf-8") as f:
+                    dumps.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return dumps
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4), summed over all processes."""
+        merged: Dict[str, dict] = {name: {} for name in self._metrics}
+        for dump in self._collect():
+            for name, values in dump.items():
+                if name in self._metrics:
+                    self._metrics[name].merge(merged[name], values)
+        lines: List[str] = []
+        for name, metric in self._metrics.items():
+            lines.extend(metric.render(merged[name]))
+        return "\n".join(lines) + "\n"
+
+registry = Registry(METRICS_DIR)
+atexit.register(registry.flush, force=True)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
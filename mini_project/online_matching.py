@@ -0,0 +1,220 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+Online matching of rider requests against the rides store.
+
+Each worker keeps the active rides in memory as dial_a_ride routes (stops,
+service times, slack), synced incrementally from the database: rides with a
+new id, rides that were not geocoded yet at the previous look, and plans
+whose seq moved since the last look. A request is matched
+by the same insertion as dial_a_ride.Scheduler: the vectorized prefilter over
+every active ride (can the ride reach the pickup in time, does the detour
+lower bound fit its budget), then the O(1)-per-position slack check on the
+closest candidates. The booking and the new stop order are written in one
+transaction that fails if the plan changed since it was read (another worker
+booked the same ride); the matcher then re-syncs and tries again.
+'''
+
+import time
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from dial_a_ride import (Vehicle, Request, Route, Scheduler, HaversineTimes, parse_request, to_minutes, to_iso,
+                         SPEED_KMH, MAX_DETOUR_MIN, CANDIDATES)
+from rides_db import RideStore, COORD_FIELDS
+
+# Times are minutes after EPOCH
+EPOCH = datetime(2000, 1, 1)
+# rides that left up to this long ago can still take riders
+ACTIVE_BEFORE_MIN = 240
+# booking attempts when another worker changes the chosen ride meanwhile
+MAX_RETRIES = 3
+
+class OnlineMatcher:
+    def __init__(self, store: RideStore, speed_kmh: float = SPEED_KMH, max_detour: float = MAX_DETOUR_MIN,
+                 candidates: int = CANDIDATES):
+        self.store = store
+        self.max_detour = max_detour
+        self.times = HaversineTimes([], speed_kmh)
+        self.scheduler = Scheduler(self.times, [], candidates)
+        self._points: Dict[tuple, int] = {}
+        self._routes: Dict[int, Route] = {}
+        self._versions: Dict[int, int] = {}
+        # seats still for sale per ride (rides.seats_available): a full ride leaves the scheduler
+        self._seats: Dict[int, int] = {}
+        self._full: Dict[int, Route] = {}
+        self._last_ride_id = 0
+        # rides already seen without coordinates, loaded once they have them
+        self._waiting: Set[int] = set()
+        self._seq = 0
+        self._expired_at = None
+        self._lock = threading.Lock()
+        self.stats = {"rides": 0, "matched": 0, "unmatched": 0, "conflicts": 0, "plans_synced": 0}
+
+    def _location(self, lat: float, lon: float) -> int:
+        key = (round(float(lat), 6), round(float(lon), 6))
+        k = self._points.get(key)
+        if k is None:
+            k = self._points[key] = self.times.add(*key)
+        return k
+
+    # --- Sync with the store ---
+
+    def sync(self, now: float):
+        """New rides, changed plans and finished rides since the last call."""
+        since = to_iso(now - ACTIVE_BEFORE_MIN, EPOCH)
+        rows = self.store.active_rides(since, after_id=self._last_ride_id)
+        waited = self._waiting
+        if waited:
+            # the ones still without coordinates are added back below, departed ones drop out
+            rows += self.store.active_rides(since, ride_ids=waited)
+            self._waiting = set()
+        if rows:
+            new = []
+            for r in rows:
+                self._last_ride_id = max(self._last_ride_id, r["id"])
+                if any(r[f] is None for f in COORD_FIELDS):
+                    self._waiting.add(r["id"])
+                    continue
+                s = self._location(r["start_lat"], r["start_lon"])
+                e = self._location(r["end_lat"], r["end_lon"])
+                depart = to_minutes(r["departure_time"], EPOCH)
+                latest = depart + self.times.pair(s, e) + self.max_detour
+                # the vehicle holds every seat, the bookings loaded with the plan take theirs back
+                seats = int(r["seats_available"]) + int(r["seats_booked"])
+                route = self._routes[r["id"]] = Route(Vehicle(r["id"], s, e, depart, latest, seats), self.times)
+                self._seats[r["id"]] = int(r["seats_available"])
+                if self._seats[r["id"]] > 0:
+                    new.append(route)
+                else:
+                    self._full[r["id"]] = route
+            self.scheduler.add_routes(new)
+            # a plan stored before we could load its ride was skipped by plans_since
+            geocoded = [r["id"] for r in rows if r["id"] in waited and r["id"] in self._routes]
+            if geocoded:
+                for plan in self.store.plans_since(0, ride_ids=geocoded):
+                    self._load_plan(plan)
+        for plan in self.store.plans_since(self._seq):
+            self._seq = max(self._seq, plan["seq"])
+            if plan["ride_id"] in self._routes:
+                self._load_plan(plan)
+        if self._expired_at is None or now - self._expired_at >= 1.0:
+            self._expired_at = now
+            done = [r for r in self._routes.values() if r.vehicle.latest < now]
+            for route in done:
+                del self._routes[route.vehicle.id]
+                self._versions.pop(route.vehicle.id, None)
+                self._seats.pop(route.vehicle.id, None)
+                self._full.pop(route.vehicle.id, None)
+            if done:
+                self.scheduler.remove_routes(done)
+        self.stats["rides"] = len(self._routes)
+
+    def _load_plan(self, plan: Dict[str, Any]):
+        """Rebuilds the route of a ride from its stored stop order."""
+        route = self._routes[plan["ride_id"]]
+        requests = {}
+        for bid, b in plan["bookings"].items():
+            q = {"id": bid, "pickup": (b["pickup_lat"], b["pickup_lon"]), "dropoff": (b["dropoff_lat"], b["dropoff_lon"]),
+                 "pickup_from": b["pickup_from"], "pickup_to": b["pickup_to"], "arrive_by": b["arrive_by"],
+                 "seats": b["seats"]}
+            requests[bid] = parse_request(q, EPOCH, self._location)
+        route.set_stops([(kind, requests[bid]) for kind, bid in plan["stops"]])
+        self._versions[plan["ride_id"]] = plan["version"]
+        self._set_seats(route, route.vehicle.capacity - sum(r.seats for r in requests.values()))
+        self.stats["plans_synced"] += 1
+
+    def _set_seats(self, route: Route, seats: int):
+        """Seats left on route; it leaves the scheduler once none is left."""
+        ride_id = route.vehicle.id
+        self._seats[ride_id] = seats
+        if seats <= 0 and ride_id not in self._full:
+            self._full[ride_id] = route
+            self.scheduler.remove_routes([route])
+
+    # --- Matching ---
+
+    def match(self, request: Dict[str, Any], book: bool = True,
+              now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """
+        Cheapest feasible insertion of request ({"pickup", "dropoff", "pickup_from",
+        "pickup_to", "arrive_by", "seats", "rider"}) into an active ride, booked
+        unless book=False. None when no ride can take it.
+        """
+        now_min = to_minutes(now or datetime.now(), EPOCH)
+        with self._lock:
+            t0 = time.perf_counter()
+            req = parse_request(dict(request, id=None), EPOCH, self._location)
+            req = req._replace(earliest=max(req.earliest, now_min))
+            if req.latest < req.earliest:
+                raise ValueError("fenêtre de prise en charge déjà passée")
+            for _ in range(MAX_RETRIES):
+                self.sync(now_min)
+                # rides with some seats left, but fewer than the request needs
+                candidates = [r for r in self.scheduler.candidates_for(req) if self._seats[r.vehicle.id] >= req.seats]
+                best = self.scheduler.best(req, candidates, now_min)
+                if best is None:
+                    self.stats["unmatched"] += 1
+                    return None
+                cost, route, i, j = best
+                if not book:
+                    return self._result(route, req, i, j, cost, None, t0)
+                stops = self._stops_after(route, req, i, j)
+                booking = {
+                    "rider": request.get("rider"), "seats": req.seats,
+                    "pickup_lat": request["pickup"][0], "pickup_lon": request["pickup"][1],
+                    "dropoff_lat": request["dropoff"][0], "dropoff_lon": request["dropoff"][1],
+                    "pickup_from": to_iso(req.earliest, EPOCH), "pickup_to": to_iso(req.latest, EPOCH),
+                    "arrive_by": request.get("arrive_by"),
+                }
+                ride_id = route.vehicle.id
+                booking_id = self.store.book_ride(ride_id, booking, stops, self._versions.get(ride_id, 0))
+                if booking_id is None:
+                    # the plan or the seats moved on in another worker: the next sync loads
+                    # the plan, the seats left are read back now
+                    self.stats["conflicts"] += 1
+                    ride = self.store.get_ride(ride_id)
+                    if ride is not None:
+                        self._set_seats(route, int(ride["seats_available"]))
+                    continue
+                req = req._replace(id=booking_id)
+                route.insert(req, i, j)
+                self._versions[ride_id] = self._versions.get(ride_id, 0) + 1
+                self._set_seats(route, self._seats[ride_id] - req.seats)
+                self.stats["matched"] += 1
+                return self._result(route, req, i, j, cost, booking_id, t0)
+        raise RuntimeError("trajet modifié en parallèle, réessayer")
+
+    @staticmethod
+    def _stops_after(route: Route, req: Request, i: int, j: int) -> List[list]:
+        """Stored stop order of route once req is inserted after stops i / j (None = req)."""
+        stops = [["pickup" if route.delta[k] > 0 else "dropoff", route.owner[k].id] for k in range(1, len(route) - 1)]
+        stops.insert(j, ["dropoff", None])
+        stops.insert(i, ["pickup", None])
+        return stops
+
+    def _result(self, route: Route, req: Request, i: int, j: int, cost: float, booking_id: Optional[int],
+                t0: float) -> Dict[str, Any]:
+        if booking_id is None:
+            # quote: times as if inserted, without touching the route
+            route.insert(req, i, j)
+            stops = route.stops()
+            route.remove(req)
+        else:
+            stops = route.stops()
+        mine = [s for s in stops if s["request"] == req.id and s["kind"] in ("pickup", "dropoff")]
+        return {
+            "ride_id": route.vehicle.id,
+            "booking_id": booking_id,
+            "pickup_time": to_iso(mine[0]["service_start"], EPOCH),
+            "dropoff_time": to_iso(mine[1]["arrival"], EPOCH),
+            "added_drive_min": round(cost, 2),
+            "stops": [{"kind": s["kind"], "booking_id": s["request"], "arrival": to_iso(s["arrival"], EPOCH),
+                       "load": s["load"]} for s in stops],
+            "latency_ms": round((time.perf_counter() - t0) * 1000, 2),
+        }
@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+LRU cache of shortest-path results between snapped road nodes.
+
+Keys are (source id, target id, profile, graph version) with node ids of the
+CSR graph; the graph is undirected so (a, b) and (b, a) share one entry.
+Values are (distance km, path as an int32 array of node ids or None). The
+cache is bounded in entries and in total stored path nodes, and can be
+saved to / reloaded from a pickle file (entries of other graph versions
+are dropped when loading).
+'''
+
+import os
+import pickle
+from typing import Optional, Tuple
+
+import numpy as np
+
+from lru import LRUCache
+
+DEFAULT_PROFILE = "distance"
+
+def _weight(value) -> int:
+    _, path = value
+    return 1 + (len(path) if path is not None else 0)
+
+class PathCache:
+    def __init__(self, version: str, maxsize: int = 100_000, max_nodes: int = 5_000_000,
+                 path: Optional[str] = None):
+        self.version = version
+        self.path = path
+        self._lru = LRUCache(maxsize, maxweight=max_nodes, weigher=_weight)
+        if path:
+            self.load()
+
+    def _key(self, source: int, target: int, profile: str):
+        a, b = (source, target) if source <= target else (target, source)
+        return a, b, profile, self.version
+
+    def get(self, source: int, target: int, profile: str = DEFAULT_PROFILE,
+            need_path: bool = False) -> Optional[Tuple[float, Optional[np.ndarray]]]:
+        """(distance, path from source to target) or None; with need_path, distance-only entries miss."""
+        entry = self._lru.get(self._key(source, target, profile))
+        if entry is None:
+            return None
+        dist, path = entry
+        if need_path and path is None:
+            return None
+        if path is not None and source > target:
+            path = path[::-1]
+        return dist, path
+
+    def put(self, source: int, target: int, dist: float, path=None, profile: str = DEFAULT_PROFILE):
+        if path is not None:
+            path = np.asarray(path, dtype=np.int32)
+            if source > target:
+                path = path[::-1].copy()
+        self._lru.put(self._key(source, target, profile), (float(dist), path))
+
+    def stats(self):
+        return self._lru.stats()
+
+    def clear(self):
+        self._lru.clear()
+
+    # --- Persistence ---
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump({"version": self.version, "items": self._lru.items()}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                snap = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return
+        if snap.get("version") != self.version:
+            return
+        for key, value in snap["items"]:
+            self._lru.put(key, value)
@@ -0,0 +1,142 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+Pickup order for one driver collecting several riders.
+
+Works on a distance matrix D (index 0 = driver start, last index = destination,
+the others = pickups) and returns the order that minimises the total length
+of start -> pickups -> destination: exact Held-Karp dynamic programming up to
+HELD_KARP_MAX pickups, cheapest insertion followed by 2-opt / Or-opt local
+search above.
+'''
+
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+HELD_KARP_MAX = 12
+MAX_PASSES = 50
+
+def route_length(D: np.ndarray, route: Sequence[int]) -> float:
+    return float(sum(D[route[i], route[i + 1]] for i in range(len(route) - 1)))
+
+# --- Exact ---
+
+def held_karp(D: np.ndarray, start: int, end: int, stops: Sequence[int]) -> List[int]:
+    """Optimal order of stops for the path start -> stops -> end (O(2^k k^2), k = len(stops))."""
+    stops = list(stops)
+    k = len(stops)
+    if k <= 1:
+        return stops
+    S = np.asarray(stops)
+    inner = D[np.ix_(S, S)]  # inner[i, j] = D[stops[i], stops[j]]
+    full = 1 << k
+    # best[mask, j]: shortest start -> (stops of mask) ending at stop j (j in mask)
+    best = np.full((full, k), np.inf)
+    parent = np.full((full, k), -1, dtype=np.int64)
+    for j in range(k):
+        best[1 << j, j] = D[start, stops[j]]
+    for mask in range(1, full):
+        row = best[mask]
+        if not np.isfinite(row).any():
+            continue
+        # extend every end j of mask by every stop m outside mask
+        cand = row[:, None] + inner  # cand[j, m]
+        for m in range(k):
+            bit = 1 << m
+            if mask & bit:
+                continue
+            j = int(np.argmin(cand[:, m]))
+            value = cand[j, m]
+            nxt = mask | bit
+            if value < best[nxt, m]:
+                best[nxt, m] = value
+                parent[nxt, m] = j
+    last = best[full - 1] + D[S, end]
+    j = int(np.argmin(last))
+    order, mask = [], full - 1
+    while j >= 0:
+        order.append(stops[j])
+        prev = int(parent[mask, j])
+        mask ^= 1 << j
+        j = prev
+    return order[::-1]
+
+# --- Heuristic ---
+
+def cheapest_insertion(D: np.ndarray, start: int, end: int, stops: Sequence[int]) -> List[int]:
+    route = [start, end]
+    todo = list(stops)
+    while todo:
+        best = None
+        for s in todo:
+            for pos in range(1, len(route)):
+                a, b = route[pos - 1], route[pos]
+                cost = D[a, s] + D[s, b] - D[a, b]
+                if best is None or cost < best[0]:
+                    best = (cost, s, pos)
+        _, s, pos = best
+        route.insert(pos, s)
+        todo.remove(s)
+    return route[1:-1]
+
+def _two_opt(D: np.ndarray, route: List[int]) -> bool:
+    """Reverses route[i:j+1] when it shortens the path; endpoints stay fixed. True if improved."""
+    improved = False
+    n = len(route)
+    for i in range(1, n - 2):
+        for j in range(i + 1, n - 1):
+            a, b, c, d = route[i - 1], route[i], route[j], route[j + 1]
+            if D[a, c] + D[b, d] < D[a, b] + D[c, d] - 1e-9:
+                route[i:j + 1] = route[i:j + 1][::-1]
+                improved = True
+    return improved
+
+def _or_opt(D: np.ndarray, route: List[int]) -> bool:
+    """Moves segments of 1-3 consecutive stops (possibly reversed) to a better place. True if improved."""
+    n = len(route)
+    for size in (1, 2, 3):
+        for i in range(1, n - size):
+            j = i + size  # segment route[i:j]
+            if j > n - 1:
+                break
+            a, b = route[i - 1], route[j]
+            seg = route[i:j]
+            removed = D[a, seg[0]] + D[seg[-1], b] - D[a, b]
+            rest = route[:i] + route[j:]
+            for pos in range(1, len(rest)):
+                p, q = rest[pos - 1], rest[pos]
+                for s in (seg, seg[::-1]):
+                    added = D[p, s[0]] + D[s[-1], q] - D[p, q]
+                    if added < removed - 1e-9:
+                        route[:] = rest[:pos] + s + rest[pos:]
+                        return True
+    return False
+
+def local_search(D: np.ndarray, start: int, end: int, stops: Sequence[int]) -> List[int]:
+    route = [start] + cheapest_insertion(D, start, end, stops) + [end]
+    for _ in range(MAX_PASSES):
+        if not (_two_opt(D, route) | _or_opt(D, route)):
+            break
+    return route[1:-1]
+
+# --- Entry point ---
+
+def solve_order(D: np.ndarray, start: int = 0, end: int = None) -> Tuple[List[int], float, str]:
+    """
+    Order of the pickups (all indices except start and end) minimising the
+    path length. Returns (order, total length, method).
+    """
+    D = np.asarray(D, dtype=np.float64)
+    n = len(D)
+    end = n - 1 if end is None else end
+    stops = [i for i in range(n) if i not in (start, end)]
+    if len(stops) <= HELD_KARP_MAX:
+        order, method = held_karp(D, start, end, stops), "held_karp"
+    else:
+        order, method = local_search(D, start, end, stops), "insertion_2opt_oropt"
+    return order, route_length(D, [start] + order + [end]), method
@@ -0,0 +1,681 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+SQLite data-access layer for the carpool rides table
+'''
+
+#------------------
+# Import
+#------------------
+
+import math
+import os
+import json
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Sequence, Tuple
+
+from corridor import encode_polyline, decode_polyline, route_cells, cells_near, segments_within
+
+#------------------
+# Schema
+#------------------
+
+RIDE_FIELDS = ("driver_name", "start_location", "end_location", "seats_available", "departure_time")
+COORD_FIELDS = ("start_lat", "start_lon", "end_lat", "end_lon")
+
+# Columns added after the first version of the table (ALTER TABLE on old databases)
+_MIGRATIONS = [
+    ("start_lat", "REAL"),
+    ("start_lon", "REAL"),
+    ("end_lat", "REAL"),
+    ("end_lon", "REAL"),
+]
+
+_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS rides (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        driver_name TEXT NOT NULL,
+        start_location TEXT NOT NULL,
+        end_location TEXT NOT NULL,
+        seats_available INTEGER NOT NULL,
+        departure_time TEXT NOT NULL,
+        start_lat REAL,
+        start_lon REAL,
+        end_lat REAL,
+        end_lon REAL
+    )
+    ''',
+]
+
+_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_rides_departure_time ON rides(departure_time)",
+    "CREATE INDEX IF NOT EXISTS idx_rides_start_departure ON rides(start_location, departure_time)",
+    "CREATE INDEX IF NOT EXISTS idx_rides_end_departure ON rides(end_location, departure_time)",
+]
+
+# One R*Tree per end of the ride: (lat, lon, departure epoch) boxes, id = rides.id.
+# Triggers keep them in sync with the rides table whatever the writer.
+_SPATIAL_ENDS = ("start", "end")
+
+def _spatial_schema(end: str) -> List[str]:
+    tree = f"rides_{end}_rtree"
+    values = (f"NEW.id, NEW.{end}_lat, NEW.{end}_lat, NEW.{end}_lon, NEW.{end}_lon, "
+              "strftime('%s', NEW.departure_time), strftime('%s', NEW.departure_time)")
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {tree} USING rtree(id, min_lat, max_lat, min_lon, max_lon, min_t, max_t)",
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{tree}_insert AFTER INSERT ON rides
+        WHEN NEW.{end}_lat IS NOT NULL AND NEW.{end}_lon IS NOT NULL
+        BEGIN
+            INSERT OR REPLACE INTO {tree} VALUES ({values});
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{tree}_update AFTER UPDATE ON rides
+        BEGIN
+            DELETE FROM {tree} WHERE id = OLD.id;
+            INSERT OR REPLACE INTO {tree} SELECT {values}
+            WHERE NEW.{end}_lat IS NOT NULL AND NEW.{end}_lon IS NOT NULL;
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{tree}_delete AFTER DELETE ON rides
+        BEGIN
+            DELETE FROM {tree} WHERE id = OLD.id;
+        END
+        ''',
+    ]
+
+# Ride routes (compressed polyline) and the grid cells crossed by their segments
+_ROUTE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS ride_routes (
+        ride_id INTEGER PRIMARY KEY REFERENCES rides(id),
+        polyline TEXT NOT NULL,
+        n_points INTEGER NOT NULL,
+        length_km REAL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS ride_route_cells (
+        cell INTEGER NOT NULL,
+        ride_id INTEGER NOT NULL,
+        first_seg INTEGER NOT NULL,
+        last_seg INTEGER NOT NULL,
+        PRIMARY KEY (cell, ride_id)
+    ) WITHOUT ROWID
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_ride_route_cells_ride ON ride_route_cells(ride_id)",
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_ride_routes_delete AFTER DELETE ON rides
+    BEGIN
+        DELETE FROM ride_route_cells WHERE ride_id = OLD.id;
+        DELETE FROM ride_routes WHERE ride_id = OLD.id;
+    END
+    ''',
+]
+
+# Riders booked on a ride and the planned order of their stops (one JSON list per
+# ride). version is bumped by every booking: a matcher working on an older plan
+# gets a conflict instead of overwriting it. seq orders the plan updates so
+# that workers can fetch only the plans changed since their last look.
+_BOOKING_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS ride_bookings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ride_id INTEGER NOT NULL REFERENCES rides(id),
+        rider TEXT,
+        seats INTEGER NOT NULL,
+        pickup_lat REAL NOT NULL,
+        pickup_lon REAL NOT NULL,
+        dropoff_lat REAL NOT NULL,
+        dropoff_lon REAL NOT NULL,
+        pickup_from TEXT NOT NULL,
+        pickup_to TEXT NOT NULL,
+        arrive_by TEXT
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_ride_bookings_ride ON ride_bookings(ride_id)",
+    '''
+    CREATE TABLE IF NOT EXISTS ride_plans (
+        ride_id INTEGER PRIMARY KEY REFERENCES rides(id),
+        version INTEGER NOT NULL,
+        seq INTEGER NOT NULL,
+        stops TEXT NOT NULL
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_ride_plans_seq ON ride_plans(seq)",
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_ride_bookings_delete AFTER DELETE ON rides
+    BEGIN
+        DELETE FROM ride_bookings WHERE ride_id = OLD.id;
+        DELETE FROM ride_plans WHERE ride_id = OLD.id;
+    END
+    ''',
+]
+
+_BOOKING_COLUMNS = ("id, ride_id, rider, seats, pickup_lat, pickup_lon, dropoff_lat, dropoff_lon, "
+                    "pickup_from, pickup_to, arrive_by")
+
+# SQLite default limit on bound parameters is 999 on old builds
+_MAX_SQL_VARS = 900
+
+def _spatial_backfill(end: str) -> str:
+    return (f"INSERT OR REPLACE INTO rides_{end}_rtree "
+            f"SELECT id, {end}_lat, {end}_lat, {end}_lon, {end}_lon, "
+            "strftime('%s', departure_time), strftime('%s', departure_time) "
+            f"FROM rides WHERE {end}_lat IS NOT NULL AND {end}_lon IS NOT NULL")
+
+# Applied to every pooled connection (journal_mode=WAL is persisted in the file)
+_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+]
+
+_INSERT_SQL = (
+    "INSERT INTO rides (driver_name, start_location, end_location, seats_available, departure_time, "
+    "start_lat, start_lon, end_lat, end_lon) "
+    "VALUES (:driver_name, :start_location, :end_location, :seats_available, :departure_time, "
+    ":start_lat, :start_lon, :end_lat, :end_lon)"
+)
+
+_SELECT_COLUMNS = ("id, driver_name, start_location, end_location, seats_available, departure_time, "
+                   "start_lat, start_lon, end_lat, end_lon")
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG_LAT = 111.32
+
+MAX_QUERY_LIMIT = 1000
+
+#------------------
+# Helpers
+#------------------
+
+def normalize_departure_time(value: Any) -> str:
+    """ISO-8601 -> 'YYYY-MM-DDTHH:MM:SS' so that text comparisons follow time order."""
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        try:
+            dt = datetime.fromisoformat(str(value).strip())
+        except ValueError:
+            raise ValueError(f"departure_time invalide: {value!r}")
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt.isoformat(timespec="seconds")
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dlat = p2 - p1
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2)**2 + math.cos(p1) * math.cos(p2) * math.sin(dlon / 2)**2
+    return 2 * EARTH_RADIUS_KM * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+def radius_bbox(lat: float, lon: float, radius_km: float):
+    """Lat/lon box that contains the circle of radius_km around (lat, lon)."""
+    dlat = radius_km / KM_PER_DEG_LAT
+    dlon = radius_km / (KM_PER_DEG_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+def _coord(ride: Dict[str, Any], field: str, bound: float) -> Optional[float]:
+    value = ride.get(field)
+    if value in (None, ""):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} invalide")
+    if not -bound <= value <= bound:
+        raise ValueError(f"{field} invalide")
+    # ~10 cm, enough for a point snapped on the road network
+    return round(value, 6)
+
+def validate_ride(ride: Dict[str, Any]) -> Dict[str, Any]:
+    missing = [f for f in RIDE_FIELDS if ride.get(f) in (None, "")]
+    if missing:
+        raise ValueError(f"champs manquants: {', '.join(missing)}")
+    try:
+        seats = int(ride["seats_available"])
+    except (TypeError, ValueError):
+        raise ValueError("seats_available invalide")
+    if seats < 0:
+        raise ValueError("seats_available invalide")
+    coords = {f: _coord(ride, f, 90.0 if f.endswith("lat") else 180.0) for f in COORD_FIELDS}
+    for end in _SPATIAL_ENDS:
+        if (coords[f"{end}_lat"] is None) != (coords[f"{end}_lon"] is None):
+            raise ValueError(f"{end}_lat et {end}_lon vont ensemble")
+    return {
+        "driver_name": str(ride["driver_name"]).strip(),
+        "start_location": str(ride["start_location"]).strip(),
+        "end_location": str(ride["end_location"]).strip(),
+        "seats_available": seats,
+        "departure_time": normalize_departure_time(ride["departure_time"]),
+        **coords,
+    }
+
+def validate_booking(booking: Dict[str, Any]) -> Dict[str, Any]:
+    missing = [f for f in ("pickup_lat", "pickup_lon", "dropoff_lat", "dropoff_lon", "pickup_from", "pickup_to")
+               if booking.get(f) in (None, "")]
+    if missing:
+        raise ValueError(f"champs manquants: {', '.join(missing)}")
+    try:
+        seats = int(booking.get("seats", 1))
+    except (TypeError, ValueError):
+        raise ValueError("seats invalide")
+    if seats < 1:
+        raise ValueError("seats invalide")
+    coords = {f: _coord(booking, f, 90.0 if f.endswith("lat") else 180.0)
+              for f in ("pickup_lat", "pickup_lon", "dropoff_lat", "dropoff_lon")}
+    arrive_by = booking.get("arrive_by")
+    return {
+        "rider": str(booking["rider"]).strip() if booking.get("rider") else None,
+        "seats": seats,
+        **coords,
+        "pickup_from": normalize_departure_time(booking["pickup_from"]),
+        "pickup_to": normalize_departure_time(booking["pickup_to"]),
+        "arrive_by": normalize_departure_time(arrive_by) if arrive_by else None,
+    }
+
+def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    return {k: row[k] for k in row.keys()}
+
+#------------------
+# Connection pool
+#------------------
+
+class ConnectionPool:
+    """
+    Small per-process pool of SQLite connections.
+    The pool is dropped and rebuilt when the pid changes, so connections
+    opened before a gunicorn fork are never shared between workers.
+    """
+
+    def __init__(self, db_file: str, size: int = 8):
+        self.db_file = db_file
+        self.size = size
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file, timeout=5.0, check_same_thread=False,
+                               isolation_level=None, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        for pragma in _PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get(timeout=30)
+
+    def _release(self, conn: sqlite3.Connection):
+        if self._pid != os.getpid():
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._created = 0
+
+#------------------
+# Ride store
+#------------------
+
+class RideStore:
+    def __init__(self, db_file: str, pool_size: int = 8):
+        self.pool = ConnectionPool(db_file, pool_size)
+        self.init_schema()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def init_schema(self):
+        with self.transaction() as conn:
+            for stmt in _SCHEMA:
+                conn.execute(stmt)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(rides)")}
+            for name, decl in _MIGRATIONS:
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE rides ADD COLUMN {name} {decl}")
+            for stmt in _INDEXES:
+                conn.execute(stmt)
+            tables = {row["name"] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for end in _SPATIAL_ENDS:
+                for stmt in _spatial_schema(end):
+                    conn.execute(stmt)
+                if f"rides_{end}_rtree" not in tables:
+                    conn.execute(_spatial_backfill(end))
+            for stmt in _ROUTE_SCHEMA + _BOOKING_SCHEMA:
+                conn.execute(stmt)
+
+    # --- Writes ---
+
+    def insert_ride(self, ride: Dict[str, Any]) -> int:
+        return self.bulk_insert([ride])[0]
+
+    def bulk_insert(self, rides: Iterable[Dict[str, Any]], chunk_size: int = 5000) -> List[int]:
+        """
+        Inserts rides with one prepared statement, chunk_size rows per transaction.
+        Every row is validated before anything is written.
+        """
+        rows = [validate_ride(r) for r in rides]
+        ids: List[int] = []
+        for i in range(0, len(rows), chunk_size):
+            chunk = rows[i:i + chunk_size]
+            with self.transaction() as conn:
+                # AUTOINCREMENT + write lock held: the chunk gets seq+1 .. seq+len(chunk)
+                seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'rides'").fetchone()
+                first = (seq[0] if seq else 0) + 1
+                conn.executemany(_INSERT_SQL, chunk)
+                ids.extend(range(first, first + len(chunk)))
+        return ids
+
+    def set_route(self, ride_id: int, path: Sequence[Sequence[float]], length_km: Optional[float] = None) -> bool:
+        """
+        Stores the driver's route (list of (lat, lon), e.g. a Dijkstra path of the
+        road graph) as an encoded polyline and indexes its segments by grid cell.
+        """
+        path = [(float(lat), float(lon)) for lat, lon in path]
+        if not path:
+            raise ValueError("path vide")
+        if length_km is None:
+            length_km = sum(haversine_km(*path[i], *path[i + 1]) for i in range(len(path) - 1))
+        # Index the decoded geometry so the cells match what the queries will decode
+        encoded = encode_polyline(path)
+        cells = route_cells(decode_polyline(encoded))
+        with self.transaction() as conn:
+            if not conn.execute("SELECT 1 FROM rides WHERE id = ?", (ride_id,)).fetchone():
+                return False
+            conn.execute("DELETE FROM ride_route_cells WHERE ride_id = ?", (ride_id,))
+            conn.execute("INSERT OR REPLACE INTO ride_routes (ride_id, polyline, n_points, length_km) "
+                         "VALUES (?, ?, ?, ?)", (ride_id, encoded, len(path), length_km))
+            conn.executemany("INSERT INTO ride_route_cells (cell, ride_id, first_seg, last_seg) VALUES (?, ?, ?, ?)",
+                             [(cell, ride_id, first, last) for cell, (first, last) in cells.items()])
+        return True
+
+    def book_ride(self, ride_id: int, booking: Dict[str, Any], stops: Sequence[Tuple[str, Optional[int]]],
+                  version: int) -> Optional[int]:
+        """
+        Books a rider on ride_id and stores the new stop order in one transaction.
+        stops: ("pickup" | "dropoff", booking id) in visiting order, None standing
+        for the new booking. version is the plan version the order was computed
+        from: if another writer changed the plan since, or the ride no longer has
+        the seats, nothing is written and None is returned. Otherwise returns the
+        new booking id. The booked seats are taken off rides.seats_available, so
+        searches stop offering them.
+        """
+        row = validate_booking(booking)
+        with self.transaction() as conn:
+            if not conn.execute("SELECT 1 FROM rides WHERE id = ?", (ride_id,)).fetchone():
+                raise ValueError("Trajet introuvable")
+            current = conn.execute("SELECT version FROM ride_plans WHERE ride_id = ?", (ride_id,)).fetchone()
+            if (current[0] if current else 0) != version:
+                return None
+            taken = conn.execute("UPDATE rides SET seats_available = seats_available - :seats "
+                                 "WHERE id = :id AND seats_available >= :seats", {"seats": row["seats"], "id": ride_id})
+            if taken.rowcount != 1:
+                # seats taken since the caller looked: a conflict, like a plan change
+                return None
+            cur = conn.execute(
+                "INSERT INTO ride_bookings (ride_id, rider, seats, pickup_lat, pickup_lon, dropoff_lat, dropoff_lon, "
+                "pickup_from, pickup_to, arrive_by) VALUES (:ride_id, :rider, :seats, :pickup_lat, :pickup_lon, "
+                ":dropoff_lat, :dropoff_lon, :pickup_from, :pickup_to, :arrive_by)", dict(row, ride_id=ride_id))
+            booking_id = cur.lastrowid
+            plan = [[kind, booking_id if ref is None else int(ref)] for kind, ref in stops]
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM ride_plans").fetchone()[0]
+            conn.execute("INSERT OR REPLACE INTO ride_plans (ride_id, version, seq, stops) VALUES (?, ?, ?, ?)",
+                         (ride_id, version + 1, seq, json.dumps(plan)))
+        return booking_id
+
+    # --- Reads ---
+
+    def active_rides(self, since: Any, after_id: int = 0,
+                     ride_ids: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+        """
+        Rides departing at or after since, with id > after_id (and among ride_ids
+        if given), by id, no limit. Rides not geocoded yet are included, with
+        None coordinates. seats_booked: seats already taken off seats_available.
+        """
+        sql = (f"SELECT {_SELECT_COLUMNS}, (SELECT COALESCE(SUM(b.seats), 0) FROM ride_bookings b "
+               "WHERE b.ride_id = rides.id) AS seats_booked FROM rides WHERE id > ? AND departure_time >= ?")
+        params = [int(after_id), normalize_departure_time(since)]
+        with self.pool.connection() as conn:
+            if ride_ids is None:
+                rows = conn.execute(sql + " ORDER BY id", params).fetchall()
+            else:
+                ids, rows = sorted(int(i) for i in ride_ids), []
+                for i in range(0, len(ids), _MAX_SQL_VARS - len(params)):
+                    chunk = ids[i:i + _MAX_SQL_VARS - len(params)]
+                    rows.extend(conn.execute(f"{sql} AND id IN ({','.join('?' * len(chunk))}) ORDER BY id",
+                                             params + chunk).fetchall())
+        return [_row_to_dict(r) for r in rows]
+
+    def plans_since(self, seq: int, ride_ids: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+        """
+        Plans updated after seq (all of them for ride_ids if given), each with
+        its bookings: {"ride_id", "version", "seq", "stops", "bookings": {id: row}}.
+        """
+        with self.pool.connection() as conn:
+            if ride_ids is None:
+                rows = conn.execute("SELECT ride_id, version, seq, stops FROM ride_plans WHERE seq > ? ORDER BY seq",
+                                    (int(seq),)).fetchall()
+            else:
+                ids, rows = [int(i) for i in ride_ids], []
+                for i in range(0, len(ids), _MAX_SQL_VARS):
+                    chunk = ids[i:i + _MAX_SQL_VARS]
+                    rows.extend(conn.execute(
+                        f"SELECT ride_id, version, seq, stops FROM ride_plans "
+                        f"WHERE ride_id IN ({','.join('?' * len(chunk))}) ORDER BY seq", chunk).fetchall())
+            plans = []
+            for row in rows:
+                plan = _row_to_dict(row)
+                plan["stops"] = json.loads(plan["stops"])
+                bookings = conn.execute(f"SELECT {_BOOKING_COLUMNS} FROM ride_bookings WHERE ride_id = ?",
+                                        (plan["ride_id"],)).fetchall()
+                plan["bookings"] = {b["id"]: _row_to_dict(b) for b in bookings}
+                plans.append(plan)
+        return plans
+
+    def get_plan(self, ride_id: int) -> Optional[Dict[str, Any]]:
+        plans = self.plans_since(0, ride_ids=[ride_id])
+        return plans[0] if plans else None
+
+    def get_route(self, ride_id: int) -> Optional[Dict[str, Any]]:
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT ride_id, polyline, n_points, length_km FROM ride_routes WHERE ride_id = ?",
+                               (ride_id,)).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def _segment_ranges(self, conn: sqlite3.Connection, cells: List[int]) -> Dict[int, Tuple[int, int]]:
+        """ride_id -> (first, last) segment index over the given cells."""
+        ranges: Dict[int, Tuple[int, int]] = {}
+        for i in range(0, len(cells), _MAX_SQL_VARS):
+            chunk = cells[i:i + _MAX_SQL_VARS]
+            sql = (f"SELECT ride_id, MIN(first_seg), MAX(last_seg) FROM ride_route_cells "
+                   f"WHERE cell IN ({','.join('?' * len(chunk))}) GROUP BY ride_id")
+            for ride_id, first, last in conn.execute(sql, chunk):
+                if ride_id in ranges:
+                    f0, l0 = ranges[ride_id]
+                    first, last = min(first, f0), max(last, l0)
+                ranges[ride_id] = (first, last)
+        return ranges
+
+    def match_corridor(self, pickup: Tuple[float, float], dropoff: Tuple[float, float], radius_km: float,
+                       time_from: Optional[Any] = None, time_to: Optional[Any] = None,
+                       min_seats: int = 1, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Rides whose stored route passes within radius_km of pickup, then later
+        within radius_km of dropoff. Candidates come from the cell index only
+        (cells around the two points), the geometry check runs on those.
+        """
+        if radius_km <= 0:
+            raise ValueError("radius invalide")
+        with self.pool.connection() as conn:
+            near_pickup = self._segment_ranges(conn, cells_near(pickup[0], pickup[1], radius_km))
+            near_dropoff = self._segment_ranges(conn, cells_near(dropoff[0], dropoff[1], radius_km))
+            candidates = {rid: (near_pickup[rid], rng) for rid, rng in near_dropoff.items()
+                          if rid in near_pickup and near_pickup[rid][0] <= rng[1]}
+            clauses, params = ["r.seats_available >= ?"], [int(min_seats)]
+            if time_from is not None:
+                clauses.append("r.departure_time >= ?")
+                params.append(normalize_departure_time(time_from))
+            if time_to is not None:
+                clauses.append("r.departure_time <= ?")
+                params.append(normalize_departure_time(time_to))
+            columns = ", ".join("r." + c.strip() for c in _SELECT_COLUMNS.split(","))
+            ids = list(candidates)
+            rows = []
+            for i in range(0, len(ids), _MAX_SQL_VARS):
+                chunk = ids[i:i + _MAX_SQL_VARS]
+                sql = (f"SELECT {columns}, rr.polyline FROM rides r JOIN ride_routes rr ON rr.ride_id = r.id "
+                       f"WHERE r.id IN ({','.join('?' * len(chunk))}) AND {' AND '.join(clauses)}")
+                rows.extend(conn.execute(sql, (*chunk, *params)).fetchall())
+        matches = []
+        for row in rows:
+            ride = _row_to_dict(row)
+            path = decode_polyline(ride.pop("polyline"))
+            (p_first, p_last), (d_first, d_last) = candidates[ride["id"]]
+            pick = min(segments_within(path, pickup, radius_km, p_first, p_last), default=None)
+            if pick is None:
+                continue
+            drop = max(segments_within(path, dropoff, radius_km, max(pick[0], d_first), d_last), default=None)
+            if drop is None:
+                continue
+            ride["pickup"] = {"segment": pick[0], "distance_km": round(pick[1], 3)}
+            ride["dropoff"] = {"segment": drop[0], "distance_km": round(drop[1], 3)}
+            matches.append(ride)
+        matches.sort(key=lambda r: (r["departure_time"], r["pickup"]["distance_km"] + r["dropoff"]["distance_km"]))
+        return matches[:max(1, min(int(limit), MAX_QUERY_LIMIT))]
+
+    def get_ride(self, ride_id: int) -> Optional[Dict[str, Any]]:
+        with self.pool.connection() as conn:
+            row = conn.execute(f"SELECT {_SELECT_COLUMNS} FROM rides WHERE id = ?", (ride_id,)).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def find_rides(self, time_from: Optional[Any] = None, time_to: Optional[Any] = None,
+                   start_location: Optional[str] = None, end_location: Optional[str] = None,
+                   min_seats: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Rides departing in [time_from, time_to], ordered by departure_time."""
+        clauses, params = [], []
+        if start_location:
+            clauses.append("start_location = ?")
+            params.append(start_location)
+        if end_location:
+            clauses.append("end_location = ?")
+            params.append(end_location)
+        if time_from is not None:
+            clauses.append("departure_time >= ?")
+            params.append(normalize_departure_time(time_from))
+        if time_to is not None:
+            clauses.append("departure_time <= ?")
+            params.append(normalize_departure_time(time_to))
+        if min_seats:
+            clauses.append("seats_available >= ?")
+            params.append(int(min_seats))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        limit = max(1, min(int(limit), MAX_QUERY_LIMIT))
+        sql = f"SELECT {_SELECT_COLUMNS} FROM rides {where} ORDER BY departure_time, id LIMIT ?"
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, (*params, limit)).fetchall()
+        return [_row_to_dict(r) for r in rows]
+
+    def search_near(self, lat: float, lon: float, radius_km: float,
+                    time_from: Any, time_to: Any, end: str = "start",
+                    min_seats: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Rides whose start (or end) lies within radius_km of (lat, lon) and
+        departing in [time_from, time_to]. The R*Tree box query is a superset
+        (float32 bounds), the exact distance and time filters run on the hits.
+        """
+        if end not in _SPATIAL_ENDS:
+            raise ValueError("near invalide")
+        if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0) or radius_km <= 0:
+            raise ValueError("lat/lon/radius invalides")
+        t_from = normalize_departure_time(time_from)
+        t_to = normalize_departure_time(time_to)
+        min_lat, max_lat, min_lon, max_lon = radius_bbox(lat, lon, radius_km)
+        sql = (
+            f"SELECT {', '.join('r.' + c.strip() for c in _SELECT_COLUMNS.split(','))} "
+            f"FROM rides_{end}_rtree g JOIN rides r ON r.id = g.id "
+            "WHERE g.max_lat >= ? AND g.min_lat <= ? AND g.max_lon >= ? AND g.min_lon <= ? "
+            "AND g.max_t >= strftime('%s', ?) - 1 AND g.min_t <= strftime('%s', ?) + 1 "
+            "AND r.departure_time >= ? AND r.departure_time <= ? AND r.seats_available >= ?"
+        )
+        params = (min_lat, max_lat, min_lon, max_lon, t_from, t_to, t_from, t_to, int(min_seats))
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        hits = []
+        for row in rows:
+            ride = _row_to_dict(row)
+            dist = haversine_km(lat, lon, ride[f"{end}_lat"], ride[f"{end}_lon"])
+            if dist <= radius_km:
+                ride["distance_km"] = round(dist, 3)
+                hits.append(ride)
+        hits.sort(key=lambda r: (r["departure_time"], r["distance_km"]))
+        return hits[:max(1, min(int(limit), MAX_QUERY_LIMIT))]
+
+    def count(self) -> int:
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM rides").fetchone()[0]
+
+    def close(self):
+        self.pool.close()
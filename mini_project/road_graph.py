@@ -0,0 +1,381 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+Compact (CSR) copy of the road graph stored as .npy arrays so that several
+processes can memory-map the same file instead of pickling the networkx graph.
+'''
+
+import os
+import json
+import heapq
+import hashlib
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+ARRAYS = ("coords", "indptr", "indices", "weights")
+# derived from ARRAYS, saved alongside but not part of the version hash
+DERIVED = ("labels",)
+# per-edge attributes (aligned with indices), saved alongside, not part of the version hash
+EDGE_ATTRS = ("road_class",)
+
+EARTH_RADIUS_KM = 6371
+
+def haversine_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Great-circle distances (km) between every row of a and every row of b, both (n, 2) lat/lon."""
+    lat1, lon1 = np.radians(a[:, 0])[:, None], np.radians(a[:, 1])[:, None]
+    lat2, lon2 = np.radians(b[:, 0])[None, :], np.radians(b[:, 1])[None, :]
+    h = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(h), np.sqrt(1 - h))
+
+def component_labels(indptr, indices, n_nodes) -> np.ndarray:
+    """
+    Connected component of every node, numbered by decreasing size:
+    label 0 is the main component, higher labels are the islands of the extract.
+    """
+    indptr, indices = indptr.tolist(), indices.tolist()
+    labels = [-1] * n_nodes
+    sizes = []
+    for root in range(n_nodes):
+        if labels[root] >= 0:
+            continue
+        comp = len(sizes)
+        labels[root] = comp
+        stack, size = [root], 0
+        while stack:
+            u = stack.pop()
+            size += 1
+            for v in indices[indptr[u]:indptr[u + 1]]:
+                if labels[v] < 0:
+                    labels[v] = comp
+                    stack.append(v)
+        sizes.append(size)
+    rank = np.empty(len(sizes), dtype=np.int32)
+    rank[np.argsort(-np.asarray(sizes, dtype=np.int64), kind="stable")] = np.arange(len(sizes), dtype=np.int32)
+    return rank[np.asarray(labels, dtype=np.int64)] if n_nodes else np.zeros(0, dtype=np.int32)
+
+# --- CSR graph ---
+
+class CSRGraph:
+    """
+    Undirected road graph in compressed sparse row form.
+    Node i is at coords[i] = (lat, lon); its neighbours are
+    indices[indptr[i]:indptr[i+1]] with edge lengths (km) in weights[...]
+    and, when known, the OSM highway class in class_names[road_class[...]].
+    """
+
+    def __init__(self, coords, indptr, indices, weights, version=None, labels=None,
+                 road_class=None, class_names=None):
+        self.coords = coords
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.road_class = road_class
+        self.class_names = list(class_names or [])
+        self.version = version or self._hash()
+        self._node_index = None
+        self._labels = labels
+
+    @classmethod
+    def from_networkx(cls, G, weight="weight", road_class="highway"):
+        nodes = list(G.nodes)
+        index = {n: i for i, n in enumerate(nodes)}
+        coords = np.array(nodes, dtype=np.float64).reshape(-1, 2)
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        indices, weights, classes = [], [], []
+        class_ids: Dict[str, int] = {}
+        for i, n in enumerate(nodes):
+            for nbr, data in G.adj[n].items():
+                indices.append(index[nbr])
+                weights.append(data.get(weight, 1.0))
+                name = data.get(road_class) or ""
+                classes.append(class_ids.setdefault(name, len(class_ids)))
+            indptr[i + 1] = len(indices)
+        graph = cls(coords, indptr, np.array(indices, dtype=np.int32), np.array(weights, dtype=np.float64),
+                    road_class=np.array(classes, dtype=np.uint16), class_names=list(class_ids))
+        graph._node_index = index
+        return graph
+
+    def _hash(self):
+        h = hashlib.sha1()
+        for name in ARRAYS:
+            arr = np.ascontiguousarray(getattr(self, name))
+            h.update(name.encode())
+            h.update(str(arr.shape).encode())
+            h.update(arr.data)
+        return h.hexdigest()[:16]
+
+    @property
+    def n_nodes(self):
+        return len(self.coords)
+
+    def node_index(self):
+        """(lat, lon) -> node id, built on first use."""
+        if self._node_index is None:
+            self._node_index = {(float(lat), float(lon)): i for i, (lat, lon) in enumerate(self.coords.tolist())}
+        return self._node_index
+
+    def node(self, i):
+        lat, lon = self.coords[i]
+        return float(lat), float(lon)
+
+    @property
+    def labels(self) -> np.ndarray:
+        """Connected component per node (0 = main component), computed once."""
+        if self._labels is None:
+            self._labels = component_labels(self.indptr, self.indices, self.n_nodes)
+        return self._labels
+
+    def connected(self, a: int, b: int) -> bool:
+        labels = self.labels
+        return labels[a] == labels[b]
+
+    # --- Persistence ---
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        np.save(os.path.join(directory, "labels.npy"), self.labels)
+        if self.road_class is not None:
+            np.save(os.path.join(directory, "road_class.npy"), self.road_class)
+        n_components = int(self.labels.max()) + 1 if self.n_nodes else 0
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "n_nodes": self.n_nodes, "n_edges": len(self.indices) // 2,
+                       "n_components": n_components, "class_names": self.class_names}, f)
+        return directory
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode) for name in ARRAYS}
+        for name in DERIVED + EDGE_ATTRS:
+            path = os.path.join(directory, f"{name}.npy")
+            if os.path.exists(path):  # graphs saved before these existed
+                arrays[name] = np.load(path, mmap_mode=mode)
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(version=meta["version"], class_names=meta.get("class_names"), **arrays)
+
+    # --- Shortest paths ---
+
+    def dijkstra(self, source: int, targets: Optional[Sequence[int]] = None,
+                 cutoff: float = float("inf")) -> Dict[int, float]:
+        """
+        Distances from source (km). Stops once every target is settled or the
+        next node is farther than cutoff. Unreached nodes are absent; targets
+        outside the component of source are dropped without searching.
+        """
+        indptr, indices, weights = self.indptr, self.indices, self.weights
+        remaining = None
+        if targets is not None:
+            labels = self.labels
+            remaining = {t for t in targets if labels[t] == labels[source]}
+            if not remaining:
+                return {source: 0.0}
+        dist = {source: 0.0}
+        done = {}
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            if d > cutoff:
+                break
+            done[u] = d
+            if remaining is not None:
+                remaining.discard(u)
+                if not remaining:
+                    break
+            lo, hi = int(indptr[u]), int(indptr[u + 1])
+            for v, w in zip(indices[lo:hi].tolist(), weights[lo:hi].tolist()):
+                nd = d + w
+                if v not in done and nd < dist.get(v, float("inf")):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return done
+
+    def total_distance(self, end: int, starts: Sequence[int]) -> float:
+        """Sum of the shortest path lengths start -> end, one search from end (graph is undirected)."""
+        if not all(self.connected(end, s) for s in starts):
+            return float("inf")
+        dist = self.dijkstra(end, targets=set(starts))
+        return sum(dist.get(s, float("inf")) for s in starts)
+
+    def distance_matrix(self, ids: Sequence[int]) -> np.ndarray:
+        """
+        Many-to-many road distances (km) between ids, inf when unreachable.
+        The graph is undirected: search i only needs the ids after i.
+        """
+        ids = [int(i) for i in ids]
+        n = len(ids)
+        matrix = np.full((n, n), np.inf)
+        np.fill_diagonal(matrix, 0.0)
+        for i in range(n - 1):
+            dist = self.dijkstra(ids[i], targets=ids[i + 1:])
+            for j in range(i + 1, n):
+                d = dist.get(ids[j])
+                if d is not None:
+                    matrix[i, j] = matrix[j, i] = d
+        return matrix
+
+    def bounded_total(self, end: int, starts: Sequence[int], budget: float,
+                      lower_bounds: Optional[Dict[int, float]] = None) -> float:
+        """
+        total_distance(end, starts), or inf as soon as it provably reaches budget.
+        When node u is settled at distance d, every unsettled start is at least
+        max(d, its lower bound) away, so the total is at least
+        settled + max(unsettled * d, sum of their lower bounds).
+        """
+        if not all(self.connected(end, s) for s in starts):
+            return float("inf")
+        remaining = Counter(starts)
+        lower_bounds = lower_bounds or {}
+        left = len(starts)
+        lb_left = sum(lower_bounds.get(s, 0.0) for s in starts)
+        settled = 0.0
+        indptr, indices, weights = self.indptr, self.indices, self.weights
+        dist = {end: 0.0}
+        done = set()
+        heap = [(0.0, end)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            if settled + max(left * d, lb_left) >= budget:
+                return float("inf")
+            done.add(u)
+            count = remaining.pop(u, 0)
+            if count:
+                settled += count * d
+                left -= count
+                lb_left -= count * lower_bounds.get(u, 0.0)
+                if not left:
+                    return settled
+            lo, hi = int(indptr[u]), int(indptr[u + 1])
+            for v, w in zip(indices[lo:hi].tolist(), weights[lo:hi].tolist()):
+                nd = d + w
+                if v not in done and nd < dist.get(v, float("inf")):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return float("inf")
+
+    def best_end(self, starts: Sequence[int], ends: Sequence[int]) -> Tuple[int, float, List[Optional[float]], Dict]:
+        """
+        Branch and bound over the candidate end nodes. Edge weights are
+        haversine lengths, so the haversine sum is a lower bound of a
+        candidate's total: candidates are tried by increasing bound, each
+        search is abandoned once it cannot beat the best total so far, and
+        the loop stops at the first bound that is already too large.
+        Returns (index in ends, total, totals, stats); totals holds None
+        for the candidates that were pruned or abandoned.
+        """
+        if not starts or not ends:
+            raise ValueError("aucun point de départ ou aucune destination")
+        start_ids = np.asarray(list(starts), dtype=np.int64)
+        end_ids = np.asarray(list(ends), dtype=np.int64)
+        lb = haversine_matrix(self.coords[end_ids], self.coords[start_ids])
+        lb_total = lb.sum(axis=1)
+        starts_list = start_ids.tolist()
+        totals: List[Optional[float]] = [None] * len(end_ids)
+        best_i, best = 0, float("inf")
+        searched = 0
+        for i in np.argsort(lb_total, kind="stable").tolist():
+            if lb_total[i] >= best:
+                break
+            searched += 1
+            total = self.bounded_total(int(end_ids[i]), starts_list, best, dict(zip(starts_list, lb[i].tolist())))
+            if total < best:
+                best_i, best = i, total
+                totals[i] = total
+        stats = {"candidates": len(end_ids), "searched": searched, "pruned": len(end_ids) - searched}
+        return best_i, best, totals, stats
+
+    def distance_array(self, source: int, cutoff: float = float("inf")) -> np.ndarray:
+        """Full single-source search as a float64 array (inf where unreached)."""
+        dist = self.dijkstra(source, cutoff=cutoff)
+        out = np.full(self.n_nodes, np.inf)
+        out[np.fromiter(dist.keys(), dtype=np.int64, count=len(dist))] = np.fromiter(dist.values(), dtype=np.float64,
+                                                                                     count=len(dist))
+        return out
+
+    def one_median(self, starts: Sequence[int], objective: str = "sum",
+                   candidates: Optional[Sequence[int]] = None):
+        """
+        Node minimising the total (objective="sum") or worst (objective="max")
+        distance from all starts: one search per start, accumulated in a NumPy
+        array, then an argmin over every node (or only over candidates).
+        Returns (node id, value, accumulated array).
+        """
+        if objective not in ("sum", "max"):
+            raise ValueError("objective doit être 'sum' ou 'max'")
+        if not starts:
+            raise ValueError("aucun point de départ")
+        acc = np.zeros(self.n_nodes)
+        if len({int(self.labels[s]) for s in starts}) > 1:
+            # starts on different islands: no node reaches all of them
+            acc[:] = np.inf
+            best = int(candidates[0]) if candidates is not None else 0
+            return best, float("inf"), acc
+        for s in starts:
+            dist = self.distance_array(s)
+            if objective == "sum":
+                acc += dist
+            else:
+                np.maximum(acc, dist, out=acc)
+        if candidates is not None:
+            cand = np.asarray(list(candidates), dtype=np.int64)
+            best = int(cand[np.argmin(acc[cand])])
+        else:
+            best = int(np.argmin(acc))
+        return best, float(acc[best]), acc
+
+# --- Process pool scoring ---
+
+_WORKER_GRAPH: Optional[CSRGraph] = None
+
+def _init_worker(directory):
+    global _WORKER_GRAPH
+    _WORKER_GRAPH = CSRGraph.load(directory, mmap=True)
+
+def _score_one(args):
+    end, starts = args
+    return _WORKER_GRAPH.total_distance(end, starts)
+
+class ParallelScorer:
+    """
+    Process pool whose workers memory-map the CSR arrays saved in directory.
+    Each candidate end point is one task (one search from the candidate).
+    """
+
+    def __init__(self, directory, workers=None):
+        self.directory = directory
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = None
+
+    def _pool(self):
+        if self._executor is None:
+            # fork: children must not re-run top-level scripts such as compute_routes.py.
+            # The parent's graph is not used by the workers, they map the saved arrays.
+            methods = multiprocessing.get_all_start_methods()
+            ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx,
+                                                 initializer=_init_worker, initargs=(self.directory,))
+        return self._executor
+
+    def score(self, start_ids: Sequence[int], end_ids: Sequence[int]) -> List[float]:
+        starts = list(start_ids)
+        chunksize = max(1, len(end_ids) // (self.workers * 4))
+        return list(self._pool().map(_score_one, [(e, starts) for e in end_ids], chunksize=chunksize))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -0,0 +1,532 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+Routing logic of compute_routes.py as a reusable module:
+the road graph is loaded once and then answers routing queries
+(shortest paths, best destination, meeting points).
+'''
+
+import os
+import math
+import tempfile
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import networkx as nx
+from tqdm import tqdm
+
+from road_graph import CSRGraph, ParallelScorer
+from path_cache import PathCache
+from pickup import solve_order
+from time_profiles import SpeedProfiles, td_route, td_reverse, edge_profile_ids
+from isochrone import outline, edge_samples, CELL_KM
+from lru import LRUCache
+from instrumentation import stage, log
+
+Coord = Tuple[float, float]
+
+PARQUET_FILE = "highways.parquet"
+EARTH_RADIUS_KM = 6371
+# a main-component node is preferred when snapping if it is at most this much farther than the nearest node
+MAIN_COMPONENT_SLACK_KM = 0.5
+# isochrones in minutes: arrive_by is floored to this slot so that close requests share a cache entry
+ISOCHRONE_SLOT_MIN = 15
+
+# --- Helpers ---
+
+def haversine_distance(coord1, coord2):
+    R = EARTH_RADIUS_KM
+    lat1, lon1 = math.radians(coord1[0]), math.radians(coord1[1])
+    lat2, lon2 = math.radians(coord2[0]), math.radians(coord2[1])
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+def haversine_many(lats: np.ndarray, lons: np.ndarray, point: Coord) -> np.ndarray:
+    """Vectorised haversine from point to every (lats[i], lons[i]), in km."""
+    lat1, lon1 = np.radians(lats), np.radians(lons)
+    lat2, lon2 = math.radians(point[0]), math.radians(point[1])
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * math.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+def calculate_bbox(coords, buffer=0.1):
+    """Calculates a bounding box (lat/lon) around all input coordinates."""
+    if not coords:
+        return 0, 0, 0, 0
+    min_lat = min(c[0] for c in coords) - buffer
+    max_lat = max(c[0] for c in coords) + buffer
+    min_lon = min(c[1] for c in coords) - buffer
+    max_lon = max(c[1] for c in coords) + buffer
+    return min_lat, max_lat, min_lon, max_lon
+
+def check_row_in_bbox(nodes, min_lat, max_lat, min_lon, max_lon):
+    """Checks if any node in a highway segment falls within the bounding box."""
+    for lat, lon in nodes:
+        if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+            return True
+    return False
+
+def nearest_node_by_road(G, point, k=5, labels=None):
+    """labels (node -> component, 0 = main): candidates of the main component are preferred."""
+    if not G.nodes:
+        return point
+    candidates = sorted(G.nodes, key=lambda n: haversine_distance(n, point))[:k]
+    if labels is not None:
+        limit = haversine_distance(candidates[0], point) + MAIN_COMPONENT_SLACK_KM
+        candidates = [n for n in candidates if labels[n] == 0 and haversine_distance(n, point) <= limit] or candidates
+    best_node, best_dist = None, float("inf")
+    for node in candidates:
+        snap_dist = haversine_distance(point, node)
+        if snap_dist < best_dist:
+            best_node, best_dist = node, snap_dist
+    return best_node
+
+def dijkstra_path(G, source, target):
+    return nx.dijkstra_path(G, source, target, weight='weight')
+
+# --- Data loading / graph ---
+
+def load_highways(parquet_file=PARQUET_FILE, bbox=None):
+    """Reads the highways parquet, keeping only the ways that touch bbox (if given)."""
+    if not os.path.exists(parquet_file):
+        raise FileNotFoundError(f"Parquet file '{parquet_file}' not found. Run the parser first.")
+    with stage("load") as rec:
+        df = pd.read_parquet(parquet_file)
+        rec.items = len(df)
+    if bbox is None:
+        return df
+    return filter_bbox(df, bbox)
+
+def filter_bbox(df, bbox):
+    """Rows of a highways DataFrame whose way touches bbox (min_lat, max_lat, min_lon, max_lon)."""
+    min_lat, max_lat, min_lon, max_lon = bbox
+    with stage("bbox_filter", items=len(df)):
+        log("Filtering DataFrame by Bounding Box...")
+        df_filtered = df[df['nodes'].apply(lambda x: check_row_in_bbox(x, min_lat, max_lat, min_lon, max_lon))]
+        log(f"Filtered from {len(df)} rows to {len(df_filtered)} rows.")
+    return df_filtered
+
+def build_graph(df):
+    """Edges weighted by length (km), tagged with the OSM highway class of their way."""
+    G = nx.Graph()
+    classes = df['highway'] if 'highway' in df else [None] * len(df)
+    with stage("graph_build", items=len(df)):
+        for nodes, highway in tqdm(zip(df['nodes'], classes), total=len(df), desc="Building Graph"):
+            for i in range(len(nodes) - 1):
+                a = (float(nodes[i][0]), float(nodes[i][1]))
+                b = (float(nodes[i+1][0]), float(nodes[i+1][1]))
+                G.add_edge(a, b, weight=haversine_distance(a, b), highway=highway)
+    return G
+
+# --- Routing ---
+
+def score_end_points(G, start_nodes, end_nodes, labels=None):
+    """
+    end node -> sum of the shortest path lengths from every start node (inf if unreachable).
+    With labels (node -> component), pairs in different components are not searched.
+    """
+    scores = {}
+    for end_node in end_nodes:
+        total_distance = 0
+        for start_node in start_nodes:
+            if labels is not None and labels[start_node] != labels[end_node]:
+                total_distance = float('inf')
+                break
+            try:
+                total_distance += nx.dijkstra_path_length(G, start_node, end_node, weight='weight')
+            except nx.NetworkXNoPath:
+                total_distance += float('inf')
+        scores[end_node] = total_distance
+    return scores
+
+def compute_paths(G, start_nodes, end_node, labels=None):
+    paths = []
+    for s in start_nodes:
+        if labels is not None and labels[s] != labels[end_node]:
+            paths.append([])
+            continue
+        try:
+            paths.append(dijkstra_path(G, s, end_node))
+        except nx.NetworkXNoPath:
+            paths.append([])
+    return paths
+
+def path_length(path):
+    return sum(haversine_distance(path[i], path[i+1]) for i in range(len(path) - 1))
+
+def find_meeting_points(paths):
+    """
+    Edges shared by several paths. For every group of paths sharing an edge,
+    the meeting point is the first node after the merge.
+    Returns (meeting_points, shared_groups) where shared_groups[i][j] is the
+    set of paths that use edge j of path i.
+    """
+    edge_to_paths = defaultdict(set)
+    for idx, path in enumerate(paths):
+        for j in range(len(path) - 1):
+            edge_to_paths[tuple(sorted((path[j], path[j+1])))].add(idx)
+
+    meeting_points = {}
+    shared_groups = [[] for _ in paths]
+    for i, path in enumerate(paths):
+        for j in range(len(path) - 1):
+            u, v = path[j], path[j+1]
+            group = frozenset(edge_to_paths[tuple(sorted((u, v)))])
+            if len(group) > 1 and group not in meeting_points:
+                meeting_points[group] = v
+            shared_groups[i].append(group)
+    return meeting_points, shared_groups
+
+# --- Service ---
+
+def _finite(x):
+    return x if x is not None and math.isfinite(x) else None
+
+def _as_coord(point) -> Coord:
+    lat, lon = float(point[0]), float(point[1])
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        raise ValueError(f"coordonnées invalides: {point!r}")
+    return lat, lon
+
+class RoutingService:
+    """
+    Keeps the road graph in memory for the lifetime of the process.
+    With gunicorn --preload the graph is built once in the master and shared
+    copy-on-write by the workers.
+    """
+
+    def __init__(self, parquet_file=PARQUET_FILE, bbox=None, G=None, workers=1, graph_dir=None,
+                 path_cache_size=100_000, path_cache_file=None, profiles: Optional[SpeedProfiles] = None,
+                 isochrone_cache_size=256, isochrone_cell_km=CELL_KM):
+        self.G = G if G is not None else build_graph(load_highways(parquet_file, bbox))
+        self._nodes = list(self.G.nodes)
+        coords = np.array(self._nodes, dtype=np.float64).reshape(-1, 2)
+        self._lats, self._lons = coords[:, 0], coords[:, 1]
+        self.workers = workers
+        self.graph_dir = graph_dir
+        self._csr = None
+        self._scorer = None
+        self.profiles = profiles
+        self._edge_profiles = None
+        # (venue node, unit, budget, arrival slot, profiles) -> isochrone
+        self.isochrones = LRUCache(isochrone_cache_size)
+        self.isochrone_cell_km = isochrone_cell_km
+        with stage("components", items=len(self._nodes)):
+            self._labels = self.csr.labels
+            self.labels = dict(zip(self._nodes, self._labels.tolist()))
+        # (start, end) already routed: a lookup instead of a Dijkstra
+        self.path_cache = PathCache(self.csr.version, maxsize=path_cache_size, path=path_cache_file)
+
+    @property
+    def csr(self) -> CSRGraph:
+        """CSR copy of G, node ids follow the order of self._nodes."""
+        if self._csr is None:
+            self._csr = CSRGraph.from_networkx(self.G)
+        return self._csr
+
+    def _parallel_scorer(self) -> ParallelScorer:
+        if self._scorer is None:
+            directory = self.graph_dir or tempfile.mkdtemp(prefix="road_graph_")
+            self.csr.save(os.path.join(directory, self.csr.version))
+            self._scorer = ParallelScorer(os.path.join(directory, self.csr.version), self.workers)
+        return self._scorer
+
+    def score(self, start_nodes, end_nodes) -> List[float]:
+        """Total distance for each end node; spread over a process pool when workers > 1."""
+        with stage("scoring", items=len(start_nodes) * len(end_nodes)):
+            if self.workers > 1 and len(end_nodes) > 1:
+                index = self.csr.node_index()
+                return self._parallel_scorer().score([index[n] for n in start_nodes], [index[n] for n in end_nodes])
+            return [sum(self.pair(s, e)[0] for s in start_nodes) for e in end_nodes]
+
+    def snap_all(self, points) -> List[Coord]:
+        with stage("snapping", items=len(points)):
+            return [self.snap(p) for p in points]
+
+    def paths_to(self, start_nodes, end_node):
+        with stage("path_extraction", items=len(start_nodes)):
+            return [self.pair(s, end_node)[1] for s in start_nodes]
+
+    def pair(self, start_node, end_node) -> Tuple[float, List[Coord]]:
+        """Shortest path start -> end (length km, nodes) through the path cache; (inf, []) if unreachable."""
+        index = self.csr.node_index()
+        s, e = index[start_node], index[end_node]
+        hit = self.path_cache.get(s, e, need_path=True)
+        if hit is not None:
+            dist, ids = hit
+            return dist, [self._nodes[i] for i in ids.tolist()]
+        if self.labels[start_node] != self.labels[end_node]:
+            self.path_cache.put(s, e, float("inf"), [])
+            return float("inf"), []
+        path = dijkstra_path(self.G, start_node, end_node)
+        dist = path_length(path)
+        self.path_cache.put(s, e, dist, [index[n] for n in path])
+        return dist, path
+
+    def close(self):
+        if self._scorer is not None:
+            self._scorer.close()
+        self.path_cache.save()
+
+    def snap(self, point, k=5) -> Coord:
+        """nearest_node_by_road on the node arrays (no sort of the whole node list)."""
+        if not self._nodes:
+            return tuple(point)
+        dists = haversine_many(self._lats, self._lons, point)
+        k = min(k, len(dists))
+        candidates = np.argpartition(dists, k - 1)[:k]
+        limit = dists[candidates].min() + MAIN_COMPONENT_SLACK_KM
+        main = candidates[(self._labels[candidates] == 0) & (dists[candidates] <= limit)]
+        if len(main):
+            candidates = main
+        return self._nodes[int(candidates[np.argmin(dists[candidates])])]
+
+    def route(self, starts: Sequence, end) -> Dict[str, Any]:
+        starts = [_as_coord(p) for p in starts]
+        end = _as_coord(end)
+        start_nodes = self.snap_all(starts)
+        end_node = self.snap(end)
+        paths = self.paths_to(start_nodes, end_node)
+        return self._result(starts, start_nodes, end, end_node, paths)
+
+    def score_bounded(self, start_nodes, end_nodes):
+        """Branch and bound (CSRGraph.best_end): (best index, totals with None for pruned, stats)."""
+        with stage("scoring_bounded", items=len(start_nodes) * len(end_nodes)) as rec:
+            index = self.csr.node_index()
+            best, _, totals, stats = self.csr.best_end([index[n] for n in start_nodes], [index[n] for n in end_nodes])
+            rec.items = stats["searched"] * len(start_nodes)
+        return best, totals, stats
+
+    def best_destination(self, starts: Sequence, candidates: Sequence, bounded: bool = False) -> Dict[str, Any]:
+        """
+        bounded=True: only the winner's total is computed exactly, the other
+        candidates are pruned (total_km None) as soon as they cannot win.
+        """
+        starts = [_as_coord(p) for p in starts]
+        candidates = [_as_coord(p) for p in candidates]
+        if not starts or not candidates:
+            raise ValueError("starts et candidates ne doivent pas être vides")
+        start_nodes = self.snap_all(starts)
+        end_nodes = self.snap_all(candidates)
+        if bounded:
+            best, scores, stats = self.score_bounded(start_nodes, end_nodes)
+        else:
+            scores = self.score(start_nodes, end_nodes)
+            best = min(range(len(candidates)), key=scores.__getitem__)
+        paths = self.paths_to(start_nodes, end_nodes[best])
+        result = self._result(starts, start_nodes, candidates[best], end_nodes[best], paths)
+        result["best_index"] = best
+        result["scores"] = [{"end": list(c), "total_km": _finite(s)} for c, s in zip(candidates, scores)]
+        if bounded:
+            result["pruning"] = stats
+        return result
+
+    def best_venue(self, starts: Sequence, objective: str = "sum", pois: Optional[Sequence] = None) -> Dict[str, Any]:
+        """
+        1-median over the road network: the node that minimises the total (or
+        max) distance from all starts, optionally restricted to the nodes
+        snapped from pois (e.g. the places of data.json).
+        """
+        starts = [_as_coord(p) for p in starts]
+        if not starts:
+            raise ValueError("starts ne doit pas être vide")
+        index = self.csr.node_index()
+        start_nodes = self.snap_all(starts)
+        candidates = None
+        if pois:
+            candidates = sorted({index[n] for n in self.snap_all([_as_coord(p) for p in pois])})
+        with stage("one_median", items=len(start_nodes)):
+            best, value, _ = self.csr.one_median([index[n] for n in start_nodes], objective, candidates)
+        end_node = self.csr.node(best)
+        paths = self.paths_to(start_nodes, end_node)
+        result = self._result(starts, start_nodes, end_node, end_node, paths)
+        result["objective"] = objective
+        result["value_km"] = _finite(value)
+        return result
+
+    def plan_pickups(self, driver, pickups: Sequence, end) -> Dict[str, Any]:
+        """
+        Order in which one driver collects the riders at pickups before going
+        to end: one many-to-many distance matrix, then pickup.solve_order.
+        """
+        driver, end = _as_coord(driver), _as_coord(end)
+        pickups = [_as_coord(p) for p in pickups]
+        if not pickups:
+            raise ValueError("pickups ne doit pas être vide")
+        nodes = self.snap_all([driver] + pickups + [end])
+        unreachable = [i for i, n in enumerate(nodes) if self.labels[n] != self.labels[nodes[0]]]
+        if unreachable:
+            raise ValueError(f"points non reliés au départ du conducteur: {unreachable}")
+        index = self.csr.node_index()
+        with stage("distance_matrix", items=len(nodes)):
+            D = self.csr.distance_matrix([index[n] for n in nodes])
+        with stage("pickup_order", items=len(pickups)):
+            order, total, method = solve_order(D)
+        stops = [driver] + [pickups[i - 1] for i in order] + [end]
+        stop_nodes = [nodes[0]] + [nodes[i] for i in order] + [nodes[-1]]
+        legs = []
+        for a in range(len(stop_nodes) - 1):
+            dist, path = self.pair(stop_nodes[a], stop_nodes[a + 1])
+            legs.append({"from": list(stops[a]), "to": list(stops[a + 1]), "distance_km": _finite(dist),
+                         "path": [list(p) for p in path]})
+        direct = float(D[0, -1])
+        return {
+            "order": [i - 1 for i in order],
+            "stops": [list(p) for p in stops],
+            "legs": legs,
+            "total_km": _finite(total),
+            "direct_km": _finite(direct),
+            "detour_km": _finite(total - direct),
+            "method": method,
+        }
+
+    def road_distances(self, points: Sequence) -> np.ndarray:
+        """Road distance matrix (km) between points, inf between different components."""
+        nodes = self.snap_all([_as_coord(p) for p in points])
+        index = self.csr.node_index()
+        with stage("distance_matrix", items=len(nodes)):
+            return self.csr.distance_matrix([index[n] for n in nodes])
+
+    @property
+    def edge_profiles(self) -> np.ndarray:
+        """Speed profile of every CSR entry."""
+        if self._edge_profiles is None:
+            self._edge_profiles = edge_profile_ids(self.csr, self.profiles)
+        return self._edge_profiles
+
+    def eta(self, starts: Sequence, end, departure_time: datetime) -> Dict[str, Any]:
+        """
+        Time-dependent route of each start to end leaving at departure_time,
+        with the speed profiles. Not cached: the path cache key is the
+        unordered pair, a time-dependent route depends on direction and hour.
+        """
+        if self.profiles is None:
+            raise FileNotFoundError("profils de vitesse non chargés")
+        starts = [_as_coord(p) for p in starts]
+        end = _as_coord(end)
+        start_nodes = self.snap_all(starts)
+        end_node = self.snap(end)
+        index = self.csr.node_index()
+        depart = departure_time.hour * 60 + departure_time.minute + departure_time.second / 60
+        routes = []
+        with stage("td_routing", items=len(start_nodes)):
+            for s, n in zip(starts, start_nodes):
+                arrival, ids = td_route(self.csr, self.profiles, index[n], index[end_node], depart,
+                                        edge_profiles=self.edge_profiles)
+                path = [self._nodes[i] for i in ids]
+                minutes = arrival - depart if path else None
+                routes.append({
+                    "start": list(s),
+                    "start_node": list(n),
+                    "path": [list(p) for p in path],
+                    "distance_km": path_length(path) if path else None,
+                    "duration_min": round(minutes, 2) if path else None,
+                    "arrival_time": (departure_time + timedelta(minutes=minutes)).isoformat(timespec="seconds")
+                                    if path else None,
+                })
+        return {
+            "end": list(end),
+            "end_node": list(end_node),
+            "departure_time": departure_time.isoformat(timespec="seconds"),
+            "profiles_version": self.profiles.version,
+            "routes": routes,
+        }
+
+    def isochrone(self, venue, budget: float, unit: str = "min", arrive_by: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Area from which venue can be reached within budget: km of road
+        (unit="km"), or minutes with the speed profiles when arriving at
+        arrive_by (unit="min"). GeoJSON Feature, cached per venue node and,
+        in minutes, per ISOCHRONE_SLOT_MIN slot of arrive_by: a cached entry
+        was searched at the arrive_by of the request that filled it, which
+        is returned as "arrive_by".
+        """
+        if unit not in ("min", "km"):
+            raise ValueError("unit doit être 'min' ou 'km'")
+        budget = float(budget)
+        if not budget > 0:
+            raise ValueError("budget doit être > 0")
+        venue = _as_coord(venue)
+        node = self.snap(venue)
+        v = self.csr.node_index()[node]
+        if unit == "min":
+            if self.profiles is None:
+                raise FileNotFoundError("profils de vitesse non chargés")
+            if arrive_by is None:
+                raise ValueError("arrive_by manquant pour un budget en minutes")
+            arrive_min = arrive_by.hour * 60 + arrive_by.minute + arrive_by.second / 60
+            key = (v, unit, budget, int(arrive_min // ISOCHRONE_SLOT_MIN), self.profiles.version)
+        else:
+            key = (v, unit, budget)
+        feature = self.isochrones.get(key)
+        cached = feature is not None
+        if not cached:
+            with stage("isochrone") as rec:
+                if unit == "min":
+                    latest = td_reverse(self.csr, self.profiles, v, arrive_min, cutoff=budget,
+                                        edge_profiles=self.edge_profiles)
+                    reached = {n: arrive_min - t for n, t in latest.items()}
+                else:
+                    reached = self.csr.dijkstra(v, cutoff=budget)
+                rec.items = len(reached)
+                feature = self._isochrone_feature(node, unit, budget, arrive_by if unit == "min" else None, reached)
+            self.isochrones.put(key, feature)
+        res = {"venue": list(venue), "cached": cached, "isochrone": feature}
+        if unit == "min":
+            res["arrive_by"] = feature["properties"]["arrive_by"]
+        return res
+
+    def _isochrone_feature(self, node, unit, budget, arrive_by, reached: Dict[int, float]) -> Dict[str, Any]:
+        csr = self.csr
+        ids = np.fromiter(reached.keys(), dtype=np.int64, count=len(reached))
+        inside = np.zeros(csr.n_nodes, dtype=bool)
+        inside[ids] = True
+        # CSR entries of the reached nodes whose other end is reached too, each road once
+        counts = np.diff(csr.indptr)[ids]
+        src = np.repeat(ids, counts)
+        pos = np.repeat(csr.indptr[ids] - np.cumsum(counts) + counts, counts) + np.arange(int(counts.sum()))
+        dst = np.asarray(csr.indices)[pos].astype(np.int64)
+        keep = inside[dst] & (src < dst)
+        lats, lons = csr.coords[:, 0], csr.coords[:, 1]
+        s_lats, s_lons = edge_samples(lats, lons, src[keep], dst[keep], np.asarray(csr.weights)[pos][keep],
+                                      self.isochrone_cell_km / 2)
+        geometry = outline(np.concatenate([lats[ids], s_lats]), np.concatenate([lons[ids], s_lons]),
+                           self.isochrone_cell_km)
+        properties = {
+            "venue_node": list(node),
+            "unit": unit,
+            "budget": budget,
+            "nodes": len(ids),
+            "max_reached": round(max(reached.values()), 3),
+            "cell_km": self.isochrone_cell_km,
+        }
+        if arrive_by is not None:
+            properties["arrive_by"] = arrive_by.strftime("%H:%M:%S")
+        return {"type": "Feature", "geometry": geometry, "properties": properties}
+
+    def _result(self, starts, start_nodes, end, end_node, paths) -> Dict[str, Any]:
+        with stage("meeting_points", items=len(paths)):
+            meeting_points, _ = find_meeting_points(paths)
+        return {
+            "end": list(end),
+            "end_node": list(end_node),
+            "routes": [{
+                "start": list(s),
+                "start_node": list(n),
+                "path": [list(p) for p in path],
+                "distance_km": path_length(path) if path else None,
+            } for s, n, path in zip(starts, start_nodes, paths)],
+            "meeting_points": [{
+                "starts": sorted(group),
+                "point": list(node),
+            } for group, node in meeting_points.items()],
+        }
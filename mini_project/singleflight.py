@@ -0,0 +1,234 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+Request coalescing ("single-flight") for identical upstream calls.
+
+Within a process the first caller of a key (the leader) runs the call and the
+concurrent callers of the same key wait for its result. Across processes
+(gunicorn workers) a lock file per key in SINGLEFLIGHT_DIR plays the role of a
+shared lock table: the worker holding the flock is the leader, the others
+block on the lock and then read the result it left next to it.
+'''
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Optional, Awaitable
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalescing stays per process
+    fcntl = None
+
+SINGLEFLIGHT_DIR = os.environ.get("SINGLEFLIGHT_DIR")
+# Results left by a leader are reused by followers for this long
+RESULT_TTL_S = 5.0
+PRUNE_EVERY = 1000
+
+_MISSING = object()
+
+# --- Cross-process part ---
+
+class SharedFlight:
+    """Lock file + result file per key in directory."""
+
+    def __init__(self, directory: str, ttl: float = RESULT_TTL_S):
+        self.directory = directory
+        self.ttl = ttl
+        self._calls = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, key: str):
+        h = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{h}.lock"), os.path.join(self.directory, f"{h}.json")
+
+    def lock(self, key: str, blocking: bool):
+        """Open file descriptor holding the key lock, or None if not blocking and already held."""
+        lock_path, _ = self._paths(key)
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd
+
+    @staticmethod
+    def unlock(fd: int):
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    def get_result(self, key: str) -> Any:
+        _, result_path = self._paths(key)
+        try:
+            if time.time() - os.path.getmtime(result_path) > self.ttl:
+                return _MISSING
+            with open(result_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return _MISSING
+
+    def put_result(self, key: str, value: Any):
+        _, result_path = self._paths(key)
+        tmp = f"{result_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+            os.replace(tmp, result_path)
+        except (OSError, TypeError, ValueError):
+            return
+        self._calls += 1
+        if self._calls % PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        """Removes expired result files (lock files are kept: removing one could split a lock)."""
+        now = time.time()
+        for fname in os.listdir(self.directory):
+            if fname.endswith(".json"):
+                path = os.path.join(self.directory, fname)
+                try:
+                    if now - os.path.getmtime(path) > self.ttl:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+def _shared(directory: Optional[str]) -> Optional[SharedFlight]:
+    if not directory or fcntl is None:
+        return None
+    return SharedFlight(directory)
+
+# --- Threads ---
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    def __init__(self, directory: Optional[str] = SINGLEFLIGHT_DIR, on_role: Callable[[str], None] = None):
+        self.shared = _shared(directory)
+        self.on_role = on_role or (lambda role: None)
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            self.on_role("follower")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = self._run_shared(key, fn)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+    def _run_shared(self, key: str, fn: Callable[[], Any]) -> Any:
+        if self.shared is None:
+            self.on_role("leader")
+            return fn()
+        fd = self.shared.lock(key, blocking=False)
+        if fd is None:
+            # another worker is leading: wait for it, then use what it left
+            fd = self.shared.lock(key, blocking=True)
+            try:
+                value = self.shared.get_result(key)
+                if value is not _MISSING:
+                    self.on_role("follower_shared")
+                    return value
+                self.on_role("leader")
+                value = fn()
+                self.shared.put_result(key, value)
+                return value
+            finally:
+                self.shared.unlock(fd)
+        try:
+            self.on_role("leader")
+            value = fn()
+            self.shared.put_result(key, value)
+            return value
+        finally:
+            self.shared.unlock(fd)
+
+# --- asyncio ---
+
+class AsyncSingleFlight:
+    """Same as SingleFlight for coroutines; the flock waits run in a thread."""
+
+    def __init__(self, directory: Optional[str] = SINGLEFLIGHT_DIR, on_role: Callable[[str], None] = None):
+        self.shared = _shared(directory)
+        self.on_role = on_role or (lambda role: None)
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        fut = self._calls.get(key)
+        if fut is not None:
+            self.on_role("follower")
+            return await asyncio.shield(fut)
+        fut = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await self._run_shared(key, fn)
+        except BaseException as e:
+            fut.set_exception(e)
+            # mark retrieved so an unawaited failure is not logged
+            fut.exception()
+            raise
+        else:
+            fut.set_result(value)
+            return value
+        finally:
+            del self._calls[key]
+
+    async def _run_shared(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if self.shared is None:
+            self.on_role("leader")
+            return await fn()
+        fd = self.shared.lock(key, blocking=False)
+        if fd is None:
+            fd = await self._wait_lock(key)
+            value = self.shared.get_result(key)
+            if value is not _MISSING:
+                self.shared.unlock(fd)
+                self.on_role("follower_shared")
+                return value
+        try:
+            self.on_role("leader")
+            value = await fn()
+            self.shared.put_result(key, value)
+            return value
+        finally:
+            self.shared.unlock(fd)
+
+    async def _wait_lock(self, key: str) -> int:
+        waiter = asyncio.ensure_future(asyncio.to_thread(self.shared.lock, key, True))
+        try:
+            return await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            # the thread still gets the lock: give it back as soon as it does
+            waiter.add_done_callback(lambda t: t.cancelled() or t.exception() or self.shared.unlock(t.result()))
+            raise
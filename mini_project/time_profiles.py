@@ -0,0 +1,268 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+Time-dependent travel times on the CSR road graph.
+
+Speeds come from a CSV of per-road-class profiles over the hour of day:
+
+    road_class,hour,speed_kmh
+    motorway,0,120
+    motorway,8,70
+    ...
+    default,0,40
+
+Each class is a piecewise-linear function of the time of day through its
+knots, periodic over 24 h; classes missing from the file use "default".
+Edges only carry their class id (CSRGraph.road_class), so the memory cost is
+one small array per class, not one profile per edge. The time to cross an
+edge is the exact integral of the speed over time, which keeps the FIFO
+property (leaving later never arrives earlier) and makes the label-setting
+TD-Dijkstra / TD-A* below correct.
+'''
+
+import csv
+import math
+import heapq
+import hashlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from road_graph import CSRGraph, haversine_matrix
+
+DAY_MIN = 1440.0
+DEFAULT_CLASS = "default"
+PROFILES_FILE = "speed_profiles.csv"
+
+class SpeedProfiles:
+    """
+    names[c]: road class of profile c. Knots of class c are
+    times[offsets[c]:offsets[c+1]] (minutes of day, increasing, the first knot
+    repeated one day later at the end) with speeds (km/h) in speeds[...].
+    """
+
+    def __init__(self, names: Sequence[str], offsets: np.ndarray, times: np.ndarray, speeds: np.ndarray):
+        self.names = list(names)
+        self.offsets = offsets
+        self.times = times
+        self.speeds = speeds
+        self.max_speed = float(speeds.max())
+        self._index = {n: i for i, n in enumerate(self.names)}
+        h = hashlib.sha1()
+        for arr in (offsets, times, speeds):
+            h.update(np.ascontiguousarray(arr).data)
+        h.update("\0".join(self.names).encode("utf-8"))
+        self.version = h.hexdigest()[:16]
+        # per class: knot lists for the pure-Python edge loop
+        self._knots = [(times[offsets[c]:offsets[c + 1]].tolist(), speeds[offsets[c]:offsets[c + 1]].tolist())
+                       for c in range(len(self.names))]
+
+    @classmethod
+    def from_csv(cls, path: str) -> "SpeedProfiles":
+        knots: Dict[str, Dict[float, float]] = defaultdict(dict)
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for lineno, row in enumerate(csv.DictReader(f), 2):
+                try:
+                    name = row["road_class"].strip()
+                    hour, speed = float(row["hour"]), float(row["speed_kmh"])
+                except (KeyError, TypeError, ValueError, AttributeError):
+                    raise ValueError(f"{path}:{lineno}: road_class,hour,speed_kmh attendus")
+                if not 0.0 <= hour < 24.0 or speed <= 0:
+                    raise ValueError(f"{path}:{lineno}: hour dans [0, 24) et speed_kmh > 0 attendus")
+                knots[name][hour * 60.0] = speed
+        if DEFAULT_CLASS not in knots:
+            raise ValueError(f"{path}: profil '{DEFAULT_CLASS}' manquant")
+        names, offsets, times, speeds = [], [0], [], []
+        for name, points in knots.items():
+            ts = sorted(points)
+            names.append(name)
+            times.extend(ts + [ts[0] + DAY_MIN])
+            speeds.extend([points[t] for t in ts] + [points[ts[0]]])
+            offsets.append(len(times))
+        return cls(names, np.array(offsets, dtype=np.int64), np.array(times, dtype=np.float64),
+                   np.array(speeds, dtype=np.float64))
+
+    def class_map(self, class_names: Sequence[str]) -> List[int]:
+        """Profile of each graph road class (CSRGraph.class_names), default for unknown ones."""
+        default = self._index[DEFAULT_CLASS]
+        return [self._index.get(n, default) for n in class_names]
+
+    def speed(self, c: int, t: float) -> float:
+        ts, vs = self._knots[c]
+        tod = (t - ts[0]) % DAY_MIN + ts[0]
+        k = _segment(ts, tod)
+        return vs[k] + (vs[k + 1] - vs[k]) * (tod - ts[k]) / (ts[k + 1] - ts[k])
+
+    def travel_time(self, c: int, t: float, km: float) -> float:
+        """Minutes to drive km on class c when entering at minute t (any day: taken modulo 24 h)."""
+        ts, vs = self._knots[c]
+        tod = (t - ts[0]) % DAY_MIN + ts[0]
+        k = _segment(ts, tod)
+        left, elapsed = km * 60.0, 0.0  # km*min/h: distance at v km/h over dt min is v*dt/60 km
+        while True:
+            t0, t1 = ts[k], ts[k + 1]
+            slope = (vs[k + 1] - vs[k]) / (t1 - t0)
+            v = vs[k] + slope * (tod - t0)
+            dt = t1 - tod
+            # distance until the next knot, speed linear in time
+            reach = v * dt + 0.5 * slope * dt * dt
+            if reach >= left:
+                if abs(slope) < 1e-12:
+                    return elapsed + left / v
+                return elapsed + (math.sqrt(v * v + 2.0 * slope * left) - v) / slope
+            left -= reach
+            elapsed += dt
+            k += 1
+            if k == len(ts) - 1:
+                k, tod = 0, ts[0]
+            else:
+                tod = ts[k]
+
+    def travel_time_before(self, c: int, t: float, km: float) -> float:
+        """Minutes to drive km on class c when leaving the edge at minute t (the reverse of travel_time)."""
+        ts, vs = self._knots[c]
+        tod = (t - ts[0]) % DAY_MIN + ts[0]
+        if tod == ts[0]:
+            tod = ts[-1]
+        k = _segment(ts, tod)
+        if ts[k] == tod:
+            k -= 1
+        left, elapsed = km * 60.0, 0.0
+        while True:
+            t0, t1 = ts[k], ts[k + 1]
+            slope = (vs[k + 1] - vs[k]) / (t1 - t0)
+            v = vs[k] + slope * (tod - t0)
+            dt = tod - t0
+            # distance back to the previous knot, the speed going back in time is v - slope*x
+            reach = v * dt - 0.5 * slope * dt * dt
+            if reach >= left:
+                if abs(slope) < 1e-12:
+                    return elapsed + left / v
+                return elapsed + (v - math.sqrt(max(v * v - 2.0 * slope * left, 0.0))) / slope
+            left -= reach
+            elapsed += dt
+            k -= 1
+            if k < 0:
+                k, tod = len(ts) - 2, ts[-1]
+            else:
+                tod = ts[k + 1]
+
+def _segment(ts: List[float], tod: float) -> int:
+    """k such that ts[k] <= tod < ts[k+1] (ts[0] <= tod < ts[-1])."""
+    lo, hi = 0, len(ts) - 2
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if ts[mid] <= tod:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+# --- Searches ---
+
+def edge_profile_ids(csr: CSRGraph, profiles: SpeedProfiles) -> np.ndarray:
+    """Profile id of every CSR entry (default profile when the graph has no classes)."""
+    if csr.road_class is None or not csr.class_names:
+        return np.full(len(csr.indices), profiles.class_map([DEFAULT_CLASS])[0], dtype=np.int64)
+    mapping = np.asarray(profiles.class_map(csr.class_names), dtype=np.int64)
+    return mapping[np.asarray(csr.road_class, dtype=np.int64)]
+
+def td_dijkstra(csr: CSRGraph, profiles: SpeedProfiles, source: int, depart: float,
+                targets: Optional[Sequence[int]] = None, target: Optional[int] = None,
+                edge_profiles: Optional[np.ndarray] = None,
+                cutoff: float = math.inf) -> Tuple[Dict[int, float], Dict[int, int]]:
+    """
+    Earliest arrival (minutes, same clock as depart) at every settled node and
+    the parent of each. With target, A* towards it with the straight-line time
+    at the fastest profile speed as heuristic (admissible: edge lengths are
+    straight-line km). Stops once target / every target is settled and, in a
+    search without target, once the next node is more than cutoff minutes away.
+    """
+    indptr, indices, weights = csr.indptr, csr.indices, csr.weights
+    edge_profiles = edge_profile_ids(csr, profiles) if edge_profiles is None else edge_profiles
+    travel_time = profiles.travel_time
+    remaining = None
+    if targets is not None:
+        labels = csr.labels
+        remaining = {t for t in targets if labels[t] == labels[source]}
+    if target is not None:
+        if not csr.connected(source, target):
+            return {}, {}
+        remaining = {target}
+        coords = np.asarray(csr.coords)
+        h_all = haversine_matrix(coords, coords[target:target + 1])[:, 0] * 60.0 / profiles.max_speed
+        heuristic = h_all.tolist()
+    else:
+        heuristic = None
+    arrival = {source: depart}
+    parent: Dict[int, int] = {}
+    done: Dict[int, float] = {}
+    heap = [(depart + (heuristic[source] if heuristic else 0.0), depart, source)]
+    while heap:
+        _, t, u = heapq.heappop(heap)
+        if u in done:
+            continue
+        if heuristic is None and t - depart > cutoff:
+            break
+        done[u] = t
+        if remaining is not None:
+            remaining.discard(u)
+            if not remaining:
+                break
+        lo, hi = int(indptr[u]), int(indptr[u + 1])
+        for v, w, c in zip(indices[lo:hi].tolist(), weights[lo:hi].tolist(), edge_profiles[lo:hi].tolist()):
+            if v in done:
+                continue
+            nt = t + travel_time(c, t, w)
+            if nt < arrival.get(v, math.inf):
+                arrival[v] = nt
+                parent[v] = u
+                heapq.heappush(heap, (nt + (heuristic[v] if heuristic else 0.0), nt, v))
+    return done, parent
+
+def td_route(csr: CSRGraph, profiles: SpeedProfiles, source: int, target: int, depart: float,
+             edge_profiles: Optional[np.ndarray] = None) -> Tuple[float, List[int]]:
+    """(arrival minute, node ids source -> target) leaving at depart; (inf, []) if unreachable."""
+    done, parent = td_dijkstra(csr, profiles, source, depart, target=target, edge_profiles=edge_profiles)
+    if target not in done:
+        return math.inf, []
+    path = [target]
+    while path[-1] != source:
+        path.append(parent[path[-1]])
+    return done[target], path[::-1]
+
+def td_reverse(csr: CSRGraph, profiles: SpeedProfiles, target: int, arrive: float, cutoff: float = math.inf,
+               edge_profiles: Optional[np.ndarray] = None) -> Dict[int, float]:
+    """
+    Latest departure from every node that still reaches target by arrive,
+    for the nodes that need at most cutoff minutes. The graph is undirected,
+    so the edges into a node are its CSR entries.
+    """
+    indptr, indices, weights = csr.indptr, csr.indices, csr.weights
+    edge_profiles = edge_profile_ids(csr, profiles) if edge_profiles is None else edge_profiles
+    travel_time_before = profiles.travel_time_before
+    departure = {target: arrive}
+    done: Dict[int, float] = {}
+    heap = [(-arrive, target)]
+    while heap:
+        neg, u = heapq.heappop(heap)
+        if u in done:
+            continue
+        t = -neg
+        if arrive - t > cutoff:
+            break
+        done[u] = t
+        lo, hi = int(indptr[u]), int(indptr[u + 1])
+        for v, w, c in zip(indices[lo:hi].tolist(), weights[lo:hi].tolist(), edge_profiles[lo:hi].tolist()):
+            if v in done:
+                continue
+            nt = t - travel_time_before(c, t, w)
+            if nt > departure.get(v, -math.inf):
+                departure[v] = nt
+                heapq.heappush(heap, (-nt, v))
+    return done
@@ -0,0 +1,498 @@
+#!/usr/bin/python3
+'''
+Created on 19-10-2026
+
+@author: TM
+@version: 1
+
+Public transport layer: a local GTFS feed as compact arrays and
+earliest-arrival queries with RAPTOR (round-based public transit routing).
+
+Trips that serve the same stop sequence are grouped into patterns, split
+further so that no trip overtakes another: within a pattern the times at
+each stop are then sorted by trip, and the earliest trip that can be boarded
+is a binary search. Everything is stored in flat numpy arrays (saved as .npy
+like CSRGraph), strings only in meta.json.
+
+Round k of RAPTOR scans the patterns serving the stops improved in round
+k-1 and gives the earliest arrival at every stop with at most k trips;
+walking between nearby stops, and from the origin / to the destination, goes
+through the road graph. Access can also be by car (park and ride), with the
+speed profiles when the routing service has them. The journeys returned are
+the best arrival for each number of transfers (Pareto set). Only the trips
+of the departure day are used (not those of the day before that run past
+midnight).
+
+    python3 transit.py gtfs/ timetable/    # GTFS text files -> arrays
+'''
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from routing import RoutingService, _as_coord
+from time_profiles import td_dijkstra
+from instrumentation import stage
+
+GTFS_DIR = "gtfs"
+ARRAYS = ("stop_coords", "pattern_stops", "stop_ptr", "trip_ptr", "time_ptr", "arrivals", "departures",
+          "serve_ptr", "serve_pattern", "serve_pos", "trip_service", "trip_route",
+          "cal_days", "cal_start", "cal_end", "exc_service", "exc_date", "exc_type")
+
+WALK_KMH = 4.5
+# footpaths between stops and walking to / from the first and last stop
+MAX_WALK_KM = 1.0
+# park and ride: stops within this drive from the origin
+MAX_DRIVE_MIN = 30
+# car speed when the routing service has no speed profiles
+CAR_KMH = 50
+# time to change vehicle at the same stop
+CHANGE_S = 60
+MAX_ROUNDS = 5
+
+def _seconds(values: pd.Series) -> np.ndarray:
+    """"HH:MM:SS" (hours may exceed 24) -> seconds after midnight of the service day, -1 when empty."""
+    # a feed repeats the same few thousand times: parse each distinct one once
+    codes, uniques = pd.factorize(values)
+    table = np.full(len(uniques), -1, dtype=np.int64)
+    for k, v in enumerate(uniques.tolist()):
+        if v.strip():
+            h, m, sec = v.strip().split(":")
+            table[k] = int(h) * 3600 + int(m) * 60 + int(sec)
+    return table[codes]
+
+def _read(directory: str, name: str, required: bool = True) -> Optional[pd.DataFrame]:
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        if required:
+            raise FileNotFoundError(f"GTFS incomplet: {path} introuvable")
+        return None
+    return pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+
+class Timetable:
+    """
+    Stop s is at stop_coords[s] (lat, lon). Pattern r serves the stops
+    pattern_stops[stop_ptr[r]:stop_ptr[r+1]] (n of them) with the trips
+    trip_ptr[r] .. trip_ptr[r+1]-1 (m of them, sorted by departure); their
+    times are arrivals/departures[time_ptr[r]:time_ptr[r+1]].reshape(m, n).
+    Stop s is served by the patterns serve_pattern[serve_ptr[s]:serve_ptr[s+1]]
+    at the positions serve_pos[...]. Trip t runs on the days of
+    trip_service[t] (calendar rows cal_*, calendar_dates rows exc_*).
+    """
+
+    def __init__(self, meta: Dict[str, Any], **arrays):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.stop_ids: List[str] = meta["stop_ids"]
+        self.stop_names: List[str] = meta["stop_names"]
+        self.trip_ids: List[str] = meta["trip_ids"]
+        self.route_names: List[str] = meta["route_names"]
+        self.services: List[str] = meta["services"]
+
+    @property
+    def n_stops(self):
+        return len(self.stop_coords)
+
+    @property
+    def n_patterns(self):
+        return len(self.stop_ptr) - 1
+
+    # --- Loading ---
+
+    @classmethod
+    def from_gtfs(cls, directory: str = GTFS_DIR) -> "Timetable":
+        stops = _read(directory, "stops.txt")
+        if "location_type" in stops:
+            # stations / entrances: only boarding points are kept
+            stops = stops[stops["location_type"].isin(["", "0"])]
+        trips = _read(directory, "trips.txt")
+        routes = _read(directory, "routes.txt", required=False)
+        stop_times = _read(directory, "stop_times.txt")
+        stop_index = {sid: i for i, sid in enumerate(stops["stop_id"])}
+        stop_coords = np.column_stack([stops["stop_lat"].astype(np.float64), stops["stop_lon"].astype(np.float64)])
+
+        services = sorted(set(trips["service_id"]))
+        service_index = {s: i for i, s in enumerate(services)}
+        names = {}
+        if routes is not None:
+            for rid, short, long in zip(routes["route_id"], routes.get("route_short_name", routes["route_id"]),
+                                        routes.get("route_long_name", routes["route_id"])):
+                names[rid] = short or long or rid
+        route_names = sorted(set(names.get(r, r) for r in trips["route_id"]))
+        route_index = {n: i for i, n in enumerate(route_names)}
+        trip_info = {t: (service_index[s], route_index[names.get(r, r)])
+                     for t, s, r in zip(trips["trip_id"], trips["service_id"], trips["route_id"])}
+
+        with stage("gtfs_stop_times", items=len(stop_times)):
+            st = stop_times[stop_times["stop_id"].isin(stop_index) & stop_times["trip_id"].isin(trip_info)]
+            arr, dep = _seconds(st["arrival_time"]), _seconds(st["departure_time"])
+            # untimed stops (no arrival or departure) take the other time
+            arr = np.where(arr < 0, dep, arr)
+            dep = np.where(dep < 0, arr, dep)
+            trip_codes, trip_names = pd.factorize(st["trip_id"])
+            order = np.lexsort((st["stop_sequence"].astype(np.int64).to_numpy(), trip_codes))
+            trip_codes, arr, dep = trip_codes[order], arr[order], dep[order]
+            stop_col = st["stop_id"].map(stop_index).to_numpy(np.int64)[order]
+            bounds = np.flatnonzero(np.diff(trip_codes)) + 1
+        groups: Dict[bytes, List[int]] = {}
+        rows = []
+        for lo, hi in zip(np.concatenate([[0], bounds]).tolist(), np.concatenate([bounds, [len(trip_codes)]]).tolist()):
+            if hi - lo < 2 or (arr[lo:hi] < 0).any():
+                continue  # a single stop, or untimed stops (not interpolated)
+            rows.append((trip_names[trip_codes[lo]], stop_col[lo:hi], arr[lo:hi], dep[lo:hi]))
+            groups.setdefault(stop_col[lo:hi].tobytes(), []).append(len(rows) - 1)
+        return cls._build(stop_coords, list(stops["stop_id"]), list(stops.get("stop_name", stops["stop_id"])),
+                          rows, groups, trip_info, route_names, services, directory)
+
+    @classmethod
+    def _build(cls, stop_coords, stop_ids, stop_names, rows, groups, trip_info, route_names, services, directory):
+        with stage("gtfs_patterns", items=len(rows)):
+            patterns: List[List[int]] = []
+            for members in groups.values():
+                members.sort(key=lambda k: (rows[k][3][0], rows[k][2][-1]))
+                # a trip joins the first pattern whose last trip it never overtakes
+                split: List[List[int]] = []
+                for k in members:
+                    for p in split:
+                        last = rows[p[-1]]
+                        if (rows[k][3] >= last[3]).all() and (rows[k][2] >= last[2]).all():
+                            p.append(k)
+                            break
+                    else:
+                        split.append([k])
+                patterns.extend(split)
+        pattern_stops, stop_ptr, trip_ptr, time_ptr, arrivals, departures = [], [0], [0], [0], [], []
+        trip_ids, trip_service, trip_route = [], [], []
+        serves: List[List[Tuple[int, int]]] = [[] for _ in range(len(stop_ids))]
+        for r, members in enumerate(patterns):
+            seq = rows[members[0]][1]
+            for i, s in enumerate(seq.tolist()):
+                serves[s].append((r, i))
+            pattern_stops.append(seq)
+            stop_ptr.append(stop_ptr[-1] + len(seq))
+            trip_ptr.append(trip_ptr[-1] + len(members))
+            time_ptr.append(time_ptr[-1] + len(members) * len(seq))
+            for k in members:
+                trip_id, _, a, d = rows[k]
+                arrivals.append(a)
+                departures.append(d)
+                trip_ids.append(str(trip_id))
+                trip_service.append(trip_info[trip_id][0])
+                trip_route.append(trip_info[trip_id][1])
+        serve_ptr = np.zeros(len(stop_ids) + 1, dtype=np.int64)
+        serve_ptr[1:] = np.cumsum([len(x) for x in serves])
+        flat = [x for s in serves for x in s]
+        calendar = cls._calendar(directory, {s: i for i, s in enumerate(services)})
+        arrays = dict(
+            stop_coords=np.asarray(stop_coords, dtype=np.float64).reshape(-1, 2),
+            pattern_stops=np.concatenate(pattern_stops).astype(np.int32) if pattern_stops else np.empty(0, np.int32),
+            stop_ptr=np.array(stop_ptr, dtype=np.int64), trip_ptr=np.array(trip_ptr, dtype=np.int64),
+            time_ptr=np.array(time_ptr, dtype=np.int64),
+            arrivals=np.concatenate(arrivals).astype(np.int32) if arrivals else np.empty(0, np.int32),
+            departures=np.concatenate(departures).astype(np.int32) if departures else np.empty(0, np.int32),
+            serve_ptr=serve_ptr, serve_pattern=np.array([r for r, _ in flat], dtype=np.int32),
+            serve_pos=np.array([i for _, i in flat], dtype=np.int32),
+            trip_service=np.array(trip_service, dtype=np.int32), trip_route=np.array(trip_route, dtype=np.int32),
+            **calendar)
+        meta = {"stop_ids": [str(s) for s in stop_ids], "stop_names": [str(s) for s in stop_names],
+                "trip_ids": trip_ids, "route_names": [str(n) for n in route_names], "services": services}
+        return cls(meta, **arrays)
+
+    @staticmethod
+    def _calendar(directory, service_index) -> Dict[str, np.ndarray]:
+        """Weekly calendar per service (a service without calendar.txt row runs never, unless no calendar at all)."""
+        n = len(service_index)
+        days = np.zeros((n, 7), dtype=np.int8)
+        start = np.zeros(n, dtype=np.int32)
+        end = np.zeros(n, dtype=np.int32)
+        calendar = _read(directory, "calendar.txt", required=False)
+        dates = _read(directory, "calendar_dates.txt", required=False)
+        if calendar is None and dates is None:
+            days[:], start[:], end[:] = 1, 0, 99991231
+        if calendar is not None:
+            week = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+            for _, row in calendar[calendar["service_id"].isin(service_index)].iterrows():
+                s = service_index[row["service_id"]]
+                days[s] = [int(row[d]) for d in week]
+                start[s], end[s] = int(row["start_date"]), int(row["end_date"])
+        exc = dates[dates["service_id"].isin(service_index)] if dates is not None else None
+        return dict(
+            cal_days=days, cal_start=start, cal_end=end,
+            exc_service=np.array([service_index[s] for s in exc["service_id"]] if exc is not None else [], dtype=np.int32),
+            exc_date=np.array(exc["date"].astype(int) if exc is not None else [], dtype=np.int32),
+            exc_type=np.array(exc["exception_type"].astype(int) if exc is not None else [], dtype=np.int8))
+
+    # --- Persistence ---
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"stop_ids": self.stop_ids, "stop_names": self.stop_names, "trip_ids": self.trip_ids,
+                       "route_names": self.route_names, "services": self.services}, f)
+        return directory
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode) for name in ARRAYS}
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(meta, **arrays)
+
+    # --- Queries ---
+
+    def active_trips(self, day: date) -> np.ndarray:
+        """Trips running on day (bool per trip)."""
+        d = int(day.strftime("%Y%m%d"))
+        services = (self.cal_days[:, day.weekday()] == 1) & (self.cal_start <= d) & (d <= self.cal_end)
+        today = self.exc_date == d
+        services[self.exc_service[today & (self.exc_type == 1)]] = True
+        services[self.exc_service[today & (self.exc_type == 2)]] = False
+        return services[self.trip_service]
+
+    def raptor(self, sources: Dict[int, float], targets: Dict[int, float], active: np.ndarray,
+               footpaths: Dict[int, List[Tuple[int, float]]], max_rounds: int = MAX_ROUNDS,
+               change_s: float = CHANGE_S) -> Tuple[List[Tuple[int, int, float]], List[Dict[int, tuple]]]:
+        """
+        sources / targets: stop -> time of arrival at the stop / time from the
+        stop to the destination (seconds). Returns the (round, last stop,
+        arrival at destination) improving on every round before, and the
+        labels of each round for journey reconstruction.
+        """
+        best = [math.inf] * self.n_stops
+        prev = list(best)
+        # prev[p] reached by a ride: a change time applies before boarding there
+        by_ride = [False] * self.n_stops
+        for s, t in sources.items():
+            prev[s] = best[s] = min(best[s], t)
+        labels: List[Dict[int, tuple]] = [{s: (prev[s], ("access",)) for s in sources}]
+        marked = set(sources)
+        target_best, results = math.inf, []
+        stop_ptr, trip_ptr, time_ptr = self.stop_ptr, self.trip_ptr, self.time_ptr
+        for k in range(1, max_rounds + 1):
+            queue: Dict[int, int] = {}
+            for p in marked:
+                lo, hi = int(self.serve_ptr[p]), int(self.serve_ptr[p + 1])
+                for r, i in zip(self.serve_pattern[lo:hi].tolist(), self.serve_pos[lo:hi].tolist()):
+                    if i < queue.get(r, sys.maxsize):
+                        queue[r] = i
+            cur: Dict[int, tuple] = {}
+            for r, i0 in queue.items():
+                stops = self.pattern_stops[stop_ptr[r]:stop_ptr[r + 1]].tolist()
+                n, t0 = len(stops), int(trip_ptr[r])
+                m = int(trip_ptr[r + 1]) - t0
+                deps = self.departures[time_ptr[r]:time_ptr[r + 1]].reshape(m, n)
+                trip, board, row_arr, row_dep = None, None, None, None
+                for i in range(i0, n):
+                    p = stops[i]
+                    if trip is not None:
+                        a = row_arr[i]
+                        if a < best[p] and a < target_best:
+                            best[p] = a
+                            cur[p] = (a, ("ride", r, trip, board, i))
+                    ready = prev[p] + (change_s if by_ride[p] else 0)
+                    if ready == math.inf or (trip is not None and ready > row_dep[i]):
+                        continue
+                    # earliest running trip at stop i leaving at or after ready
+                    j = int(np.searchsorted(deps[:, i], ready, side="left"))
+                    while j < m and not active[t0 + j]:
+                        j += 1
+                    if j < m and (trip is None or j < trip):
+                        trip, board = j, i
+                        row_dep = deps[j].tolist()
+                        row_arr = self.arrivals[time_ptr[r] + j * n:time_ptr[r] + (j + 1) * n].tolist()
+            # one walk after each ride, the ride label kept in the walk one
+            walks: Dict[int, tuple] = {}
+            for p, label in cur.items():
+                for q, w in footpaths.get(p, ()):
+                    a = label[0] + w
+                    if a < best[q] and a < target_best:
+                        best[q] = a
+                        walks[q] = (a, ("walk", p, w, label))
+            cur.update(walks)
+            if not cur:
+                break
+            for p, (a, how) in cur.items():
+                prev[p], by_ride[p] = a, how[0] == "ride"
+            improved = None
+            for p in cur:
+                if p in targets and cur[p][0] + targets[p] < target_best:
+                    target_best, improved = cur[p][0] + targets[p], p
+            if improved is not None:
+                results.append((k, improved, target_best))
+            labels.append(cur)
+            marked = set(cur)
+        return results, labels
+
+class TransitRouter:
+    """RAPTOR on a Timetable with walking (and driving) legs on the road graph of routing."""
+
+    def __init__(self, timetable: Timetable, routing: RoutingService, walk_kmh: float = WALK_KMH,
+                 max_walk_km: float = MAX_WALK_KM, max_drive_min: float = MAX_DRIVE_MIN):
+        self.tt = timetable
+        self.routing = routing
+        self.walk_kmh = walk_kmh
+        self.max_walk_km = max_walk_km
+        self.max_drive_min = max_drive_min
+        csr = routing.csr
+        index = csr.node_index()
+        with stage("transit_snap", items=timetable.n_stops):
+            self.stop_nodes = [index[n] for n in routing.snap_all([tuple(c) for c in timetable.stop_coords.tolist()])]
+        self.node_stops: Dict[int, List[int]] = {}
+        for s, v in enumerate(self.stop_nodes):
+            self.node_stops.setdefault(v, []).append(s)
+        # walking between stops: one bounded search per stop
+        self.footpaths: Dict[int, List[Tuple[int, float]]] = {}
+        with stage("transit_footpaths", items=timetable.n_stops):
+            for s, v in enumerate(self.stop_nodes):
+                paths = [(q, km * 3600 / walk_kmh) for u, km in csr.dijkstra(v, cutoff=max_walk_km).items()
+                         for q in self.node_stops.get(u, ()) if q != s]
+                if paths:
+                    self.footpaths[s] = paths
+        self.stats = {"footpaths": sum(len(x) for x in self.footpaths.values())}
+
+    def _walk(self, node: int) -> Tuple[Dict[int, float], Dict[int, float]]:
+        """(stop -> walking seconds, node -> km) around a node."""
+        reached = self.routing.csr.dijkstra(node, cutoff=self.max_walk_km)
+        stops = {}
+        for u, km in reached.items():
+            for s in self.node_stops.get(u, ()):
+                stops[s] = km * 3600 / self.walk_kmh
+        return stops, reached
+
+    def _drive(self, node: int, departure: datetime) -> Dict[int, float]:
+        """Stop -> driving seconds from node, within max_drive_min."""
+        csr, profiles = self.routing.csr, self.routing.profiles
+        if profiles is not None:
+            depart = departure.hour * 60 + departure.minute + departure.second / 60
+            done, _ = td_dijkstra(csr, profiles, node, depart, edge_profiles=self.routing.edge_profiles,
+                                  cutoff=self.max_drive_min)
+            minutes = {u: t - depart for u, t in done.items()}
+        else:
+            minutes = {u: km * 60 / CAR_KMH for u, km in csr.dijkstra(node, cutoff=self.max_drive_min * CAR_KMH / 60).items()}
+        return {s: m * 60 for u, m in minutes.items() for s in self.node_stops.get(u, ())}
+
+    def plan(self, origin, destination, departure_time: datetime, access: str = "walk",
+             max_transfers: int = MAX_ROUNDS - 1) -> Dict[str, Any]:
+        """
+        Earliest arrival from origin to destination leaving at departure_time,
+        reaching the first stop on foot (access="walk") or by car ("car").
+        One journey per number of transfers, each arriving earlier than the
+        journeys with fewer transfers.
+        """
+        if access not in ("walk", "car"):
+            raise ValueError("access doit être 'walk' ou 'car'")
+        if not 0 <= int(max_transfers) < 20:
+            raise ValueError("max_transfers doit être entre 0 et 19")
+        t0 = time.perf_counter()
+        origin, destination = _as_coord(origin), _as_coord(destination)
+        index = self.routing.csr.node_index()
+        o_node, d_node = index[self.routing.snap(origin)], index[self.routing.snap(destination)]
+        midnight = datetime.combine(departure_time.date(), datetime.min.time(), departure_time.tzinfo)
+        start = (departure_time - midnight).total_seconds()
+        with stage("transit_access"):
+            walk_stops, walk_nodes = self._walk(o_node)
+            access_stops = walk_stops if access == "walk" else self._drive(o_node, departure_time)
+            egress, _ = self._walk(d_node)
+        with stage("raptor", items=len(access_stops)):
+            results, labels = self.tt.raptor({s: start + t for s, t in access_stops.items()}, egress,
+                                             self.tt.active_trips(departure_time.date()), self.footpaths,
+                                             max_rounds=int(max_transfers) + 1)
+        journeys = []
+        if d_node in walk_nodes:
+            # close enough to walk: only transit journeys arriving earlier are kept
+            seconds = walk_nodes[d_node] * 3600 / self.walk_kmh
+            journeys.append(self._journey([self._leg("walk", origin, destination, start, start + seconds)],
+                                          midnight, start, start + seconds, 0))
+            results = [x for x in results if x[2] < start + seconds]
+        for k, stop, arrival in results:
+            legs = self._legs(labels, k, stop, origin, access, start)
+            legs.append(self._leg("walk", self._stop(stop), destination, arrival - egress[stop], arrival))
+            journeys.append(self._journey(legs, midnight, start, arrival, k - 1))
+        return {
+            "origin": list(origin),
+            "destination": list(destination),
+            "departure_time": departure_time.isoformat(timespec="seconds"),
+            "access": access,
+            "journeys": journeys,
+            "stats": {"access_stops": len(access_stops), "rounds": len(labels) - 1,
+                      "stops_reached": len(set().union(*labels)) if labels else 0,
+                      "latency_ms": round((time.perf_counter() - t0) * 1000, 2)},
+        }
+
+    # --- Journeys ---
+
+    def _stop(self, s: int) -> Dict[str, Any]:
+        return {"stop_id": self.tt.stop_ids[s], "name": self.tt.stop_names[s], "point": self.tt.stop_coords[s].tolist()}
+
+    @staticmethod
+    def _leg(mode, frm, to, dep, arr, **extra) -> Dict[str, Any]:
+        return dict({"mode": mode, "from": frm if isinstance(frm, dict) else list(frm),
+                     "to": to if isinstance(to, dict) else list(to), "dep": dep, "arr": arr}, **extra)
+
+    def _legs(self, labels, k: int, stop: int, origin, access: str, start: float) -> List[Dict[str, Any]]:
+        """Legs origin -> stop of the round-k label of stop, oldest first."""
+        tt, legs = self.tt, []
+        while True:
+            arrival, parent = labels[k][stop]
+            if parent[0] == "access":
+                legs.append(self._leg(access, origin, self._stop(stop), start, arrival))
+                break
+            if parent[0] == "walk":
+                _, frm, seconds, ride = parent
+                legs.append(self._leg("walk", self._stop(frm), self._stop(stop), arrival - seconds, arrival))
+                stop, (arrival, parent) = frm, ride
+            _, r, j, board, alight = parent
+            t = int(tt.trip_ptr[r]) + j
+            n = int(tt.stop_ptr[r + 1] - tt.stop_ptr[r])
+            b = int(tt.pattern_stops[tt.stop_ptr[r] + board])
+            legs.append(self._leg("transit", self._stop(b), self._stop(stop),
+                                  float(tt.departures[tt.time_ptr[r] + j * n + board]), arrival,
+                                  route=tt.route_names[tt.trip_route[t]], trip_id=tt.trip_ids[t],
+                                  stops=alight - board))
+            # the label b was boarded from: the latest round before k that set it
+            k -= 1
+            while b not in labels[k]:
+                k -= 1
+            stop = b
+        return legs[::-1]
+
+    @staticmethod
+    def _journey(legs, midnight: datetime, start: float, arrival: float, transfers: int) -> Dict[str, Any]:
+        for leg in legs:
+            leg["departure_time"] = (midnight + timedelta(seconds=leg.pop("dep"))).isoformat(timespec="seconds")
+            leg["arrival_time"] = (midnight + timedelta(seconds=leg.pop("arr"))).isoformat(timespec="seconds")
+        return {
+            "arrival_time": (midnight + timedelta(seconds=arrival)).isoformat(timespec="seconds"),
+            "duration_min": round((arrival - start) / 60, 1),
+            "transfers": transfers,
+            "legs": legs,
+        }
+
+def load_timetable(gtfs_dir: str = GTFS_DIR, cache_dir: Optional[str] = None) -> Timetable:
+    """Arrays from cache_dir when present, else parsed from the GTFS files (and saved to cache_dir)."""
+    if cache_dir and os.path.exists(os.path.join(cache_dir, "meta.json")):
+        return Timetable.load(cache_dir)
+    timetable = Timetable.from_gtfs(gtfs_dir)
+    if cache_dir:
+        timetable.save(cache_dir)
+    return timetable
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile a GTFS feed into timetable arrays")
+    parser.add_argument("gtfs_dir")
+    parser.add_argument("out_dir")
+    args = parser.parse_args()
+    tt = Timetable.from_gtfs(args.gtfs_dir)
+    tt.save(args.out_dir)
+    print(f"{tt.n_stops} stops, {tt.n_patterns} patterns, {len(tt.trip_ids)} trips -> {args.out_dir}")